@@ -18,6 +18,12 @@ import mas_cell as c
 import mas_population as p
 import mas_agent as a
 import mas_utils as u
+import mas_pipeline as pl
+import mas_random as r
+import mas_registry as reg
+import mas_checkpoint as ck
+import mas_profile as pf
+import mas_capacity as cap
 
 
 
@@ -27,7 +33,7 @@ import mas_utils as u
 
 # --- Constants ---
 
-MAX_IDX=7
+MAX_IDX=12
 ENV_IDX = 0                           # Environment
 POP_IDX = 1                           # Agent population
 CELL_RULES_IDX = 2                    # List of rules applied on cells
@@ -36,6 +42,19 @@ EXPERIMENT_ENDING_CONDITION_IDX = 4   # Function with the ending condition
 MAX_CYCLE_IDX = 5                     # Max number of cycles per experiment
 CYCLE_IDX = 6                         # Current cycle of an experiment
 ORDER_ACTIVATION_IDX = 7			  # Ordre d'activation des agents
+RNG_IDX = 8                           # Random stream (see "mas_random")
+AGENT_PIPELINE_IDX = 9                # How agent rules are applied (see "mas_pipeline")
+CHECKPOINT_IDX = 10                   # (file, cycles between checkpoints), or None
+CYCLE_OBSERVERS_IDX = 11              # Functions called after each cycle
+PROFILER_IDX = 12                     # Profiler of the cycles (see "mas_profile"), or None
+
+# Kinds of the steps of a cycle (see run_cycle_steps)
+CELL_RULE_STEP = "cell rule"                # A cell rule, on all the cells
+ORDER_ACTIVATION_STEP = "order activation"  # The activation order of the agents
+AGENT_RULES_STEP = "agent rule"             # A stage of agent rules (see "mas_pipeline")
+LIFECYCLE_STEP = "lifecycle"                # The removal of the dead agents
+CYCLE_OBSERVERS_STEP = "cycle observers"    # The functions called after the cycle
+
 # --- Default values ---
 
 def DEFAULT_ENDING_CONDITION(mas):
@@ -71,6 +90,19 @@ def __empty_instance():
 	# Return an empty MAS instance.
     return [None]*(MAX_IDX+1)
 
+def __apply_step(step, kind, subject, items, fn, *args):
+	# Call fn(*args), through step if it is given (see
+	# run_cycle_steps).
+	if step is None:
+		fn(*args)
+	else:
+		step(kind, subject, items, fn, *args)
+
+def __notify_cycle_observers(mas):
+	# Call the cycle observers of the MAS.
+	for observer in get_cycle_observers(mas):
+		observer(mas)
+
 # --- Getters and setters ---
 
 def get_env(mas):
@@ -162,12 +194,102 @@ def set_cycle(mas, cycle):
 	__set_property(mas, CYCLE_IDX, cycle)
 
 def set_order_activation(mas,order_activation):
+	"""
+        Set the function that orders the agents before the agent rules are
+        applied (see the "Population Rules" of "mas_population"). With
+        None, the agents keep their order.
+    """
 
 	__set_property(mas,ORDER_ACTIVATION_IDX,order_activation)
 
 def get_order_activation(mas):
 	return __get_property(mas,ORDER_ACTIVATION_IDX)
 
+def get_agent_pipeline(mas):
+	"""
+        Return how the agent rules are applied: "phased" or "fused"
+        (see "mas_pipeline").
+    """
+	return __get_property(mas, AGENT_PIPELINE_IDX)
+
+def set_agent_pipeline(mas, mode):
+	"""
+        Set how the agent rules are applied: "phased" (each rule is
+        applied to all agents before the next one) or "fused" (all
+        rules are applied to an agent before the next agent).
+    """
+	if mode not in (pl.PHASED, pl.FUSED):
+		raise ValueError("Unknown agent pipeline: " + str(mode))
+	__set_property(mas, AGENT_PIPELINE_IDX, mode)
+
+def get_rng(mas):
+	"""
+        Return the random stream of the MAS (see "mas_random").
+    """
+	return __get_property(mas, RNG_IDX)
+
+def set_rng(mas, rng):
+	"""
+        Set the random stream of the MAS.
+    """
+	__set_property(mas, RNG_IDX, rng)
+
+def get_checkpoint(mas):
+	"""
+        Return the checkpoint settings of the MAS as (file name,
+        number of cycles between checkpoints), or None.
+    """
+	return __get_property(mas, CHECKPOINT_IDX)
+
+def set_checkpoint(mas, file_name, every=1000):
+	"""
+        Write a checkpoint of the MAS in the file every "every"
+        cycles while an experiment runs (see save_checkpoint).
+        With a file name None, no checkpoint is written.
+    """
+	if file_name is None:
+		__set_property(mas, CHECKPOINT_IDX, None)
+		return
+	if every <= 0:
+		raise ValueError("The number of cycles between checkpoints must be positive.")
+	__set_property(mas, CHECKPOINT_IDX, (file_name, every))
+
+def get_cycle_observers(mas):
+	"""
+        Return the list of the functions called with the MAS after
+        each cycle (see add_cycle_observer).
+    """
+	return __get_property(mas, CYCLE_OBSERVERS_IDX)
+
+def add_cycle_observer(mas, observer_fn):
+	"""
+        Add a function called with the MAS at the end of each cycle,
+        once all rules have been applied (e.g. to record metrics,
+        see "mas_recorder"). The cycle has not been incremented yet.
+    """
+	# Function signature:  fn(mas) ---> None
+	get_cycle_observers(mas).append(observer_fn)
+
+def remove_cycle_observer(mas, observer_fn):
+	"""
+        Remove a function added with add_cycle_observer.
+    """
+	get_cycle_observers(mas).remove(observer_fn)
+
+def get_profiler(mas):
+	"""
+        Return the profiler that times the cycles of the MAS, or
+        None if they are not profiled (see "mas_profile").
+    """
+	return __get_property(mas, PROFILER_IDX)
+
+def set_profiler(mas, profiler):
+	"""
+        Set the profiler that times the cycles of the MAS (None to
+        stop profiling, see "mas_profile").
+    """
+	__set_property(mas, PROFILER_IDX, profiler)
+
 # --- Initialisation ---
 
 def new_instance():
@@ -182,35 +304,57 @@ def new_instance():
 	set_ending_condition(mas, DEFAULT_ENDING_CONDITION)
 	set_max_cycle(mas, 0)
 	set_cycle(mas, 0)
+	set_rng(mas, r.new_instance())
+	set_agent_pipeline(mas, pl.PHASED)
+	set_checkpoint(mas, None)
+	__set_property(mas, CYCLE_OBSERVERS_IDX, [])
+	set_profiler(mas, None)
 	return mas
 
-def new_instance_from_config(config):
+def new_instance_from_config(config, capacities=None):
 	""" 
         Return a new MAS instance that has been initialised according
         to the parameters passed by the configuration.
+        If a capacity map is given (see e.get_capacities), it is used
+        instead of the capacity distributions of the configuration.
     """
 	mas = new_instance()
+	# Resolve all the names of the configuration first (see
+	# "mas_registry"), so that a wrong name is reported before
+	# anything is built.
+	env_capacity_distribs = u.cfg_capacity_distributions(config)
+	for distrib in env_capacity_distribs:
+	    reg.resolve_capacity_distribution(distrib)
+	cell_rules = [reg.resolve(reg.CELL_RULE, rule) for rule in u.cfg_cell_rules(config)]
+	agent_rules = [reg.resolve(reg.AGENT_RULE, rule) for rule in u.cfg_agent_rules(config)]
+	ending_condition = u.cfg_ending_condition(config)
+	if ending_condition is not None:
+	    set_ending_condition(mas,reg.resolve(reg.ENDING_CONDITION, ending_condition))
+	order_activation = u.cfg_order_activation(config)
+	if order_activation is not None:
+	    set_order_activation(mas,reg.resolve(reg.ORDER_ACTIVATION, order_activation))
+	# Random stream
+	set_rng(mas, r.new_instance(u.cfg_seed(config)))
 	# Environment
 	env = e.new_instance(mas, config)
 	set_env(mas, env)
-	env_capacity_distribs = u.cfg_capacity_distributions(config)
-	for distrib in env_capacity_distribs:
-	    e.add_capacity_from_string(env,distrib)
+	if capacities is not None:
+	    e.set_capacities(env, capacities)
+	else:
+	    cap.apply_distributions(env, env_capacity_distribs, u.cfg_capacity_cache(config))
 	# Agent population
 	pop = p.new_instance(mas, config)
 	set_pop(mas, pop)
 	# Cell rules
-	cell_rules = u.cfg_cell_rules(config)
 	for rule in cell_rules:
-	    add_cell_rule_from_string(mas,rule)
+	    add_cell_rule(mas,rule)
 	# Agent rules
-	agent_rules = u.cfg_agent_rules(config)
 	for rule in agent_rules:
-	    add_agent_rule_from_string(mas,rule)
+	    add_agent_rule(mas,rule)
 	# Experiment settings
 	set_max_cycle(mas,u.cfg_max_cycle(config))
-	set_ending_condition(mas,u.cfg_ending_condition(config))
-	set_order_activation(mas,u.cfg_order_activation(config))
+	set_agent_pipeline(mas,u.cfg_agent_pipeline(config))
+	set_checkpoint(mas,u.cfg_checkpoint_file(config),u.cfg_checkpoint_every(config))
 	return mas
 
 # --- Environment rules ---
@@ -226,15 +370,17 @@ def add_cell_rule_from_string(mas, cell_rule_str):
 		Add a cell rule to the MAS based on a string
 		that represents the function call.
 	"""
-	add_cell_rule(mas, eval("c."+cell_rule_str))
+	add_cell_rule(mas, reg.resolve(reg.CELL_RULE, cell_rule_str))
 
-def apply_cell_rules(mas):
+def apply_cell_rules(mas, step=None):
 	"""
-		Apply all cell rules to each cell of the MAS's environment.
+		Apply all cell rules to each cell of the MAS's environment
+		(see run_cycle_steps for step).
 	"""
 	env = get_env(mas)
 	for cell_rule in get_cell_rules(mas):
-		e.apply_fn_to_all_cells(env, cell_rule)
+		__apply_step(step, CELL_RULE_STEP, cell_rule, e.size(env)**2,
+		             e.apply_cell_rule, env, cell_rule)
 
 # --- Agent rules ---
 
@@ -249,16 +395,34 @@ def add_agent_rule_from_string(mas, agent_rule_str):
 		Add an agent rule to the MAS based on a string
 		that represents the function call.
 	"""
-	add_agent_rule(mas, eval("a."+agent_rule_str))
+	add_agent_rule(mas, reg.resolve(reg.AGENT_RULE, agent_rule_str))
 
-def apply_agent_rules(mas):
+def apply_agent_rules(mas, step=None):
 	"""
-		Apply all agent rules to each agent of the MAS's population.
+		Apply all agent rules to each agent of the MAS's population
+		(see run_cycle_steps for step).
 	"""
 	pop = get_pop(mas)
-	eval("p."+get_order_activation(mas)+"(pop)")
-	for agent_rule in get_agent_rules(mas):
-		p.apply_rule(pop, agent_rule)
+	order_activation = get_order_activation(mas)
+	if order_activation is not None:
+		__apply_step(step, ORDER_ACTIVATION_STEP, order_activation, p.size(pop),
+		             order_activation, pop)
+	# See "mas_pipeline" for the batched rules, the indexes and
+	# the fused pipeline.
+	for stage in pl.new_instance(pop, get_agent_rules(mas), get_agent_pipeline(mas)):
+		__apply_step(step, AGENT_RULES_STEP, stage, p.size(pop),
+		             pl.apply_stage, pop, stage)
+
+# --- Lifecycle ---
+
+def apply_lifecycle(mas):
+	"""
+		Remove the agents that are not living any more (starved or
+		too old) from the population, all at once (see
+		p.remove_dead_agents). This is done once per cycle, after
+		the agent rules.
+	"""
+	p.remove_dead_agents(get_pop(mas))
 
 # --- Execution ---
 
@@ -268,22 +432,73 @@ def increment_cycle(mas):
 	"""
 	set_cycle(mas, get_cycle(mas)+1)
 
+def run_cycle_steps(mas, step=None):
+	"""
+		Apply the steps of one cycle of the MAS: the cell rules,
+		the agent rules, the lifecycle and the cycle observers.
+		If step is given, each step is applied by calling
+		step(kind, subject, items, fn, *args), which must call
+		fn(*args) once: kind is one of the *_STEP constants,
+		subject is the rule or stage applied (or None) and items
+		is the number of cells or agents it is applied to (see
+		"mas_profile").
+	"""
+	apply_cell_rules(mas, step)
+	apply_agent_rules(mas, step)
+	__apply_step(step, LIFECYCLE_STEP, None, p.size(get_pop(mas)),
+	             apply_lifecycle, mas)
+	if len(get_cycle_observers(mas)) > 0:
+		__apply_step(step, CYCLE_OBSERVERS_STEP, None, 0,
+		             __notify_cycle_observers, mas)
+
 def run_one_cycle(mas):
 	"""
 		Run one experiment cycle of the MAS.
 	"""
-	apply_cell_rules(mas)
-	apply_agent_rules(mas)
+	profiler = get_profiler(mas)
+	if profiler is not None:
+		# The same steps, each of them timed (see "mas_profile").
+		pf.run_one_cycle(profiler, mas)
+	else:
+		run_cycle_steps(mas)
 
 def run_experiment(mas):
 	"""
 	    Run a experiment on the initialised MAS.
 	"""
 	set_cycle(mas, 0)
+	continue_experiment(mas)
+
+def continue_experiment(mas):
+	"""
+	    Run the experiment of the MAS from its current cycle (e.g.
+	    after load_checkpoint) until the ending condition is met.
+	"""
 	ending_condition = get_ending_condition(mas)
-	while not eval(ending_condition+"(mas)"):
+	if get_profiler(mas) is not None:
+		ending_condition = pf.timed_ending_condition(get_profiler(mas), ending_condition)
+	checkpoint = get_checkpoint(mas)
+	while not ending_condition(mas):
 		run_one_cycle(mas)
 		increment_cycle(mas)
+		if checkpoint is not None and get_cycle(mas) % checkpoint[1] == 0:
+			save_checkpoint(mas, checkpoint[0])
+
+# --- Checkpoints ---
+
+def save_checkpoint(mas, file_name):
+	"""
+		Write the complete state of the MAS (between two cycles) in
+		a checkpoint file (see "mas_checkpoint").
+	"""
+	ck.save(mas, file_name)
+
+def load_checkpoint(file_name):
+	"""
+		Return a new MAS in the state saved in the checkpoint file.
+		The experiment goes on with continue_experiment.
+	"""
+	return ck.load(file_name)
 
 # --- Terminal output ---
 
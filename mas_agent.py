@@ -12,8 +12,14 @@ import mas_cell as c
 import mas_utils as u
 import mas_population as p
 import mas_environment as e
+import mas_index as ix
+import mas_random as r
 
-from random import randint,uniform
+# The columnar population needs NumPy, which is optional.
+try:
+	import mas_store as s
+except ImportError:
+	s = None
 
 #==================================================
 #  AGENT
@@ -46,24 +52,58 @@ def __empty_instance():
     # Return an empty agent instance.
     return [None]*(AGENT_MAX_IDX+1)
 
-def new_instance(pop):
-	agent = __empty_instance()
+def new_instance(pop,position=None):
+	"""
+		crée un nouvel agent (à ajouter ensuite à la population avec mas_population.add_agent)
+		position : la cellule (libre) de l'agent, tirée au hasard parmi les cellules libres si elle
+			n'est pas donnée (voir mas_environment.random_cell_ref_without_agent)
+	"""
+	store = p.get_store(pop)
+	if store is not None:
+		agent = s.new_agent(store)
+	else:
+		agent = __empty_instance()
 	#Recupère la liste des propriétés 
 	prop = p.get_properties(pop)
+	rng = p.get_rng(pop)
 	set_population(agent,pop)
 	#choisi une valeur aléatoire entre les minimum et maximum venant du fichier de configuration
-	set_vision_capacity(agent,randint(prop["MIN_VISION_CAPACITY"],prop["MAX_VISION_CAPACITY"]))
-	set_metabolism(agent,uniform(prop["MIN_METABOLISM"],prop["MAX_METABOLISM"]))
+	set_vision_capacity(agent,r.randint(rng,prop["MIN_VISION_CAPACITY"],prop["MAX_VISION_CAPACITY"]))
+	set_metabolism(agent,r.uniform(rng,prop["MIN_METABOLISM"],prop["MAX_METABOLISM"]))
 	#les agents ont au départ un âge reflettant le réalisme
-	set_age(agent,randint(prop["MIN_AGENT_AGE"],prop["MAX_AGENT_AGE"]))
+	set_age(agent,r.randint(rng,prop["MIN_AGENT_AGE"],prop["MAX_AGENT_AGE"]))
 	#La réserve en sucre au départ est suffisante à sa survie (métabolism)
 	set_sugar_level(agent,get_metabolism(agent))
 	env = p.get_env(pop)
-	random_position = e.random_cell_ref_without_agent(env)
-	set_pos(agent,random_position)
-	cell = e.get_cell(env,random_position)
-	set_sex(agent,randint(1,2))
+	if position is None:
+		position = e.random_cell_ref_without_agent(env)
+	set_pos(agent,position)
+	cell = e.get_cell(env,position)
+	set_sex(agent,r.randint(rng,1,2))
 	c.set_present_agent(cell,agent)
+	e.occupy_cell(env,position)
+	return agent
+
+def restore_instance(pop,metabolism,position,sugar_level,vision_capacity,age,sex):
+	"""
+		recrée un agent avec les propriétés données, sans tirage aléatoire (voir mas_checkpoint),
+		et le place sur sa cellule (à ajouter ensuite à la population avec mas_population.add_agent)
+	"""
+	store = p.get_store(pop)
+	if store is not None:
+		agent = s.new_agent(store)
+	else:
+		agent = __empty_instance()
+	set_population(agent,pop)
+	set_vision_capacity(agent,vision_capacity)
+	set_metabolism(agent,metabolism)
+	set_age(agent,age)
+	set_sugar_level(agent,sugar_level)
+	set_pos(agent,position)
+	set_sex(agent,sex)
+	env = p.get_env(pop)
+	c.set_present_agent(e.get_cell(env,position),agent)
+	e.occupy_cell(env,position)
 	return agent
 
 # --- Getters and Setters ---
@@ -162,20 +202,28 @@ def move(agent,position):
 	set_pos(agent,position)
 	c.set_present_agent(cell,None)
 	c.set_present_agent(target_cell,agent)
+	e.release_cell(env,current_position)
+	e.occupy_cell(env,position)
+	if p.get_indexes(get_population(agent)):
+		ix.on_move(get_population(agent),agent,current_position)
 
-def consumption_sugar(agent,amount):
+def consumption_sugar(agent,amount,cell=None,max_sugar_level=None):
 	"""
 		consomation de sucre par l'agent
 		amount : quantité de sucre qui va être consomé (s'il le peut)
+		cell, max_sugar_level : la cellule de l'agent et le niveau de sucre maximal,
+			s'ils sont déjà connus (voir mas_pipeline)
 	"""
-	cell = get_cell(agent)
+	if cell is None:
+		cell = get_cell(agent)
 	pop  = get_population(agent)
 	c_sugar_level  = c.get_sugar_level(cell)
 	a_sugar_level = get_sugar_level(agent)
 	metabolism 	= get_metabolism(agent)
-	max_sugar_level = p.get_pop_property(pop,"MAX_SUGAR_LEVEL")
+	if max_sugar_level is None:
+		max_sugar_level = p.get_pop_property(pop,"MAX_SUGAR_LEVEL")
 	if (amount >= metabolism):
-		if not has_max_sugar_level(agent):
+		if not a_sugar_level >= max_sugar_level:
 			a_sugar_level += amount - metabolism
 			if a_sugar_level > max_sugar_level:
 				a_sugar_level = max_sugar_level
@@ -187,6 +235,8 @@ def consumption_sugar(agent,amount):
 		c_sugar_level -= amount
 	set_sugar_level(agent,a_sugar_level)
 	c.set_sugar_level(cell,c_sugar_level)
+	if p.get_indexes(pop):
+		ix.on_change(pop,agent)
 
 def accecible_positions(agent):
 	"""
@@ -195,11 +245,7 @@ def accecible_positions(agent):
 	env = get_env(agent)
 	x , y = get_pos(agent) 
 	positions = []
-	#le surpoids d'un agent entraîne la diminution de sa capacité de vision
-	if not has_max_sugar_level(agent) :
-		vision = get_vision_capacity(agent)
-	else:
-		vision = 1 
+	vision = get_vision(agent)
 	step = -vision
 	while step <= vision:
 		if step != 0:
@@ -212,6 +258,15 @@ def accecible_positions(agent):
 		step+=1
 	return positions
 
+def get_vision(agent):
+	"""
+		renvoie la vision effective de l'agent :
+		le surpoids d'un agent entraîne la diminution de sa capacité de vision
+	"""
+	if not has_max_sugar_level(agent) :
+		return get_vision_capacity(agent)
+	return 1
+
 def is_possible_to_move(agent,position):
 	"""
 		vérifie si un agent peut se déplcer, on vérifie si: la quantité de sucre de la cellule additionnée 
@@ -226,7 +281,9 @@ def is_possible_to_move(agent,position):
 
 def get_is_living(agent):
 	"""
-		vérifie si un agent est vivant : s'il a assez à manger, s'il peut se déplacer et si son age ne dépasse pas la limite 
+		vérifie si un agent est vivant : s'il a assez à manger, s'il peut se déplacer et si son age ne dépasse pas la limite.
+		L'agent n'est pas retiré de la population : les agents morts le sont une fois par cycle
+		(voir mas_population.remove_dead_agents)
 	"""
 	cell = get_cell(agent)
 	cell_sugar_level = c.get_sugar_level(cell)
@@ -235,22 +292,7 @@ def get_is_living(agent):
 	age = get_age(agent)
 	pop = get_population(agent)
 	max_age = p.get_pop_property(pop,"MAX_AGENT_AGE")
-	is_alive = (cell_sugar_level+agent_sugar_level >= metabolism) and age <= max_age
-	if not is_alive:
-		kill(agent)
-	return is_alive
-
-def kill(agent):
-	"""
-		Fonction qui tue un agent 
-	"""
-	pop = get_population(agent)
-	agents = p.get_agents(pop)
-	cell = get_cell(agent)
-	p.increment_dead_agents(pop)
-	if agent in agents:
-		del agents[agents.index(agent)]
-	c.set_present_agent(cell,None)
+	return (cell_sugar_level+agent_sugar_level >= metabolism) and age <= max_age
 
 def correct_position(position,env):
 	"""
@@ -260,12 +302,20 @@ def correct_position(position,env):
 	x,y = position
 	return (x % n_row, y % n_line)
 
-def average_living(pop,cell_refs):
+def living_zone(pop):
+	"""
+		renvoie la demi-taille des blocs utilisés par la règle RA4 (propriété AVERAGE_LIVING_ZONE, 3 par défaut)
+	"""
+	return p.get_properties(pop).get("AVERAGE_LIVING_ZONE",3)
+
+def average_living(pop,cell_refs,zone=3):
 	""" 
-		cherche le niveau de vie moyen des agents situé dans un bloc de coté 6 (zone*2) centré dans la cellule cible 
+		cherche le niveau de vie moyen des agents situé dans un bloc de coté zone*2 centré dans la cellule cible 
 	"""
+	index = p.get_index(pop,ix.WEALTH_INDEX)
+	if index is not None and ix.wealth_zone(index) == zone:
+		return ix.wealth_average(index,cell_refs)
 	x,y = cell_refs
-	zone = 3
 	cells_average_list = []
 	sugar_level_sum = 0
 	agents_in_zone_of_cell = 0
@@ -287,6 +337,16 @@ def average_living(pop,cell_refs):
 		average = 0
 	return average
 
+def average_living_is_higher(pop,cell_refs,zone,sugar_level):
+	"""
+		vérifie si le niveau de vie moyen du bloc autour de la cellule cible (voir average_living)
+		est plus élevé que sugar_level
+	"""
+	index = p.get_index(pop,ix.WEALTH_INDEX)
+	if index is not None and ix.wealth_zone(index) == zone:
+		return ix.wealth_exceeds(index,cell_refs,sugar_level)
+	return average_living(pop,cell_refs,zone) > sugar_level
+
 def theres_is_an_other_sex_around(agent):
 	"""
 		évaluer la présence d’un potentiel (dans le sens ou il peut se reproduire avec) agent à proximité
@@ -311,15 +371,21 @@ def theres_is_an_other_sex_around(agent):
 def is_an_agent_can_be_there_faster(agent,target):
 	"""
 		si un autre agent peut atteindre avant la cellule visée
+		(les distances passent par les bords de l'environnement)
 	"""	
 	pop = get_population(agent)
+	index = p.get_index(pop,ix.REACH_INDEX)
+	if index is not None:
+		return ix.reach_faster(index,agent,target)
 	agents = p.get_agents(pop)
-	i=0
+	sz = e.size(get_env(agent))
+	distance = u.toroidal_dist(get_pos(agent),target,sz)
+	j=0
 	already_found = False
-	while i < len(agents) and not already_found:
-		if agents[i] != agent and target in accecible_positions(agents[i]):
-			already_found = (u.eucl_dist(get_pos(agents[i]),target) < u.eucl_dist(get_pos(agent),target)) 
-		i+=1
+	while j < len(agents) and not already_found:
+		if agents[j] != agent and target in accecible_positions(agents[j]):
+			already_found = (u.toroidal_dist(get_pos(agents[j]),target,sz) < distance)
+		j+=1
 	return already_found
 
 def total_gain(agent,target):
@@ -333,20 +399,27 @@ def total_gain(agent,target):
 	sugar_level = get_sugar_level(agent)
 	#x_diff,y_diff
 	xd,yd = u.vector_diff(pos,target)
+	index = p.get_index(pop,ix.PATH_INDEX)
 	if xd == 0: #the same line
 		steps = abs(yd)
 		step  = (1 if yd < 0 else -1)
-		for i in range(steps):
-			cell_refs = correct_position((pos[0],pos[1]+step*i),env)
-			cell  = e.get_cell(env,cell_refs)
-			sugar_level += c.get_sugar_level(cell)
+		if index is not None:
+			sugar_level += ix.path_sugar_level(index,pos,(0,step),steps)
+		else:
+			for i in range(steps):
+				cell_refs = correct_position((pos[0],pos[1]+step*i),env)
+				cell  = e.get_cell(env,cell_refs)
+				sugar_level += c.get_sugar_level(cell)
 	else: #the same row
 		steps = abs(xd)
 		step  = (1 if xd < 0 else -1)
-		for i in range(steps):
-			cell_refs = correct_position((pos[0]+step*i,pos[1]),env)
-			cell  = e.get_cell(env,cell_refs)
-			sugar_level += c.get_sugar_level(cell)
+		if index is not None:
+			sugar_level += ix.path_sugar_level(index,pos,(step,0),steps)
+		else:
+			for i in range(steps):
+				cell_refs = correct_position((pos[0]+step*i,pos[1]),env)
+				cell  = e.get_cell(env,cell_refs)
+				sugar_level += c.get_sugar_level(cell)
 	return sugar_level - get_metabolism(agent)*steps
 	
 def is_interested_to_move(agent,target):
@@ -428,7 +501,7 @@ def move_to_a_random_cell(agent):
 	"""
 	cells_refs = accecible_positions(agent)
 	if (len(cells_refs) > 1 ):
-		move(agent,cells_refs[randint(0,len(cells_refs)-1)] )
+		move(agent,r.choice(p.get_rng(get_population(agent)),cells_refs))
 	elif (len(cells_refs) == 1 ):
 		move(agent,cells_refs[0])
 
@@ -503,13 +576,13 @@ def move_by_averrage_living(agent):
 		RA4 : déplace l'agent là ou le niveau de vie est plus élevé que son niveau de sucre
 	"""
 	pop = get_population(agent)
+	zone = living_zone(pop)
 	cell_refs = get_pos(agent)
 	cells_refs = accecible_positions(agent)
 	already_moved = False
 	i = 0
 	while i < len(cells_refs) and not(already_moved):
-		average = average_living(pop,cells_refs[i])
-		if average > get_sugar_level(agent):
+		if average_living_is_higher(pop,cells_refs[i],zone,get_sugar_level(agent)):
 			move(agent,cells_refs[i])
 			already_moved = True
 		i+=1
@@ -528,12 +601,16 @@ def make_a_child(agent):
 	max_pop = p.get_pop_property(pop,"MAX_POP")
 	min_prob,max_prob = p.get_pop_property(pop,"PROB_TO_HAVE_SEX")
 	if (min_age <= get_age(agent) <= max_age and theres_is_an_other_sex_around(agent) \
-			  and randint(min_prob,max_prob) == 1 and p.size(pop) < max_pop ):
+			  and r.randint(p.get_rng(pop),min_prob,max_prob) == 1 and p.size(pop) < max_pop \
+			  and e.free_cells_count(env) > 0):
 		new_child = new_instance(pop)
 		set_age(new_child,0)
 		set_sugar_level(agent,0)
 		#le nouveau-née hérite du métabolisme et de la vision de capacité de son géniteur
 		set_metabolism(new_child,get_metabolism(agent))
 		set_vision_capacity(new_child,get_vision_capacity(agent))
-		agents_list = p.get_agents(pop)
-		agents_list.append(new_child)
+		p.add_agent(pop,new_child)
+		p.increment_births(pop)
+		if p.get_indexes(pop):
+			ix.on_birth(pop,new_child)
+			ix.on_change(pop,agent)
@@ -0,0 +1,361 @@
+#==================================================
+# INFO-H-100 - Introduction à l'informatique
+#
+# Prof. Thierry Massart
+# Année académique 2014-2015
+#
+# Projet: Système Multi-Agent (SMA)
+#
+#==================================================
+
+
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import mas as m
+import mas_agent as a
+import mas_environment as e
+import mas_index as ix
+import mas_population as p
+
+# The peak memory of a case is only measured where the resource
+# module exists (not on Windows).
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+
+#==================================================
+#  BENCHMARKS
+#==================================================
+#
+# Measure the throughput of the simulator on synthetic
+# configurations, and compare it with a baseline to
+# catch regressions before a release:
+#
+#   python3 mas_bench.py --preset quick -o bench.json
+#   python3 mas_bench.py --preset quick --baseline bench.json
+#
+# The cases of a preset are made from BASE_CONFIG by
+# changing one thing at a time:
+#
+#  - "scale": the sizes of the environment and of the
+#    population (from 50 cells wide and 50 agents to
+#    2000 cells wide and 10**6 agents in the "full"
+#    preset, with the NumPy backends from 200 cells),
+#  - "move", "eat": each movement rule (RA1 to RA4) and
+#    each consumption rule, with the other rules of
+#    BASE_CONFIG,
+#  - "order": each activation order,
+#  - "index", "scan": each indexed movement rule (see
+#    "mas_index") with the list backends, with and
+#    without its indexes, so that an index that does
+#    not beat the scan it replaces shows.
+#
+# Each case runs in its own process (so that its peak
+# memory is its own), 3 times by default to keep the
+# best results: after the initialisation, it runs a
+# fixed number of cycles (or until no agent is left)
+# and reports
+#
+#  - cycles_per_second,
+#  - agent_updates_per_second: the number of agents at
+#    the start of each cycle, per second,
+#  - peak_rss_mb: the peak resident memory of the
+#    process (initialisation included).
+#
+# With a baseline (the output of a previous run), a
+# case regresses when a throughput is lower than its
+# baseline by more than the tolerance (20% by default)
+# or its peak memory is higher by more than the
+# tolerance. The command then exits with status 1.
+#
+#==================================================
+
+# --- Constants ---
+
+BASE_CONFIG = {
+    "ENV_SIZE": "50",
+    "POP_SIZE": "50",
+    "ENV_BACKEND": "list",
+    "POP_BACKEND": "list",
+    "SEED": "1",
+    "ORDER_ACTIVATION": "active_agents_by_sugar_level",
+    "AGENT_PIPELINE": "phased",
+    "ENV": "MAX_CAPACITY : 10.0",
+    "POP": ["PROB_TO_HAVE_SEX : 1,2", "MAX_VISION_CAPACITY : 4", "MIN_VISION_CAPACITY : 1",
+            "MAX_METABOLISM : 1", "MIN_METABOLISM : 0.1", "MAX_SUGAR_LEVEL : 10",
+            "MAX_AGENT_AGE : 70", "MIN_AGENT_AGE : 0", "MIN_AGE_TO_MAKE_CHILDS : 18",
+            "MAX_AGE_TO_MAKE_CHILDS : 50"],
+    "ADD_CELL_RULE": "regen_full",
+}
+
+MOVE_RULES = ["move_to_the_highest_sugar_level_cell", "move_by_only_a_cell",
+              "move_to_the_lowest_sugar_level_cell", "move_by_averrage_living"]
+EAT_RULES = ["eat_all", "eat_metabolism", "eat_half", "eat_quarter"]
+ORDERS = ["active_agents_randomly", "active_agents_by_sugar_level"]
+INDEXED_MOVE_RULES = ["move_by_averrage_living", "move_by_only_a_cell"]
+
+WITHOUT_INDEXES = "BENCH_WITHOUT_INDEXES"   # Key of the cases run without indexes (see run_case)
+
+# Preset -> (scale cases (ENV_SIZE, POP_SIZE, cycles), rule cases
+# (ENV_SIZE, cycles)). The largest cases of the "full" preset take
+# tens of seconds per cycle.
+PRESETS = {
+    "quick": ([(50, 50, 20), (100, 500, 20), (200, 2000, 20)], (50, 20)),
+    "full": ([(50, 50, 50), (200, 2000, 50), (500, 20000, 20), (1000, 100000, 10), (2000, 1000000, 3)], (200, 50)),
+}
+DEFAULT_PRESET = "quick"
+
+NUMPY_MIN_SIZE = 200        # Scale cases from this size use the NumPy backends
+DEFAULT_TOLERANCE = 0.2
+DEFAULT_REPEAT = 3
+
+# Result -> True if higher is better.
+RESULTS = {
+    "cycles_per_second": True,
+    "agent_updates_per_second": True,
+    "peak_rss_mb": False,
+}
+
+# --- Cases ---
+
+def case_config(env_size, pop_size, move_rule=MOVE_RULES[0], eat_rule="eat_half",
+                order=BASE_CONFIG["ORDER_ACTIVATION"], numpy_backends=False, indexes=True):
+    """
+        Return the configuration of a case: BASE_CONFIG with the
+        given sizes, rules and activation order. The capacity of
+        the environment is made of three gaussians scaled to its
+        size. Without indexes, the agent rules scan the
+        environment (see "mas_index").
+    """
+    config = dict(BASE_CONFIG)
+    config["ENV_SIZE"] = str(env_size)
+    config["POP_SIZE"] = str(pop_size)
+    if numpy_backends:
+        config["ENV_BACKEND"] = "numpy"
+        config["POP_BACKEND"] = "numpy"
+    config["ORDER_ACTIVATION"] = order
+    config["POP"] = BASE_CONFIG["POP"] + ["MAX_POP : " + str(min(2*pop_size, env_size*env_size))]
+    config["ADD_CAPACITY_DISTRIB"] = [
+        "add_capacity_gaussian(env, 0.8, " + repr((env_size//5, env_size//5)) + ", " + repr(max(env_size//12, 1)) + ")",
+        "add_capacity_gaussian(env, 0.3, " + repr((3*env_size//5, 3*env_size//5)) + ", " + repr(max(env_size//5, 1)) + ")",
+        "add_capacity_gaussian(env, 0.3, " + repr((env_size-1, env_size-1)) + ", " + repr(max(env_size//5, 1)) + ")",
+    ]
+    config["ADD_AGENT_RULE"] = [move_rule, eat_rule, "grow_up", "make_a_child"]
+    if not indexes:
+        config[WITHOUT_INDEXES] = "1"
+    return config
+
+def cases(preset):
+    """
+        Return the (name, configuration, cycles) of the cases of
+        the preset.
+    """
+    (scales, (rule_size, cycles)) = PRESETS[preset]
+    rule_pop_size = max(rule_size*rule_size//20, 1)
+    rule_numpy = rule_size >= NUMPY_MIN_SIZE
+    result = []
+    for (env_size, pop_size, scale_cycles) in scales:
+        result.append(("scale " + str(env_size) + "x" + str(env_size) + " " + str(pop_size) + " agents",
+                       case_config(env_size, pop_size, numpy_backends=env_size >= NUMPY_MIN_SIZE), scale_cycles))
+    for move_rule in MOVE_RULES:
+        result.append(("move " + move_rule,
+                       case_config(rule_size, rule_pop_size, move_rule=move_rule, numpy_backends=rule_numpy), cycles))
+    for eat_rule in EAT_RULES:
+        result.append(("eat " + eat_rule,
+                       case_config(rule_size, rule_pop_size, eat_rule=eat_rule, numpy_backends=rule_numpy), cycles))
+    for order in ORDERS:
+        result.append(("order " + order,
+                       case_config(rule_size, rule_pop_size, order=order, numpy_backends=rule_numpy), cycles))
+    for move_rule in INDEXED_MOVE_RULES:
+        for indexes in (True, False):
+            result.append((("index " if indexes else "scan ") + move_rule,
+                           case_config(rule_size, rule_pop_size, move_rule=move_rule, indexes=indexes), cycles))
+    return result
+
+def peak_rss_mb():
+    """
+        Return the peak resident memory of the current process in
+        MB (None if it cannot be measured).
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS.
+    if sys.platform == "darwin":
+        return peak / (1024*1024)
+    return peak / 1024
+
+def run_case(config, cycles):
+    """
+        Run a case in the current process and return its results
+        (see RESULTS, with the number of cycles and agent updates
+        run and the initialisation time).
+    """
+    config = dict(config)
+    config["MAX_CYCLE"] = str(cycles)
+    if config.pop(WITHOUT_INDEXES, None) is not None:
+        # Only in this process (see run_case_in_process).
+        for move_rule in INDEXED_MOVE_RULES:
+            ix.register_indexed_rule(getattr(a, move_rule), ())
+    start = time.perf_counter()
+    mas = m.new_instance_from_config(config)
+    e.set_cell_sugar_level_to_capacity(m.get_env(mas))
+    setup_seconds = time.perf_counter() - start
+    pop = m.get_pop(mas)
+    updates = 0
+    run = 0
+    start = time.perf_counter()
+    while run < cycles and p.size(pop) > 0:
+        updates += p.size(pop)
+        m.run_one_cycle(mas)
+        m.increment_cycle(mas)
+        run += 1
+    seconds = time.perf_counter() - start
+    return {
+        "cycles": run,
+        "agent_updates": updates,
+        "setup_seconds": round(setup_seconds, 3),
+        "seconds": round(seconds, 3),
+        "cycles_per_second": run/seconds if seconds > 0 else 0.0,
+        "agent_updates_per_second": updates/seconds if seconds > 0 else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def run_case_in_process(config, cycles):
+    """
+        Run a case in a new process (see run_case) and return its
+        results.
+    """
+    task = json.dumps({"config": config, "cycles": cycles})
+    completed = subprocess.run([sys.executable, os.path.abspath(__file__), "--case", task],
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True,
+                               cwd=os.path.dirname(os.path.abspath(__file__)))
+    if completed.returncode != 0:
+        raise Exception("Benchmark case failed:\n" + completed.stderr)
+    return json.loads(completed.stdout)
+
+def best_results(runs):
+    """
+        Return the results of the first run with the best value of
+        each of the RESULTS among the runs of a case.
+    """
+    results = dict(runs[0])
+    for (result, higher_is_better) in RESULTS.items():
+        values = [run[result] for run in runs if run[result] is not None]
+        if len(values) > 0:
+            results[result] = max(values) if higher_is_better else min(values)
+    return results
+
+def run_benchmarks(preset, repeat=1, progress=None):
+    """
+        Run the cases of the preset, each "repeat" times in its own
+        process, and return the benchmark: {"preset": ..., "cases":
+        name -> best results}. progress is called with the name and
+        results of each case.
+    """
+    benchmark = {"preset": preset, "repeat": repeat, "python": sys.version.split()[0], "cases": {}}
+    for (name, config, cycles) in cases(preset):
+        results = best_results([run_case_in_process(config, cycles) for i in range(repeat)])
+        benchmark["cases"][name] = results
+        if progress is not None:
+            progress(name, results)
+    return benchmark
+
+# --- Baselines ---
+
+def compare(benchmark, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+        Return the regressions of the benchmark relative to the
+        baseline: (case, result, value, baseline value) for each
+        result worse than the baseline by more than the tolerance.
+        Cases that are not in both are ignored.
+    """
+    regressions = []
+    for (name, results) in benchmark["cases"].items():
+        baseline_results = baseline["cases"].get(name)
+        if baseline_results is None:
+            continue
+        for (result, higher_is_better) in RESULTS.items():
+            value = results.get(result)
+            reference = baseline_results.get(result)
+            if value is None or reference is None:
+                continue
+            if higher_is_better:
+                regressed = value < reference*(1 - tolerance)
+            else:
+                regressed = value > reference*(1 + tolerance)
+            if regressed:
+                regressions.append((name, result, value, reference))
+    return regressions
+
+def read_benchmark(file_name):
+    """
+        Return the benchmark saved in the JSON file.
+    """
+    f = open(file_name)
+    try:
+        return json.load(f)
+    finally:
+        f.close()
+
+def write_benchmark(benchmark, file_name):
+    """
+        Save the benchmark in a JSON file (e.g. as a baseline).
+    """
+    f = open(file_name, "w")
+    try:
+        json.dump(benchmark, f, indent=2, sort_keys=True)
+    finally:
+        f.close()
+
+# --- Command line ---
+
+def __show_case(name, results):
+    # Print the results of a case.
+    print("{:<50} {:>10.2f} cycles/s {:>14.0f} updates/s {:>10} MB".format(
+        name, results["cycles_per_second"], results["agent_updates_per_second"],
+        format(results["peak_rss_mb"], ".1f") if results["peak_rss_mb"] is not None else "-"))
+
+def main(argv=None):
+    """
+        Command line entry point (see the top of this module).
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the MAS simulator.")
+    parser.add_argument("--preset", choices=sorted(PRESETS), default=DEFAULT_PRESET,
+                        help="cases to run (default: " + DEFAULT_PRESET + ")")
+    parser.add_argument("-r", "--repeat", type=int, default=DEFAULT_REPEAT,
+                        help="runs of each case, the best is kept (default: " + str(DEFAULT_REPEAT) + ")")
+    parser.add_argument("-o", "--output", default=None, help="JSON file to save the results (e.g. a new baseline)")
+    parser.add_argument("-b", "--baseline", default=None, help="JSON file of the results to compare with")
+    parser.add_argument("-t", "--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="accepted relative regression (default: " + str(DEFAULT_TOLERANCE) + ")")
+    parser.add_argument("--case", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.case is not None:
+        # A case run by run_case_in_process.
+        task = json.loads(args.case)
+        print(json.dumps(run_case(task["config"], task["cycles"])))
+        return 0
+    benchmark = run_benchmarks(args.preset, args.repeat, __show_case)
+    if args.output is not None:
+        write_benchmark(benchmark, args.output)
+    if args.baseline is not None:
+        regressions = compare(benchmark, read_benchmark(args.baseline), args.tolerance)
+        for (name, result, value, reference) in regressions:
+            print("REGRESSION", name, result, format(value, ".2f"), "(baseline", format(reference, ".2f") + ")")
+        if len(regressions) > 0:
+            return 1
+        print("No regression (tolerance", str(args.tolerance) + ")")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
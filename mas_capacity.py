@@ -0,0 +1,211 @@
+#==================================================
+# INFO-H-100 - Introduction à l'informatique
+#
+# Prof. Thierry Massart
+# Année académique 2014-2015
+#
+# Projet: Système Multi-Agent (SMA)
+#
+#==================================================
+
+
+
+import hashlib
+import json
+import math
+import os
+
+import mas_environment as e
+import mas_registry as reg
+
+# Capacity maps are computed on whole arrays with NumPy when it
+# is installed (NumPy is optional).
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+
+#==================================================
+#  CAPACITY MAPS
+#==================================================
+#
+# The capacity distributions of a configuration (see
+# ADD_CAPACITY_DISTRIB) add capacity to the cells one
+# cell at a time (see e.add_capacity_gaussian), which
+# takes minutes for large environments.
+#
+# With NumPy, the capacity map of all distributions is
+# built at once instead: each distribution has a
+# kernel, the profile of the capacity it adds along x
+# and along y (e.g. a Gaussian), so that the capacity
+# it adds to cell (x, y) is the product of the two.
+# The profiles are folded modulo the size of the
+# environment (the environment is a torus) and their
+# products are added to the map. The map is clamped to
+# the maximum capacity once, at the end, which is the
+# same as clamping after each distribution since
+# capacities are only added.
+#
+# The map of the distributions (before clamping) can
+# be kept in a cache directory (see CAPACITY_CACHE),
+# in a file named after a hash of the size and maximum
+# capacity of the environment and of the distributions,
+# so that it is built once for all the runs of a sweep.
+#
+# Without NumPy, or if a distribution has no kernel
+# (see register_kernel), the distributions are applied
+# to the cells one at a time.
+#
+#==================================================
+
+# --- Constants ---
+
+CACHE_VERSION = 1           # Part of the hash: change it when the kernels change
+
+# --- Kernels ---
+
+# Note: A kernel returns the profiles (along x, along y) of the
+#       capacity added by a distribution, folded on the size of
+#       the environment. It receives the size and the maximum
+#       capacity of the environment, then the parameters of the
+#       distribution (without "env").
+
+def __fold(env_size, coords, values):
+    # Return the profile of the given values at the given
+    # coordinates, folded modulo the size of the environment.
+    return np.bincount(np.mod(coords, env_size), weights=values, minlength=env_size)
+
+def gaussian_kernel(env_size, env_max_capacity, max_capacity_factor, center, disp):
+    """
+        Kernel of e.add_capacity_gaussian.
+    """
+    max_capacity = env_max_capacity*max_capacity_factor
+    (cx, cy) = center
+    # Same cells as e.add_capacity_gaussian.
+    min_capacity = max_capacity*1E-3
+    max_dist = math.ceil(disp*math.sqrt(-2*math.log(min_capacity)))
+    offsets = np.arange(-max_dist, max_dist)
+    profile = np.exp(-0.5*(offsets/disp)**2)
+    return (__fold(env_size, cx+offsets, max_capacity*profile),
+            __fold(env_size, cy+offsets, profile))
+
+def uniform_kernel(env_size, env_max_capacity, max_capacity_factor, center, radius):
+    """
+        Kernel of e.add_capacity_uniform.
+    """
+    (cx, cy) = center
+    offsets = np.arange(-radius, radius+1)
+    profile = np.ones(len(offsets))
+    return (__fold(env_size, cx+offsets, env_max_capacity*max_capacity_factor*profile),
+            __fold(env_size, cy+offsets, profile))
+
+# Capacity distribution -> kernel (see register_kernel).
+__distribution_kernels = None
+
+def __kernels():
+    # Return the kernels of the distributions. They are only
+    # registered on first use, because "mas_environment" may not
+    # be completely loaded yet when this module is imported.
+    global __distribution_kernels
+    if __distribution_kernels is None:
+        __distribution_kernels = {
+            e.add_capacity_gaussian: gaussian_kernel,
+            e.add_capacity_uniform: uniform_kernel,
+        }
+    return __distribution_kernels
+
+def register_kernel(distribution, kernel):
+    """
+        Declare the kernel of a capacity distribution (see the
+        top of this module), so that it is part of the capacity
+        maps built at once.
+    """
+    __kernels()[distribution] = kernel
+
+# --- Capacity maps ---
+
+def has_kernels(distributions):
+    """
+        Return (boolean) whether or not the capacity map of the
+        distributions (calls of the configuration, see
+        ADD_CAPACITY_DISTRIB) can be built at once.
+    """
+    if np is None:
+        return False
+    kernels = __kernels()
+    return all(reg.parse_capacity_distribution(distrib)[0] in kernels for distrib in distributions)
+
+def capacity_map(env_size, max_capacity, distributions):
+    """
+        Return the capacity added by the distributions (calls of
+        the configuration) to an environment of the given size
+        and maximum capacity, as a 2D NumPy array (indexed as
+        [y, x]), not clamped to the maximum capacity.
+    """
+    kernels = __kernels()
+    capacities = np.zeros((env_size, env_size), dtype=np.float64)
+    for distrib in distributions:
+        (fn, args, kwargs) = reg.parse_capacity_distribution(distrib)
+        (profile_x, profile_y) = kernels[fn](env_size, max_capacity, *args, **kwargs)
+        # Only the rows and columns the distribution reaches.
+        xs = np.flatnonzero(profile_x)
+        ys = np.flatnonzero(profile_y)
+        capacities[np.ix_(ys, xs)] += np.outer(profile_y[ys], profile_x[xs])
+    return capacities
+
+def cache_file(cache_dir, env_size, max_capacity, distributions):
+    """
+        Return the file of the capacity map of the distributions in
+        the cache directory.
+    """
+    key = json.dumps([CACHE_VERSION, env_size, max_capacity,
+                      [distrib.strip() for distrib in distributions]])
+    return os.path.join(cache_dir, hashlib.sha256(key.encode("utf-8")).hexdigest() + ".npy")
+
+def cached_capacity_map(cache_dir, env_size, max_capacity, distributions):
+    """
+        Return the capacity map of the distributions (see
+        capacity_map) from the cache directory, building and
+        writing it there if it is not cached yet.
+    """
+    file_name = cache_file(cache_dir, env_size, max_capacity, distributions)
+    if os.path.exists(file_name):
+        return np.load(file_name, allow_pickle=False)
+    capacities = capacity_map(env_size, max_capacity, distributions)
+    os.makedirs(cache_dir, exist_ok=True)
+    # Written next to its final name, then renamed, so that
+    # concurrent runs never read a partial file.
+    temp_name = file_name + "." + str(os.getpid()) + ".tmp"
+    f = open(temp_name, "wb")
+    try:
+        np.save(f, capacities)
+    finally:
+        f.close()
+    os.replace(temp_name, file_name)
+    return capacities
+
+def apply_distributions(env, distributions, cache_dir=None):
+    """
+        Add the capacity of the distributions (calls of the
+        configuration, see ADD_CAPACITY_DISTRIB) to the cells of
+        the environment, at once if they all have a kernel,
+        otherwise one distribution at a time. With a cache
+        directory, the capacity map is kept there (see
+        cached_capacity_map).
+    """
+    if not has_kernels(distributions):
+        for distrib in distributions:
+            reg.resolve_capacity_distribution(distrib)(env)
+        return
+    if len(distributions) == 0:
+        return
+    env_size = e.size(env)
+    max_capacity = e.get_max_capacity(env)
+    if cache_dir is not None:
+        added = cached_capacity_map(cache_dir, env_size, max_capacity, distributions)
+    else:
+        added = capacity_map(env_size, max_capacity, distributions)
+    capacities = np.asarray(e.get_capacities(env), dtype=np.float64) + added
+    e.set_capacities(env, np.minimum(capacities, max_capacity))
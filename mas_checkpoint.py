@@ -0,0 +1,194 @@
+#==================================================
+# INFO-H-100 - Introduction à l'informatique
+#
+# Prof. Thierry Massart
+# Année académique 2014-2015
+#
+# Projet: Système Multi-Agent (SMA)
+#
+#==================================================
+
+
+
+import json
+import math
+import os
+
+import mas as m
+import mas_agent as a
+import mas_environment as e
+import mas_population as p
+import mas_random as r
+import mas_registry as reg
+import mas_scheduler as sch
+
+# Checkpoints are NumPy archives (NumPy is optional).
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+
+#==================================================
+#  CHECKPOINTS
+#==================================================
+#
+# A checkpoint is the complete state of a MAS between
+# two cycles, in a single NumPy archive (".npz"):
+#
+#  - the sugar levels and capacities of the cells,
+#    and the order of the cells without agent (see
+#    mas_environment.get_free_cells),
+#  - one column per agent property (in activation
+#    order), and the sugar levels known by the
+#    maintained order (see "mas_scheduler"),
+#  - a JSON description of the rest: the configuration
+#    of the MAS (sizes, backends, properties, names of
+#    the rules, see "mas_registry"), the cycle, the
+#    numbers of dead and born agents and the state of
+#    the random stream.
+#
+# An experiment resumed from a checkpoint (see
+# mas.load_checkpoint) makes exactly the same cycles as
+# the experiment that wrote it.
+#
+# The file is first written next to its final name,
+# then renamed, so that a process killed while writing
+# leaves the previous checkpoint intact.
+#
+#==================================================
+
+# --- Constants ---
+
+VERSION = 1
+
+# Agent columns: (name, dtype), in the order of __agent_values.
+AGENT_COLUMNS = (
+    ("metabolism", "float64"),
+    ("x", "int32"),
+    ("y", "int32"),
+    ("sugar_level", "float64"),
+    ("vision_capacity", "int32"),
+    ("age", "int32"),
+    ("sex", "int8"),
+)
+
+# --- Private functions ---
+
+# Note: These functions should not be called outside this module.
+
+def __check_numpy():
+    # Raise an exception if NumPy is not installed.
+    if np is None:
+        raise Exception("Checkpoints require NumPy to be installed.")
+
+def __agent_values(agent):
+    # Return the values of the AGENT_COLUMNS for the agent.
+    (x, y) = a.get_pos(agent)
+    return (a.get_metabolism(agent), x, y, a.get_sugar_level(agent),
+            a.get_vision_capacity(agent), a.get_age(agent), a.get_sex(agent))
+
+def __config(mas):
+    # Return the configuration that creates the MAS (without its
+    # agents and capacity distributions, which are saved as arrays).
+    env = m.get_env(mas)
+    pop = m.get_pop(mas)
+    config = {
+        "ENV_SIZE": str(e.size(env)),
+        "POP_SIZE": "0",
+        "ENV_BACKEND": e.NUMPY_BACKEND if e.is_array_backed(env) else e.LIST_BACKEND,
+        "POP_BACKEND": p.NUMPY_BACKEND if p.get_store(pop) is not None else p.LIST_BACKEND,
+        "MAX_CYCLE": str(m.get_max_cycle(mas)),
+        "SEED": str(r.get_seed(m.get_rng(mas))),
+        "AGENT_PIPELINE": m.get_agent_pipeline(mas),
+        "ENV": ["MAX_CAPACITY : " + repr(float(e.get_max_capacity(env)))],
+        "POP": [key + " : " + repr(value) for (key, value) in p.get_properties(pop).items()],
+        "ADD_CELL_RULE": [reg.name_of(reg.CELL_RULE, rule) for rule in m.get_cell_rules(mas)],
+        "ADD_AGENT_RULE": [reg.name_of(reg.AGENT_RULE, rule) for rule in m.get_agent_rules(mas)],
+        "ENDING_CONDITION": reg.name_of(reg.ENDING_CONDITION, m.get_ending_condition(mas)),
+    }
+    order_activation = m.get_order_activation(mas)
+    if order_activation is not None:
+        config["ORDER_ACTIVATION"] = reg.name_of(reg.ORDER_ACTIVATION, order_activation)
+    checkpoint = m.get_checkpoint(mas)
+    if checkpoint is not None:
+        config["CHECKPOINT_FILE"] = checkpoint[0]
+        config["CHECKPOINT_EVERY"] = str(checkpoint[1])
+    return config
+
+# --- Save and load ---
+
+def save(mas, file_name):
+    """
+        Write a checkpoint of the MAS in the file.
+    """
+    __check_numpy()
+    env = m.get_env(mas)
+    pop = m.get_pop(mas)
+    agents = p.get_agents(pop)
+    arrays = {
+        "levels": np.asarray(e.get_sugar_levels(env), dtype=np.float64),
+        "capacities": np.asarray(e.get_capacities(env), dtype=np.float64),
+        "free_cells": np.array(e.get_free_cells(env), dtype=np.int32),
+    }
+    rows = [__agent_values(agent) for agent in agents]
+    for (i, (name, dtype)) in enumerate(AGENT_COLUMNS):
+        arrays[name] = np.array([row[i] for row in rows], dtype=dtype)
+    last_sugar_levels = sch.get_last_sugar_levels(pop)
+    if last_sugar_levels is not None:
+        arrays["last_sugar_level"] = np.array(
+            [level if level is not None else np.nan for level in last_sugar_levels], dtype=np.float64)
+    meta = {
+        "version": VERSION,
+        "config": __config(mas),
+        "cycle": m.get_cycle(mas),
+        "dead_agents": p.get_dead_agents(pop),
+        "births": p.get_births(pop),
+        "rng": r.get_state(m.get_rng(mas)),
+    }
+    arrays["meta"] = np.frombuffer(json.dumps(meta).encode("utf-8"), dtype=np.uint8)
+    temp_name = file_name + ".tmp"
+    f = open(temp_name, "wb")
+    try:
+        np.savez(f, **arrays)
+    finally:
+        f.close()
+    os.replace(temp_name, file_name)
+
+def load(file_name):
+    """
+        Return a new MAS in the state saved in the checkpoint file.
+    """
+    __check_numpy()
+    archive = np.load(file_name, allow_pickle=False)
+    try:
+        arrays = {name: archive[name] for name in archive.files}
+    finally:
+        archive.close()
+    meta = json.loads(arrays["meta"].tobytes().decode("utf-8"))
+    if meta["version"] != VERSION:
+        raise Exception("Unsupported checkpoint version: " + str(meta["version"]))
+    mas = m.new_instance_from_config(meta["config"])
+    # Cells (capacities first: a sugar level cannot exceed them)
+    env = m.get_env(mas)
+    e.set_capacities(env, arrays["capacities"])
+    e.set_sugar_levels(env, arrays["levels"])
+    # Agents, in activation order
+    pop = m.get_pop(mas)
+    columns = [arrays[name].tolist() for (name, dtype) in AGENT_COLUMNS]
+    for (metabolism, x, y, sugar_level, vision_capacity, age, sex) in zip(*columns):
+        p.add_agent(pop, a.restore_instance(pop, metabolism, (x, y), sugar_level,
+                                            vision_capacity, age, sex))
+    # The free cells are drawn by their order, which depends on
+    # the history of the experiment.
+    if "free_cells" in arrays:
+        e.set_free_cells(env, arrays["free_cells"].tolist())
+    p.set_dead_agents(pop, meta["dead_agents"])
+    p.set_births(pop, meta["births"])
+    if "last_sugar_level" in arrays:
+        sch.set_last_sugar_levels(pop, [None if math.isnan(level) else level
+                                        for level in arrays["last_sugar_level"].tolist()])
+    m.set_cycle(mas, meta["cycle"])
+    r.set_state(m.get_rng(mas), meta["rng"])
+    return mas
@@ -0,0 +1,202 @@
+#==================================================
+# INFO-H-100 - Introduction à l'informatique
+#
+# Prof. Thierry Massart
+# Année académique 2014-2015
+#
+# Projet: Système Multi-Agent (SMA)
+#
+#==================================================
+
+
+
+import argparse
+import csv
+import multiprocessing
+import sys
+
+import mas as m
+import mas_agent as a
+import mas_environment as e
+import mas_population as p
+import mas_random as r
+import mas_stats as st
+import mas_sweep as sw
+import mas_utils as u
+
+
+
+#==================================================
+#  REPLICATE ENSEMBLE
+#==================================================
+#
+# Run, without visualisation, R replicates of the same
+# configuration, each with its own seed, on all the
+# cores, and write per-cycle statistics of the metrics
+# of the replicates in a CSV file:
+#
+#   python3 mas_ensemble.py -c config.cfg -r 200 -o ensemble.csv
+#
+# For each cycle (0 is the initial state) and each
+# metric (see METRICS), a row gives the number of
+# replicates, the mean, the standard deviation, the 95%
+# confidence interval of the mean and the estimates of
+# the quantiles (5%, 50% and 95% by default).
+#
+# The statistics are computed while the replicates
+# finish (see "mas_stats"): the memory used does not
+# depend on the number of replicates.
+#
+# A replicate that ends before MAX_CYCLE (e.g. when no
+# agent is left) keeps its last values until MAX_CYCLE.
+#
+# The seed of each replicate is derived from the SEED
+# of the configuration (or from a new seed) and the
+# number of the replicate, and the replicates are added
+# to the statistics in order, so the results do not
+# depend on the number of workers.
+#
+#==================================================
+
+# --- Constants ---
+
+METRICS = ["population", "dead_agents", "total_sugar"]
+STATS_FIELDS = ["cycle", "metric", "count", "mean", "std", "ci_low", "ci_high"]
+DEFAULT_QUANTILES = [0.05, 0.5, 0.95]
+
+# --- Replicates ---
+
+def metrics(mas):
+    """
+        Return the values of the METRICS for the current state of
+        the MAS.
+    """
+    pop = m.get_pop(mas)
+    agent_sugar = sum(a.get_sugar_level(agent) for agent in p.get_agents(pop))
+    return (p.size(pop), p.get_dead_agents(pop),
+            e.total_sugar_level(m.get_env(mas)) + agent_sugar)
+
+def run_replicate(task):
+    """
+        Run the replicate of a task (seed, configuration) and
+        return the values of the METRICS for each cycle, from 0 to
+        the maximum number of cycles.
+    """
+    (seed, config) = task
+    config = dict(config)
+    config["SEED"] = str(seed)
+    mas = m.new_instance_from_config(config, sw.worker_capacity_map(config))
+    e.set_cell_sugar_level_to_capacity(m.get_env(mas))
+    max_cycle = m.get_max_cycle(mas)
+    ending_condition = m.get_ending_condition(mas)
+    values = [metrics(mas)]
+    while m.get_cycle(mas) < max_cycle and not ending_condition(mas):
+        m.run_one_cycle(mas)
+        m.increment_cycle(mas)
+        values.append(metrics(mas))
+    # Keep the last values after an early end.
+    values.extend([values[-1]]*(max_cycle+1-len(values)))
+    return values
+
+# --- Statistics ---
+
+def new_statistics(cycles, quantiles):
+    """
+        Return the accumulators of the statistics: for each cycle
+        and metric, a moments accumulator and the quantile
+        estimators.
+    """
+    return [[(st.new_moments(), [st.new_quantile(q) for q in quantiles])
+             for metric in METRICS] for cycle in range(cycles)]
+
+def add_replicate(statistics, values):
+    """
+        Add the values of a replicate (see run_replicate) to the
+        statistics.
+    """
+    for (cycle_statistics, cycle_values) in zip(statistics, values):
+        for ((moments, estimators), value) in zip(cycle_statistics, cycle_values):
+            st.add_to_moments(moments, value)
+            for estimator in estimators:
+                st.add_to_quantile(estimator, value)
+
+def quantile_field(q):
+    """
+        Return the name of the CSV column of the quantile q.
+    """
+    return "q" + format(q, "g")
+
+def rows(statistics, quantiles):
+    """
+        Return the CSV rows of the statistics.
+    """
+    for (cycle, cycle_statistics) in enumerate(statistics):
+        for (metric, (moments, estimators)) in zip(METRICS, cycle_statistics):
+            (ci_low, ci_high) = st.confidence_interval(moments)
+            row = {
+                "cycle": cycle,
+                "metric": metric,
+                "count": st.count(moments),
+                "mean": st.mean(moments),
+                "std": st.std(moments),
+                "ci_low": ci_low,
+                "ci_high": ci_high,
+            }
+            for (q, estimator) in zip(quantiles, estimators):
+                row[quantile_field(q)] = st.quantile_value(estimator)
+            yield row
+
+def run_ensemble(config, replicates, output, workers=None, quantiles=DEFAULT_QUANTILES):
+    """
+        Run the replicates of the configuration with the given
+        number of worker processes (all cores by default), and
+        write the per-cycle statistics of their metrics in the CSV
+        file output. Return the seed of the ensemble.
+    """
+    if replicates < 1:
+        raise ValueError("An ensemble needs at least one replicate.")
+    sw.check(config)
+    seed = u.cfg_seed(config)
+    if seed is None:
+        seed = r.get_seed(r.new_instance())
+    tasks = ((r.derive_seed(seed, "replicate", i), config) for i in range(replicates))
+    statistics = new_statistics(u.cfg_max_cycle(config)+1, quantiles)
+    (shared_maps, memories) = sw.share_capacity_maps([config])
+    try:
+        if workers == 1:
+            sw.init_worker(shared_maps)
+            for values in map(run_replicate, tasks):
+                add_replicate(statistics, values)
+        else:
+            with multiprocessing.Pool(workers, sw.init_worker, (shared_maps,)) as pool:
+                for values in pool.imap(run_replicate, tasks):
+                    add_replicate(statistics, values)
+    finally:
+        sw.release_capacity_maps(memories)
+    with open(output, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=STATS_FIELDS + [quantile_field(q) for q in quantiles])
+        writer.writeheader()
+        writer.writerows(rows(statistics, quantiles))
+    return seed
+
+# --- Command line ---
+
+def main(argv=None):
+    """
+        Command line entry point (see the top of this module).
+    """
+    parser = argparse.ArgumentParser(description="Run replicates of a MAS experiment.")
+    parser.add_argument("-c", "--config", default="config.cfg", help="configuration (default: config.cfg)")
+    parser.add_argument("-r", "--replicates", type=int, default=200, help="number of replicates (default: 200)")
+    parser.add_argument("-o", "--output", default="ensemble.csv", help="statistics CSV file (default: ensemble.csv)")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("-q", "--quantiles", default=",".join(format(q, "g") for q in DEFAULT_QUANTILES),
+                        help="quantiles, separated by \",\" (default: 0.05,0.5,0.95)")
+    args = parser.parse_args(argv)
+    config = u.config_read_file(args.config)
+    quantiles = [float(q) for q in args.quantiles.split(",") if q.strip() != ""]
+    seed = run_ensemble(config, args.replicates, args.output, args.workers, quantiles)
+    print(args.replicates, "replicates (seed", str(seed) + ") written to", args.output)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
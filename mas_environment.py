@@ -10,12 +10,23 @@
 
 
 
+import array
 import math
-import random
+import operator
 
 import mas as m
 import mas_cell as c
 import mas_utils as u
+import mas_random as r
+import mas_registry as reg
+
+# The array-backed environment needs NumPy, which is optional.
+try:
+    import numpy as np
+    import mas_grid as g
+except ImportError:
+    np = None
+    g = None
 
 
 
@@ -25,10 +36,18 @@ import mas_utils as u
 
 # --- Constants ---
 
-MAX_IDX = 2
+MAX_IDX = 5
 MAS_IDX = 0              # MAS the environment belongs to
 CELL_MATRIX_IDX = 1      # The matrix of cells
 MAX_CAPACITY_IDX = 2     # Maximum capacity any cell can bear 
+GRID_IDX = 3             # NumPy grid (only for the "numpy" backend)
+FREE_CELLS_IDX = 4       # Ids of the cells without agent (see "Free cells")
+FREE_POSITIONS_IDX = 5   # Cell id -> position in the free cells (NOT_FREE if none)
+
+LIST_BACKEND = "list"    # One "mas_cell" list per cell
+NUMPY_BACKEND = "numpy"  # Structure of arrays (see "mas_grid")
+
+NOT_FREE = -1            # Position of an occupied cell in the free cells
 
 # --- Private functions --- 
 
@@ -57,6 +76,29 @@ def __empty_cell_matrix(env,sz):
         mat.append(row)
     return mat
 
+def __new_free_cells(env, sz):
+    # All cells are free. The ids are stored as 32 bits integers,
+    # which is much smaller than lists for large environments.
+    cell_ids = array.array("i")
+    if np is not None:
+        # Much faster than from a range for large environments.
+        cell_ids.frombytes(np.arange(sz*sz, dtype=np.int32).tobytes())
+    else:
+        cell_ids.extend(range(sz*sz))
+    __set_property(env, FREE_CELLS_IDX, cell_ids)
+    __set_property(env, FREE_POSITIONS_IDX, array.array("i", cell_ids))
+
+def __cell_id(env, cell_ref):
+    # Return the id (y*size+x) of the referenced cell.
+    sz = size(env)
+    (x, y) = cell_ref
+    return (y%sz)*sz + x%sz
+
+def __cell_ref(env, cell_id):
+    # Return the reference of the cell of the given id.
+    (y, x) = divmod(cell_id, size(env))
+    return (x, y)
+
 # --- Getters and setters ---
 
 def get_mas(env):
@@ -100,12 +142,35 @@ def set_max_capacity(env, max_capacity):
     """
     __set_property(env, MAX_CAPACITY_IDX, max_capacity)
 
+def get_grid(env):
+    """
+        Return the NumPy grid of the environment, or None if the
+        environment does not use the "numpy" backend.
+    """
+    return __get_property(env, GRID_IDX)
+
+def set_grid(env, grid):
+    """
+        Set the NumPy grid of the environment.
+    """
+    __set_property(env, GRID_IDX, grid)
+
+def is_array_backed(env):
+    """
+        Return (boolean) whether or not the cells of the environment
+        are stored in NumPy arrays.
+    """
+    return get_grid(env) is not None
+
 # ---
 
 def get_cell(env, cell_ref):
     """
         Return the referenced cell of the environment.
     """
+    grid = get_grid(env)
+    if grid is not None:
+        return g.get_cell(grid, cell_ref)
     mat = get_cell_matrix(env)
     sz = size(env)
     (x, y) = cell_ref
@@ -116,6 +181,9 @@ def get_cells(env):
         Return the list of all cells. Useful for iterating through
         all cells without knowing the underlying data structure.
     """
+    grid = get_grid(env)
+    if grid is not None:
+        return g.get_cells(grid)
     ls = []
     for cell_ref in get_cell_refs(env):
         cell = get_cell(env, cell_ref)
@@ -140,16 +208,28 @@ def new_instance(mas,config):
     """ 
         Return a new environment instance of size "sz" and 
         "declare" to which MAS it belongs to.
+        The cells are stored according to the ENV_BACKEND of the
+        configuration: "list" (default) or "numpy".
     """
     env = __empty_instance()
     # Set max capacity first, because initialisation of cells
     # depend on it.
     properties = u.cfg_env_properties(config)
     sz = u.cfg_env_size(config)
+    backend = u.cfg_env_backend(config)
     set_max_capacity(env, properties["MAX_CAPACITY"])
-    mat = __empty_cell_matrix(env,sz)
     set_mas(env, mas)
-    set_cell_matrix(env, mat)
+    if backend == LIST_BACKEND:
+        set_cell_matrix(env, __empty_cell_matrix(env,sz))
+        set_grid(env, None)
+    elif backend == NUMPY_BACKEND:
+        if g is None:
+            raise Exception("The numpy environment backend requires NumPy to be installed.")
+        set_cell_matrix(env, None)
+        set_grid(env, g.new_instance(env, sz))
+    else:
+        raise Exception("Unknown environment backend: " + str(backend))
+    __new_free_cells(env, sz)
     return env
 
 # --- Global environment information ---
@@ -161,6 +241,9 @@ def size(env):
         number of cells in the environment is the square value of 
         the size.
     """
+    grid = get_grid(env)
+    if grid is not None:
+        return g.size(grid)
     mat = get_cell_matrix(env)
     return len(mat)
 
@@ -210,22 +293,106 @@ def random_cell_ref(env):
         agent initialisation).
     """
     sz = size(env)
-    res = ( random.randint(0, sz-1), random.randint(0, sz-1) )
+    rng = m.get_rng(get_mas(env))
+    res = ( r.randint(rng, 0, sz-1), r.randint(rng, 0, sz-1) )
     return res
 
 def random_cell_ref_without_agent(env):
     """
         Return a random position in the environment that has no
-        agent on it (e.g., for agent initialisation). 
-        Assumption: There is at least one free cell in the environment.
+        agent on it (e.g., for agent initialisation). An
+        exception is raised if there is no free cell.
+    """
+    free_cells = __get_property(env, FREE_CELLS_IDX)
+    if len(free_cells) == 0:
+        raise Exception("The environment is full: there is no cell without agent.")
+    # A uniform draw scaled to the number of free cells, because
+    # integer draws are buffered by bounds (see "mas_random").
+    rng = m.get_rng(get_mas(env))
+    i = min(int(r.uniform(rng, 0.0, 1.0)*len(free_cells)), len(free_cells)-1)
+    return __cell_ref(env, free_cells[i])
+
+def random_cell_refs_without_agent(env, n):
+    """
+        Return n distinct random positions in the environment that
+        have no agent on them, drawn at once (e.g., for the
+        initial population). An exception is raised if there are
+        not enough free cells.
+    """
+    free_cells = __get_property(env, FREE_CELLS_IDX)
+    if n > len(free_cells):
+        raise Exception("The environment is full: " + str(n) + " agents cannot be placed on "
+                        + str(len(free_cells)) + " cells without agent.")
+    rng = m.get_rng(get_mas(env))
+    return [__cell_ref(env, free_cells[i]) for i in r.sample(rng, len(free_cells), n)]
+
+# --- Free cells ---
+
+# The cells without agent are kept in an array of cell ids
+# (y*size+x), with the position of each cell in this array,
+# so that a random free cell is drawn in constant time.
+# A cell is removed by moving the last free cell in its place
+# ("swap-remove"), so that the array has no hole.
+#
+# Note: occupy_cell and release_cell are called by the
+#       functions that place, move or remove agents (see
+#       "mas_agent", "mas_population" and "mas_kernels").
+
+def free_cells_count(env):
     """
-    # Note: This is not the most efficient approach!
-    continue_search = True
-    while continue_search:
-        cell_ref = random_cell_ref(env)
-        cell = get_cell(env, cell_ref)
-        continue_search = c.agent_is_present(cell)
-    return cell_ref
+        Return the number of cells without agent.
+    """
+    return len(__get_property(env, FREE_CELLS_IDX))
+
+def occupy_cell(env, cell_ref):
+    """
+        Remove the referenced cell from the free cells, because
+        an agent has been placed on it.
+    """
+    free_cells = __get_property(env, FREE_CELLS_IDX)
+    positions = __get_property(env, FREE_POSITIONS_IDX)
+    cell_id = __cell_id(env, cell_ref)
+    position = positions[cell_id]
+    if position == NOT_FREE:
+        raise Exception("The cell " + str(cell_ref) + " is already occupied.")
+    last_id = free_cells.pop()
+    if last_id != cell_id:
+        free_cells[position] = last_id
+        positions[last_id] = position
+    positions[cell_id] = NOT_FREE
+
+def release_cell(env, cell_ref):
+    """
+        Add the referenced cell to the free cells, because its
+        agent has left it.
+    """
+    free_cells = __get_property(env, FREE_CELLS_IDX)
+    positions = __get_property(env, FREE_POSITIONS_IDX)
+    cell_id = __cell_id(env, cell_ref)
+    if positions[cell_id] != NOT_FREE:
+        raise Exception("The cell " + str(cell_ref) + " is already free.")
+    positions[cell_id] = len(free_cells)
+    free_cells.append(cell_id)
+
+def get_free_cells(env):
+    """
+        Return the ids (y*size+x) of the cells without agent, in
+        the order in which they are drawn (e.g. to be saved in a
+        checkpoint, see "mas_checkpoint").
+    """
+    return list(__get_property(env, FREE_CELLS_IDX))
+
+def set_free_cells(env, cell_ids):
+    """
+        Set the ids of the cells without agent, in the order
+        returned by get_free_cells.
+    """
+    free_cells = array.array("i", cell_ids)
+    positions = array.array("i", [NOT_FREE])*(size(env)**2)
+    for (position, cell_id) in enumerate(free_cells):
+        positions[cell_id] = position
+    __set_property(env, FREE_CELLS_IDX, free_cells)
+    __set_property(env, FREE_POSITIONS_IDX, positions)
 
 def add_capacity_gaussian(env, max_capacity_factor, center, disp):
     """
@@ -248,27 +415,132 @@ def add_capacity_gaussian(env, max_capacity_factor, center, disp):
     # capacity.
     max_dist = math.ceil(disp*math.sqrt(-2*math.log(min_capacity)))
     for x in range(cx-max_dist, cx+max_dist):
-        for y in range(cx-max_dist, cx+max_dist):
+        for y in range(cy-max_dist, cy+max_dist):
             capacity = max_capacity*math.exp(-0.5*(u.eucl_dist((x, y), center)/disp)**2)
             cell = get_cell(env, (x, y))
             c.add_capacity(cell, capacity)
 
+def add_capacity_uniform(env, max_capacity_factor, center, radius):
+    """
+        Add the same capacity to the square of cells around a
+        given center, up to "radius" cells from it in both
+        directions. The max_capacity_factor is the added capacity,
+        as a multiplicative factor of the maximum capacity
+        property of the environment.
+    """
+    capacity = get_max_capacity(env)*max_capacity_factor
+    (cx, cy) = center
+    for x in range(cx-radius, cx+radius+1):
+        for y in range(cy-radius, cy+radius+1):
+            cell = get_cell(env, (x, y))
+            c.add_capacity(cell, capacity)
+
+def total_sugar_level(env):
+    """
+        Return the total sugar level of all cells.
+    """
+    grid = get_grid(env)
+    if grid is not None:
+        return float(g.get_levels(grid).sum())
+    # Read the levels without a function call per cell, because
+    # this is done after each cycle by "mas_recorder".
+    sugar_level = operator.itemgetter(c.SUGAR_LEVEL_IDX)
+    return sum(sum(map(sugar_level, row)) for row in get_cell_matrix(env))
+
+def get_capacities(env):
+    """
+        Return the capacity map of the environment: the capacities
+        of all cells as a list of rows (capacities[y][x]), or as a
+        2D NumPy array for an array-backed environment.
+    """
+    grid = get_grid(env)
+    if grid is not None:
+        return g.get_capacities(grid).copy()
+    return [[c.get_capacity(cell) for cell in row] for row in get_cell_matrix(env)]
+
+def set_capacities(env, capacities):
+    """
+        Set the capacity of all cells from a capacity map
+        (capacities[y][x], see get_capacities), e.g. computed once
+        for several environments of the same size.
+    """
+    grid = get_grid(env)
+    if grid is not None:
+        g.set_capacities(grid, capacities)
+    else:
+        for (row, row_capacities) in zip(get_cell_matrix(env), capacities):
+            for (cell, capacity) in zip(row, row_capacities):
+                c.set_capacity(cell, float(capacity))
+
+def get_sugar_levels(env):
+    """
+        Return the sugar levels of all cells as a list of rows
+        (levels[y][x]), or as a 2D NumPy array for an array-backed
+        environment.
+    """
+    grid = get_grid(env)
+    if grid is not None:
+        return g.get_levels(grid).copy()
+    return [[c.get_sugar_level(cell) for cell in row] for row in get_cell_matrix(env)]
+
+def set_sugar_levels(env, levels):
+    """
+        Set the sugar level of all cells (levels[y][x], see
+        get_sugar_levels).
+    """
+    grid = get_grid(env)
+    if grid is not None:
+        g.set_levels(grid, levels)
+    else:
+        for (row, row_levels) in zip(get_cell_matrix(env), levels):
+            for (cell, level) in zip(row, row_levels):
+                c.set_sugar_level(cell, float(level))
+
 def add_capacity_from_string(env, capacity_str):
-    eval(capacity_str)
+    """
+        Apply a capacity distribution call of the configuration
+        (e.g. "add_capacity_gaussian(env, 0.8, (10, 10), 4)") to
+        the environment (see "mas_registry").
+    """
+    reg.resolve_capacity_distribution(capacity_str)(env)
 
 def apply_fn_to_all_cells(env, fn):
     """
         Apply the function fn to all cells of the environment.
     """
-    for cell in get_cells(env):
+    if is_array_backed(env):
+        cells = get_cells(env)
+    else:
+        # Iterate the rows directly instead of rebuilding the
+        # list of all cell references.
+        cells = (cell for row in get_cell_matrix(env) for cell in row)
+    for cell in cells:
         fn(cell)
 
+def apply_cell_rule(env, cell_rule):
+    """
+        Apply a cell rule to all cells of the environment. On an
+        array-backed environment, the array form of the rule is
+        used when it has one (see "mas_grid").
+    """
+    grid = get_grid(env)
+    if grid is not None:
+        array_rule = g.get_array_rule(cell_rule)
+        if array_rule is not None:
+            g.apply_array_rule(grid, array_rule)
+            return
+    apply_fn_to_all_cells(env, cell_rule)
+
 def set_cell_sugar_level_to_capacity(env):
     """
         Set the sugar level of all cells to their respective
         capacity.
     """
-    apply_fn_to_all_cells(env, c.set_sugar_level_to_capacity)
+    grid = get_grid(env)
+    if grid is not None:
+        g.set_sugar_level_to_capacity(grid)
+    else:
+        apply_fn_to_all_cells(env, c.set_sugar_level_to_capacity)
 
 # --- Terminal output ---
 
@@ -0,0 +1,288 @@
+#==================================================
+# INFO-H-100 - Introduction à l'informatique
+#
+# Prof. Thierry Massart
+# Année académique 2014-2015
+#
+# Projet: Système Multi-Agent (SMA)
+#
+#==================================================
+
+
+
+import argparse
+import os
+import queue
+import sys
+import threading
+
+import mas as m
+import mas_environment as e
+import mas_frame as fr
+import mas_raster as ras
+import mas_utils as u
+
+
+
+#==================================================
+#  EXPORT
+#==================================================
+#
+# An exporter is attached to a MAS (see
+# mas.add_cycle_observer) and writes an image of the
+# environment every "every" cycles, without any
+# graphical library (see mas_raster, which needs
+# NumPy), so that experiments run on servers without
+# display can be watched afterwards:
+#
+#   exporter = ex.new_instance(mas, "frames/frame_%06d.png", 10)
+#   m.run_experiment(mas)
+#   ex.close(exporter)
+#
+# The format depends on the extension of the output:
+#
+#  - ".png" or ".ppm": one numbered file per image,
+#    the output being a pattern of file names with the
+#    number of cycles run (as "frame_%06d.png"),
+#  - ".rgb" or ".raw": all the images appended to a
+#    single raw video stream (8 bits RGB, see
+#    image_size), for example for
+#      ffmpeg -f rawvideo -pix_fmt rgb24 -s WxH -i ...
+#
+# The directory of the output is created if needed,
+# and the image of the initial state is written when
+# the exporter is created (before the background
+# thread starts), so that an output that cannot be
+# written fails at once.
+#
+# The images are rendered and encoded by a background
+# thread, so that it overlaps with the cycles. At most
+# QUEUE_SIZE frames wait for the thread: the cycles wait
+# when it is too slow. close() waits until all images
+# are written.
+#
+# This module can also be used from the command line:
+#
+#   python3 mas_export.py -c config.cfg -o frames/frame_%06d.png -k 10
+#
+#==================================================
+
+# --- Constants ---
+
+MAX_IDX = 11
+MAS_IDX = 0                 # MAS the exporter is attached to
+OUTPUT_IDX = 1              # Pattern of file names, or file of the stream
+FORMAT_IDX = 2              # Format of the images (see FORMATS)
+EVERY_IDX = 3               # Number of cycles between two images
+PIXELS_IDX = 4              # Size of the images (see mas_raster.render)
+POOLING_IDX = 5             # Pooling of the images (see mas_raster.render)
+FRAMES_IDX = 6              # Number of images exported
+OBSERVER_IDX = 7            # Cycle observer added to the MAS
+QUEUE_IDX = 8               # Frames for the writer thread (or None)
+THREAD_IDX = 9              # Writer thread (or None)
+ERRORS_IDX = 10             # Errors of the writer thread
+STREAM_IDX = 11             # File of the raw video stream (or None)
+
+PNG_FORMAT = "png"
+PPM_FORMAT = "ppm"
+RAW_FORMAT = "raw"
+
+# Extension -> format.
+FORMATS = {
+    ".png": PNG_FORMAT,
+    ".ppm": PPM_FORMAT,
+    ".rgb": RAW_FORMAT,
+    ".raw": RAW_FORMAT,
+}
+
+DEFAULT_EVERY = 1
+DEFAULT_PIXELS = 570        # As the environment in a mas_visual window
+QUEUE_SIZE = 8
+
+# --- Private functions ---
+
+# Note: These functions should not be called outside this module.
+
+def __get_property(exporter, property_idx):
+    # Return the value of the given property of the exporter.
+    return exporter[property_idx]
+
+def __set_property(exporter, property_idx, value):
+    # Set the value of the given property of the exporter.
+    exporter[property_idx] = value
+
+def __empty_instance():
+    # Return an empty exporter instance.
+    return [None]*(MAX_IDX+1)
+
+def __encode(exporter, frame):
+    # Return the encoded image of the frame.
+    env_size = e.size(m.get_env(__get_property(exporter, MAS_IDX)))
+    image = ras.render(fr.get_color_levels(frame), fr.get_agents(frame), env_size,
+                       __get_property(exporter, PIXELS_IDX), __get_property(exporter, POOLING_IDX))
+    file_format = __get_property(exporter, FORMAT_IDX)
+    if file_format == PNG_FORMAT:
+        return ras.to_png(image)
+    elif file_format == PPM_FORMAT:
+        return ras.to_ppm(image)
+    return image.tobytes()
+
+def __write_frame(exporter, cycle, frame):
+    # Write the image of the frame (in the stream, or in its own
+    # file).
+    data = __encode(exporter, frame)
+    stream = __get_property(exporter, STREAM_IDX)
+    if stream is not None:
+        stream.write(data)
+    else:
+        f = open(__get_property(exporter, OUTPUT_IDX) % cycle, "wb")
+        try:
+            f.write(data)
+        finally:
+            f.close()
+
+def __write(exporter, frames, errors):
+    # Body of the writer thread: write the frames ((cycle, frame)
+    # pairs) until None.
+    try:
+        for (cycle, frame) in iter(frames.get, None):
+            __write_frame(exporter, cycle, frame)
+    except Exception as error:
+        errors.append(error)
+        # Let the simulation go on: the next frames are dropped.
+        for item in iter(frames.get, None):
+            pass
+
+def __export(exporter, cycle):
+    # Export the image of the current state of the MAS as the
+    # image of the given number of cycles run.
+    frame = fr.new_instance_from_mas(__get_property(exporter, MAS_IDX))
+    frames = __get_property(exporter, QUEUE_IDX)
+    if frames is not None:
+        frames.put((cycle, frame))
+    else:
+        __write_frame(exporter, cycle, frame)
+    __set_property(exporter, FRAMES_IDX, __get_property(exporter, FRAMES_IDX)+1)
+
+# --- Initialisation ---
+
+def new_instance(mas, output, every=DEFAULT_EVERY, pixels=DEFAULT_PIXELS,
+                 pooling=ras.DEFAULT_POOLING, threaded=True):
+    """
+        Return a new exporter attached to the MAS, writing an image
+        of about "pixels" pixels every "every" cycles in the output
+        (a pattern of ".png" or ".ppm" file names, or a ".rgb" raw
+        video file). Without threaded, the images are written
+        during the cycles.
+    """
+    if ras.np is None:
+        raise Exception("Exporting images requires NumPy to be installed.")
+    if every < 1:
+        raise ValueError("An exporter needs at least 1 cycle between two images.")
+    file_format = FORMATS.get(os.path.splitext(output)[1].lower())
+    if file_format is None:
+        raise ValueError("Unknown image format: " + output + " (expected " + ", ".join(sorted(FORMATS)) + ")")
+    if file_format != RAW_FORMAT:
+        try:
+            directory = os.path.dirname(output % 0)
+        except TypeError:
+            raise ValueError("The output must be a pattern of file names (as frame_%06d.png): " + output)
+    else:
+        directory = os.path.dirname(output)
+    if directory != "":
+        os.makedirs(directory, exist_ok=True)
+    exporter = __empty_instance()
+    __set_property(exporter, MAS_IDX, mas)
+    __set_property(exporter, OUTPUT_IDX, output)
+    __set_property(exporter, FORMAT_IDX, file_format)
+    __set_property(exporter, EVERY_IDX, every)
+    __set_property(exporter, PIXELS_IDX, pixels)
+    __set_property(exporter, POOLING_IDX, pooling)
+    __set_property(exporter, FRAMES_IDX, 0)
+    __set_property(exporter, ERRORS_IDX, [])
+    if file_format == RAW_FORMAT:
+        __set_property(exporter, STREAM_IDX, open(output, "wb"))
+    # The first image is written now, so that an output that
+    # cannot be written fails before any cycle runs.
+    __export(exporter, m.get_cycle(mas))
+    if threaded:
+        frames = queue.Queue(QUEUE_SIZE)
+        thread = threading.Thread(target=__write, args=(exporter, frames, __get_property(exporter, ERRORS_IDX)),
+                                  name="mas_export", daemon=True)
+        __set_property(exporter, QUEUE_IDX, frames)
+        __set_property(exporter, THREAD_IDX, thread)
+        thread.start()
+    def observer(mas):
+        cycle = m.get_cycle(mas)+1
+        if cycle % __get_property(exporter, EVERY_IDX) == 0:
+            __export(exporter, cycle)
+    __set_property(exporter, OBSERVER_IDX, observer)
+    m.add_cycle_observer(mas, observer)
+    return exporter
+
+# --- Export ---
+
+def image_size(exporter):
+    """
+        Return the (width, height) in pixels of the images.
+    """
+    env_size = e.size(m.get_env(__get_property(exporter, MAS_IDX)))
+    size = ras.image_size(env_size, __get_property(exporter, PIXELS_IDX))
+    return (size, size)
+
+def frames_of(exporter):
+    """
+        Return the number of images exported.
+    """
+    return __get_property(exporter, FRAMES_IDX)
+
+def close(exporter):
+    """
+        Detach the exporter from its MAS and wait until all images
+        are written.
+    """
+    mas = __get_property(exporter, MAS_IDX)
+    observer = __get_property(exporter, OBSERVER_IDX)
+    if observer in m.get_cycle_observers(mas):
+        m.remove_cycle_observer(mas, observer)
+    frames = __get_property(exporter, QUEUE_IDX)
+    if frames is not None:
+        frames.put(None)
+        __get_property(exporter, THREAD_IDX).join()
+        __set_property(exporter, QUEUE_IDX, None)
+    stream = __get_property(exporter, STREAM_IDX)
+    if stream is not None:
+        stream.close()
+        __set_property(exporter, STREAM_IDX, None)
+    errors = __get_property(exporter, ERRORS_IDX)
+    if len(errors) > 0:
+        raise errors[0]
+
+# --- Command line ---
+
+def main(argv=None):
+    """
+        Command line entry point (see the top of this module).
+    """
+    parser = argparse.ArgumentParser(description="Run a MAS experiment and export images of it.")
+    parser.add_argument("-c", "--config", default="config.cfg", help="configuration (default: config.cfg)")
+    parser.add_argument("-o", "--output", default="frame_%06d.png",
+                        help="pattern of .png/.ppm files, or .rgb raw video file (default: frame_%%06d.png)")
+    parser.add_argument("-k", "--every", type=int, default=DEFAULT_EVERY,
+                        help="cycles between two images (default: " + str(DEFAULT_EVERY) + ")")
+    parser.add_argument("-p", "--pixels", type=int, default=DEFAULT_PIXELS,
+                        help="size of the images (default: " + str(DEFAULT_PIXELS) + ")")
+    parser.add_argument("--pooling", choices=(ras.MAX_POOLING, ras.MEAN_POOLING), default=ras.DEFAULT_POOLING,
+                        help="pooling of the cells of large environments (default: " + ras.DEFAULT_POOLING + ")")
+    args = parser.parse_args(argv)
+    config = u.config_read_file(args.config)
+    mas = m.new_instance_from_config(config)
+    e.set_cell_sugar_level_to_capacity(m.get_env(mas))
+    exporter = new_instance(mas, args.output, args.every, args.pixels, args.pooling)
+    m.run_experiment(mas)
+    close(exporter)
+    (width, height) = image_size(exporter)
+    print(frames_of(exporter), "images of", str(width) + "x" + str(height), "pixels written to", args.output)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
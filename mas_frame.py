@@ -0,0 +1,156 @@
+#==================================================
+# INFO-H-100 - Introduction à l'informatique
+#
+# Prof. Thierry Massart
+# Année académique 2014-2015
+#
+# Projet: Système Multi-Agent (SMA)
+#
+#==================================================
+
+
+
+import mas as m
+import mas_agent as a
+import mas_environment as e
+import mas_population as p
+
+# Colour levels are computed on whole arrays with NumPy when it
+# is installed (NumPy is optional).
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+
+#==================================================
+#  FRAME
+#==================================================
+#
+# A frame is what is drawn of the state of a MAS (see
+# mas_visual, mas_raster and mas_export), independent
+# of the MAS and of any graphical library:
+#
+#  - the colour level of each cell, from 0 for a cell
+#    at the maximum capacity to 255 for an empty cell,
+#  - the sex of the agent of each cell (0 if none),
+#  - the cycle and the counters of the population.
+#
+# The cells are ordered by y*size+x (flat NumPy arrays
+# when NumPy is installed, otherwise lists).
+#
+#==================================================
+
+# --- Constants ---
+
+MAX_IDX = 5
+CYCLE_IDX = 0             # Cycle of the frame
+COLORS_IDX = 1            # Colour level of each cell, by y*size+x
+AGENTS_IDX = 2            # Sex of the agent of each cell (0 if none), by y*size+x
+MALES_IDX = 3             # Number of male agents
+FEMALES_IDX = 4           # Number of female agents
+DEAD_AGENTS_IDX = 5       # Number of dead agents
+
+# --- Private functions ---
+
+# Note: These functions should not be called outside this module.
+
+def __get_property(frame, property_idx):
+    # Return the value of the given property of the frame.
+    return frame[property_idx]
+
+def __set_property(frame, property_idx, value):
+    # Set the value of the given property of the frame.
+    frame[property_idx] = value
+
+def __empty_instance():
+    # Return an empty frame instance.
+    return [None]*(MAX_IDX+1)
+
+# --- Initialisation ---
+
+def new_instance(cycle, color_levels, agents, males, females, dead_agents):
+    """
+        Return a new frame with the given colour levels and sexes
+        of the agents of the cells (by y*size+x) and counters.
+    """
+    frame = __empty_instance()
+    __set_property(frame, CYCLE_IDX, cycle)
+    __set_property(frame, COLORS_IDX, color_levels)
+    __set_property(frame, AGENTS_IDX, agents)
+    __set_property(frame, MALES_IDX, males)
+    __set_property(frame, FEMALES_IDX, females)
+    __set_property(frame, DEAD_AGENTS_IDX, dead_agents)
+    return frame
+
+def new_instance_from_mas(mas):
+    """
+        Return a new frame of the current state of the MAS.
+    """
+    env = m.get_env(mas)
+    pop = m.get_pop(mas)
+    env_size = e.size(env)
+    if np is not None:
+        agents = np.zeros(env_size*env_size, dtype=np.int8)
+    else:
+        agents = [0]*(env_size*env_size)
+    for agent in p.get_agents(pop):
+        (x, y) = a.get_pos(agent)
+        agents[y*env_size+x] = a.get_sex(agent)
+    male,female = p.get_agents_alive_by_sex(pop)
+    return new_instance(m.get_cycle(mas), color_levels(env), agents, male, female, p.get_dead_agents(pop))
+
+# --- Getters ---
+
+def get_cycle(frame):
+    """
+        Return the cycle of the frame.
+    """
+    return __get_property(frame, CYCLE_IDX)
+
+def get_color_levels(frame):
+    """
+        Return the colour level of each cell, by y*size+x.
+    """
+    return __get_property(frame, COLORS_IDX)
+
+def get_agents(frame):
+    """
+        Return the sex of the agent of each cell (0 if none), by
+        y*size+x.
+    """
+    return __get_property(frame, AGENTS_IDX)
+
+def get_males(frame):
+    """
+        Return the number of male agents.
+    """
+    return __get_property(frame, MALES_IDX)
+
+def get_females(frame):
+    """
+        Return the number of female agents.
+    """
+    return __get_property(frame, FEMALES_IDX)
+
+def get_dead_agents(frame):
+    """
+        Return the number of dead agents.
+    """
+    return __get_property(frame, DEAD_AGENTS_IDX)
+
+# --- Computations ---
+
+def color_levels(env):
+    """
+        Return the colour level of each cell, depending on its
+        sugar level (a flat array with NumPy, otherwise a list).
+    """
+    max_capacity = e.get_max_capacity(env)
+    levels = e.get_sugar_levels(env)
+    if np is not None:
+        color_levels = (255 * (1 - np.asarray(levels, dtype=np.float64) / max_capacity)).astype(np.int64)
+        return np.clip(color_levels, 0, 255).astype(np.uint8).ravel()
+    return [min(max(int(255 * (1 - sugar_level / max_capacity)), 0), 255)
+            for row in levels for sugar_level in row]
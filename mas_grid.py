@@ -0,0 +1,303 @@
+#==================================================
+# INFO-H-100 - Introduction à l'informatique
+#
+# Prof. Thierry Massart
+# Année académique 2014-2015
+#
+# Projet: Système Multi-Agent (SMA)
+#
+#==================================================
+
+
+
+import numpy as np
+
+import mas_cell as c
+
+
+
+#==================================================
+#  GRID (NumPy structure-of-arrays cell storage)
+#==================================================
+#
+# Instead of one "mas_cell" list per cell, the grid
+# keeps the sugar level, the capacity and the id of
+# the present agent of all cells in three contiguous
+# 2D arrays, indexed as [y, x].
+#
+# Cells are still available through get_cell(), which
+# returns a light "view" on the arrays, so that all
+# functions of the "mas_cell" module (and all cell
+# rules) keep working on an array-backed environment.
+#
+#==================================================
+
+# --- Constants ---
+
+MAX_IDX = 5
+ENV_IDX = 0                 # Environment the grid belongs to
+LEVELS_IDX = 1              # 2D array of sugar levels
+CAPACITIES_IDX = 2          # 2D array of sugar capacities
+OCCUPANT_IDS_IDX = 3        # 2D array of occupant ids (NO_OCCUPANT if none)
+OCCUPANTS_IDX = 4           # Table of present agents, indexed by occupant id
+FREE_IDS_IDX = 5            # Unused entries of the occupant table
+
+NO_OCCUPANT = -1
+
+# --- Private functions ---
+
+# Note: These functions should not be called outside this module.
+
+def __get_property(grid, property_idx):
+    # Return the value of the given property of the grid.
+    return grid[property_idx]
+
+def __set_property(grid, property_idx, value):
+    # Set the value of the given property of the grid.
+    grid[property_idx] = value
+
+def __empty_instance():
+    # Return an empty grid instance.
+    return [None]*(MAX_IDX+1)
+
+# --- Cell view ---
+
+class CellView:
+    """
+        View on one cell of a grid. It can be indexed with the
+        property indexes of the "mas_cell" module exactly like a
+        list-based cell, but reads and writes go to the arrays
+        of the grid.
+    """
+    __slots__ = ("grid", "x", "y")
+
+    def __init__(self, grid, x, y):
+        self.grid = grid
+        self.x = x
+        self.y = y
+
+    def __getitem__(self, property_idx):
+        grid, x, y = self.grid, self.x, self.y
+        if property_idx == c.SUGAR_LEVEL_IDX:
+            return float(grid[LEVELS_IDX][y, x])
+        if property_idx == c.SUGAR_CAPACITY_IDX:
+            return float(grid[CAPACITIES_IDX][y, x])
+        if property_idx == c.PRESENT_AGENT_IDX:
+            return get_occupant(grid, (x, y))
+        return grid[ENV_IDX]
+
+    def __setitem__(self, property_idx, value):
+        grid, x, y = self.grid, self.x, self.y
+        if property_idx == c.SUGAR_LEVEL_IDX:
+            grid[LEVELS_IDX][y, x] = value
+        elif property_idx == c.SUGAR_CAPACITY_IDX:
+            grid[CAPACITIES_IDX][y, x] = value
+        elif property_idx == c.PRESENT_AGENT_IDX:
+            set_occupant(grid, (x, y), value)
+        elif value is not grid[ENV_IDX]:
+            raise Exception("A grid cell cannot be moved to another environment.")
+
+# --- Getters and setters ---
+
+def get_env(grid):
+    """
+        Return the environment the grid belongs to.
+    """
+    return __get_property(grid, ENV_IDX)
+
+def get_levels(grid):
+    """
+        Return the 2D array (indexed as [y, x]) of sugar levels.
+    """
+    return __get_property(grid, LEVELS_IDX)
+
+def set_levels(grid, levels):
+    """
+        Set the sugar levels from a 2D array (or nested lists)
+        indexed as [y, x].
+    """
+    np.copyto(get_levels(grid), levels)
+
+def get_capacities(grid):
+    """
+        Return the 2D array (indexed as [y, x]) of sugar capacities.
+    """
+    return __get_property(grid, CAPACITIES_IDX)
+
+def set_capacities(grid, capacities):
+    """
+        Set the sugar capacities from a 2D array (or nested
+        lists) indexed as [y, x].
+    """
+    np.copyto(get_capacities(grid), capacities)
+
+def get_occupant_ids(grid):
+    """
+        Return the 2D array (indexed as [y, x]) of occupant ids.
+        A cell without agent holds NO_OCCUPANT.
+    """
+    return __get_property(grid, OCCUPANT_IDS_IDX)
+
+def get_occupant(grid, cell_ref):
+    """
+        Return the agent present on the referenced cell, or None.
+    """
+    (x, y) = cell_ref
+    occupant_id = __get_property(grid, OCCUPANT_IDS_IDX)[y, x]
+    if occupant_id == NO_OCCUPANT:
+        return None
+    return __get_property(grid, OCCUPANTS_IDX)[occupant_id]
+
+def set_occupant(grid, cell_ref, agent):
+    """
+        Set the agent present on the referenced cell. To tell
+        that there is no agent, set agent to None.
+    """
+    (x, y) = cell_ref
+    occupant_ids = __get_property(grid, OCCUPANT_IDS_IDX)
+    occupants = __get_property(grid, OCCUPANTS_IDX)
+    free_ids = __get_property(grid, FREE_IDS_IDX)
+    occupant_id = occupant_ids[y, x]
+    if occupant_id != NO_OCCUPANT:
+        # Release the entry of the previous occupant.
+        occupants[occupant_id] = None
+        free_ids.append(occupant_id)
+        occupant_ids[y, x] = NO_OCCUPANT
+    if agent is not None:
+        if len(free_ids) > 0:
+            occupant_id = free_ids.pop()
+            occupants[occupant_id] = agent
+        else:
+            occupant_id = len(occupants)
+            occupants.append(agent)
+        occupant_ids[y, x] = occupant_id
+
+def occupied_mask(grid):
+    """
+        Return a boolean 2D array telling which cells have an agent.
+    """
+    return __get_property(grid, OCCUPANT_IDS_IDX) != NO_OCCUPANT
+
+# --- Initialisation ---
+
+def new_instance(env, sz):
+    """
+        Return a new grid of sz x sz empty cells (no capacity, no
+        sugar, no agent) belonging to the given environment.
+    """
+    grid = __empty_instance()
+    __set_property(grid, ENV_IDX, env)
+    __set_property(grid, LEVELS_IDX, np.zeros((sz, sz), dtype=np.float64))
+    __set_property(grid, CAPACITIES_IDX, np.zeros((sz, sz), dtype=np.float64))
+    __set_property(grid, OCCUPANT_IDS_IDX, np.full((sz, sz), NO_OCCUPANT, dtype=np.int32))
+    __set_property(grid, OCCUPANTS_IDX, [])
+    __set_property(grid, FREE_IDS_IDX, [])
+    return grid
+
+def size(grid):
+    """
+        Return the number of rows/columns of the grid.
+    """
+    return __get_property(grid, LEVELS_IDX).shape[0]
+
+# --- Cells ---
+
+def get_cell(grid, cell_ref):
+    """
+        Return a view on the referenced cell. The reference is
+        taken modulo the size of the grid.
+    """
+    sz = size(grid)
+    (x, y) = cell_ref
+    return CellView(grid, x%sz, y%sz)
+
+def get_cells(grid):
+    """
+        Return the list of views on all cells, in the same order
+        as the cell references of the environment.
+    """
+    sz = size(grid)
+    return [CellView(grid, x, y) for y in range(sz) for x in range(sz)]
+
+# --- Functions on all cells ---
+
+def set_sugar_level_to_capacity(grid):
+    """
+        Set the sugar level of all cells to their capacity.
+    """
+    np.copyto(get_levels(grid), get_capacities(grid))
+
+
+
+#==================================================
+#  ARRAY CELL RULES
+#==================================================
+#
+# A cell rule (see "mas_cell") may provide an array
+# form that applies the same rule to the whole grid
+# at once. Array rule functions must comply to the
+# following signature:
+#
+#  INPUT:  The 2D array of sugar levels (to update
+#          in place) and the 2D array of capacities
+#
+#  OUTPUT: None.
+#
+# Cell rules without an array form are still applied
+# cell by cell.
+#
+#==================================================
+
+# Array forms of the cell rules (see register_array_rule).
+__array_cell_rules = None
+
+def __array_rules():
+    # Return the registry of array rules. The array forms of
+    # the rules of "mas_cell" are only registered on first use,
+    # because that module may not be completely loaded yet when
+    # this one is imported.
+    global __array_cell_rules
+    if __array_cell_rules is None:
+        __array_cell_rules = {
+            c.regen_two_percent: regen_rate_array_rule(0.02),
+            c.regen_five_percent: regen_rate_array_rule(0.05),
+            c.regen_ten_percent: regen_rate_array_rule(0.10),
+            c.regen_full: regen_full_array_rule,
+        }
+    return __array_cell_rules
+
+def register_array_rule(cell_rule, array_rule):
+    """
+        Declare array_rule as the array form of cell_rule.
+    """
+    __array_rules()[cell_rule] = array_rule
+
+def get_array_rule(cell_rule):
+    """
+        Return the array form of the cell rule, or None if the
+        rule has none.
+    """
+    return __array_rules().get(cell_rule, None)
+
+def apply_array_rule(grid, array_rule):
+    """
+        Apply an array rule to all cells of the grid.
+    """
+    array_rule(get_levels(grid), get_capacities(grid))
+
+def regen_rate_array_rule(rate):
+    """
+        Return the array rule that regenerates a given fraction
+        of the capacity of each cell:
+        level = min(capacity, level + rate*capacity)
+    """
+    def regen(levels, capacities):
+        levels += rate*capacities
+        np.minimum(levels, capacities, out=levels)
+    return regen
+
+def regen_full_array_rule(levels, capacities):
+    """
+        Array rule: regenerate the level to full capacity.
+    """
+    np.copyto(levels, capacities)
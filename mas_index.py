@@ -0,0 +1,627 @@
+#==================================================
+# INFO-H-100 - Introduction à l'informatique
+#
+# Prof. Thierry Massart
+# Année académique 2014-2015
+#
+# Projet: Système Multi-Agent (SMA)
+#
+#==================================================
+
+
+
+import mas_agent as a
+import mas_cell as c
+import mas_environment as e
+import mas_population as p
+import mas_utils as u
+
+# The sums of the wealth and path indexes need NumPy, which is optional.
+try:
+    import numpy as np
+    import mas_grid as g
+except ImportError:
+    np = None
+    g = None
+
+
+
+#==================================================
+#  INDEXES
+#==================================================
+#
+# Some agent rules ask questions about the whole
+# population (e.g. "can another agent reach this cell
+# first?"). Answering them by scanning the population
+# for every agent is too slow for large populations.
+#
+# An index answers such a question by a lookup. It is
+# built for the agent rules that need it at the start
+# of their phase, kept up to date by the functions of
+# "mas_agent" that move agents or change their sugar
+# level (see the on_* functions), and dropped at the
+# end of the phase.
+#
+#==================================================
+
+# --- Constants ---
+
+REACH_INDEX = "reach"       # Target cell -> agents that can reach it
+WEALTH_INDEX = "wealth"     # Cell -> agent sugar and count around it
+PATH_INDEX = "path"         # Row/column -> prefix sums of sugar levels
+
+# --- Registry ---
+
+# Indexes used by each agent rule (see register_indexed_rule).
+__indexed_agent_rules = None
+
+def __indexed_rules():
+    # Return the registry of indexed rules. The rules of
+    # "mas_agent" are only registered on first use, because that
+    # module may not be completely loaded yet when this one is
+    # imported.
+    global __indexed_agent_rules
+    if __indexed_agent_rules is None:
+        __indexed_agent_rules = {
+            a.move_by_only_a_cell: (REACH_INDEX, PATH_INDEX),
+            a.move_by_averrage_living: (WEALTH_INDEX,),
+        }
+    return __indexed_agent_rules
+
+def register_indexed_rule(agent_rule, index_names):
+    """
+        Declare that agent_rule uses the indexes of the given names.
+    """
+    __indexed_rules()[agent_rule] = tuple(index_names)
+
+def get_rule_indexes(agent_rule):
+    """
+        Return the names of the indexes used by the agent rule.
+    """
+    return __indexed_rules().get(agent_rule, ())
+
+def build(pop, index_names):
+    """
+        Build the indexes of the given names for the population.
+    """
+    for name in index_names:
+        builder = BUILDERS.get(name, None)
+        # Without its builder (e.g. without NumPy), the rule
+        # falls back to scanning.
+        if builder is not None:
+            p.set_index(pop, name, builder(pop))
+
+def drop(pop):
+    """
+        Drop all indexes of the population.
+    """
+    p.get_indexes(pop).clear()
+
+# --- Notifications ---
+
+# Note: These functions are called by the "mas_agent"
+#       module, only when the population has indexes.
+
+def on_move(pop, agent, old_position):
+    """
+        The agent moved from old_position to its current position.
+    """
+    index = p.get_index(pop, REACH_INDEX)
+    if index is not None:
+        reach_on_move(index, agent, old_position)
+    index = p.get_index(pop, WEALTH_INDEX)
+    if index is not None:
+        wealth_update(index, agent)
+
+def on_change(pop, agent):
+    """
+        The sugar level of the agent (and of its cell) changed.
+    """
+    index = p.get_index(pop, REACH_INDEX)
+    if index is not None:
+        reach_on_change(index, agent)
+    index = p.get_index(pop, WEALTH_INDEX)
+    if index is not None:
+        wealth_update(index, agent)
+    index = p.get_index(pop, PATH_INDEX)
+    if index is not None:
+        path_on_change(index, a.get_pos(agent))
+
+def on_birth(pop, agent):
+    """
+        A new agent has been placed in the environment.
+    """
+    index = p.get_index(pop, REACH_INDEX)
+    if index is not None:
+        reach_on_birth(index, agent)
+    index = p.get_index(pop, WEALTH_INDEX)
+    if index is not None:
+        wealth_update(index, agent)
+
+def on_death(pop, agent, position):
+    """
+        The agent has been removed from the given position.
+    """
+    index = p.get_index(pop, REACH_INDEX)
+    if index is not None:
+        reach_on_death(index, agent, position)
+    index = p.get_index(pop, WEALTH_INDEX)
+    if index is not None:
+        wealth_remove(index, agent)
+
+
+
+#==================================================
+#  REACHABILITY INDEX
+#==================================================
+#
+# For each cell, the agents that can reach it (see
+# mas_agent.accecible_positions) with their toroidal
+# distance to it, so that
+# mas_agent.is_an_agent_can_be_there_faster is a
+# lookup instead of a scan of the population.
+#
+#==================================================
+
+# --- Constants ---
+
+REACH_MAX_IDX = 3
+REACH_ENV_IDX = 0           # Environment of the population
+REACH_TARGETS_IDX = 1       # Cell ref -> {id(agent): (agent, distance)}
+REACH_AGENTS_IDX = 2        # id(agent) -> set of reachable cell refs
+REACH_MAX_VISION_IDX = 3    # Largest vision of any agent
+
+# --- Private functions ---
+
+# Note: These functions should not be called outside this module.
+
+def __reach_add(index, agent):
+    # Add the cells the agent can reach to the index.
+    env = index[REACH_ENV_IDX]
+    targets = index[REACH_TARGETS_IDX]
+    pos = a.get_pos(agent)
+    sz = e.size(env)
+    key = id(agent)
+    cell_refs = set(a.accecible_positions(agent))
+    for cell_ref in cell_refs:
+        entries = targets.get(cell_ref)
+        if entries is None:
+            entries = targets[cell_ref] = {}
+        entries[key] = (agent, u.toroidal_dist(pos, cell_ref, sz))
+    index[REACH_AGENTS_IDX][key] = cell_refs
+
+def __reach_remove(index, agent):
+    # Remove the cells the agent can reach from the index.
+    targets = index[REACH_TARGETS_IDX]
+    key = id(agent)
+    for cell_ref in index[REACH_AGENTS_IDX].pop(key, ()):
+        entries = targets[cell_ref]
+        del entries[key]
+        if len(entries) == 0:
+            del targets[cell_ref]
+
+def __reach_occupy(index, cell_ref):
+    # No agent can reach a cell once it is occupied.
+    agents = index[REACH_AGENTS_IDX]
+    for key in index[REACH_TARGETS_IDX].pop(cell_ref, {}):
+        agents[key].discard(cell_ref)
+
+def __reach_free(index, cell_ref):
+    # Add the agents that can reach a cell that has just been freed.
+    env = index[REACH_ENV_IDX]
+    targets = index[REACH_TARGETS_IDX]
+    agents = index[REACH_AGENTS_IDX]
+    max_vision = index[REACH_MAX_VISION_IDX]
+    sz = e.size(env)
+    (x, y) = cell_ref
+    for step in range(-max_vision, max_vision+1):
+        if step != 0:
+            for pos in ((x+step, y), (x, y+step)):
+                agent = c.get_present_agent(e.get_cell(env, pos))
+                if agent is not None and id(agent) in agents \
+                        and abs(step) <= a.get_vision(agent) \
+                        and a.is_possible_to_move(agent, cell_ref):
+                    key = id(agent)
+                    entries = targets.get(cell_ref)
+                    if entries is None:
+                        entries = targets[cell_ref] = {}
+                    entries[key] = (agent, u.toroidal_dist(a.get_pos(agent), cell_ref, sz))
+                    agents[key].add(cell_ref)
+
+# --- Initialisation ---
+
+def new_reach_index(pop):
+    """
+        Return the reachability index of the current state of the
+        population.
+    """
+    index = [None]*(REACH_MAX_IDX+1)
+    index[REACH_ENV_IDX] = p.get_env(pop)
+    index[REACH_TARGETS_IDX] = {}
+    index[REACH_AGENTS_IDX] = {}
+    max_vision = p.get_pop_property(pop, "MAX_VISION_CAPACITY")
+    for agent in p.get_agents(pop):
+        max_vision = max(max_vision, a.get_vision_capacity(agent))
+        __reach_add(index, agent)
+    index[REACH_MAX_VISION_IDX] = max_vision
+    return index
+
+# --- Updates ---
+
+def reach_on_move(index, agent, old_position):
+    """
+        Update the index after the agent moved.
+    """
+    __reach_remove(index, agent)
+    __reach_occupy(index, a.get_pos(agent))
+    __reach_free(index, old_position)
+    __reach_add(index, agent)
+
+def reach_on_change(index, agent):
+    """
+        Update the index after the sugar level of the agent changed.
+    """
+    __reach_remove(index, agent)
+    __reach_add(index, agent)
+
+def reach_on_birth(index, agent):
+    """
+        Update the index after a new agent has been placed.
+    """
+    __reach_occupy(index, a.get_pos(agent))
+    index[REACH_MAX_VISION_IDX] = max(index[REACH_MAX_VISION_IDX], a.get_vision_capacity(agent))
+    __reach_add(index, agent)
+
+def reach_on_death(index, agent, position):
+    """
+        Update the index after an agent has been removed.
+    """
+    __reach_remove(index, agent)
+    __reach_free(index, position)
+
+# --- Queries ---
+
+def reach_faster(index, agent, target):
+    """
+        Return (boolean) whether or not another agent can reach the
+        target cell and is closer to it than the agent.
+    """
+    entries = index[REACH_TARGETS_IDX].get(target)
+    if entries is None:
+        return False
+    key = id(agent)
+    distance = u.toroidal_dist(a.get_pos(agent), target, e.size(index[REACH_ENV_IDX]))
+    for (other_key, (other, other_distance)) in entries.items():
+        if other_key != key and other_distance < distance:
+            return True
+    return False
+
+
+
+#==================================================
+#  WEALTH INDEX
+#==================================================
+#
+# For each cell, the total sugar level and the number
+# of the agents in the block of side 2*zone around it
+# (see mas_agent.average_living), so that the average
+# living of a block is a lookup.
+#
+# The index keeps the sugar level and the number of
+# agents of each cell, and the sums of all (toroidal)
+# blocks, computed for the whole grid when the index is
+# built. When an agent moves or its sugar level
+# changes, its old sugar level (and 1) is subtracted
+# from the sums of the blocks that contain its old
+# cell, and its new sugar level (and 1) added to those
+# that contain its new cell: a few slices of the sums.
+#
+# Note: The sums of sugar levels updated this way are
+#       not exact (unlike a scan of the block, an agent
+#       alone in its block could get an average slightly
+#       different from its own sugar level). They are
+#       reset to exactly 0.0 when a block becomes empty,
+#       and a comparison with a sugar level that is
+#       within WEALTH_TIE_TOLERANCE of the average is
+#       decided by summing the block as a scan does (see
+#       wealth_exceeds).
+#
+#==================================================
+
+# --- Constants ---
+
+WEALTH_MAX_IDX = 5
+WEALTH_ZONE_IDX = 0         # Half side of the blocks
+WEALTH_SUGAR_IDX = 1        # 2D array of agent sugar levels per cell
+WEALTH_COUNT_IDX = 2        # 2D array of agents per cell
+WEALTH_SUGAR_SUMS_IDX = 3   # 2D array of block sums of agent sugar levels
+WEALTH_COUNT_SUMS_IDX = 4   # 2D array of block sums of agents
+WEALTH_AGENTS_IDX = 5       # id(agent) -> (position, sugar level) in the sums
+
+WEALTH_TIE_TOLERANCE = 1e-9 # Relative gap under which the exact average is computed
+
+# --- Private functions ---
+
+# Note: These functions should not be called outside this module.
+
+def __window_sums(values, width):
+    # Return the sums of all windows of width x width entries
+    # of a 2D array (without wrapping).
+    for axis in (0, 1):
+        n = values.shape[axis] - width + 1
+        sums = np.take(values, np.arange(n), axis=axis)
+        for k in range(1, width):
+            sums = sums + np.take(values, np.arange(k, k+n), axis=axis)
+        values = sums
+    return values
+
+def __block_sums(index, grid_idx, sums_idx, ys, xs):
+    # Compute the sums of the blocks at the given rows and columns.
+    # The block at (x, y) covers [x-zone, x+zone-1] (toroidal).
+    zone = index[WEALTH_ZONE_IDX]
+    grid = index[grid_idx]
+    sz = grid.shape[0]
+    rows = (np.concatenate((ys, ys[-1]+1+np.arange(2*zone-1))) - zone) % sz
+    cols = (np.concatenate((xs, xs[-1]+1+np.arange(2*zone-1))) - zone) % sz
+    index[sums_idx][np.ix_(ys % sz, xs % sz)] = __window_sums(grid[np.ix_(rows, cols)], 2*zone)
+
+def __wrapped_slices(start, width, sz):
+    # Return the slices of the entries from start to start+width-1
+    # (toroidal), with width <= sz.
+    start %= sz
+    if start+width <= sz:
+        return (slice(start, start+width),)
+    return (slice(start, sz), slice(0, start+width-sz))
+
+def __wealth_refresh(index, position):
+    # Compute again the sums of all the blocks that contain the cell.
+    zone = index[WEALTH_ZONE_IDX]
+    (x, y) = position
+    # The cell x is covered by the blocks from x-zone+1 to x+zone.
+    ys = np.arange(y-zone+1, y+zone+1)
+    xs = np.arange(x-zone+1, x+zone+1)
+    __block_sums(index, WEALTH_SUGAR_IDX, WEALTH_SUGAR_SUMS_IDX, ys, xs)
+    __block_sums(index, WEALTH_COUNT_IDX, WEALTH_COUNT_SUMS_IDX, ys, xs)
+
+def __wealth_add(index, position, sugar_level, count):
+    # Add an agent (count=1) or remove it (count=-1) from its cell.
+    (x, y) = position
+    index[WEALTH_SUGAR_IDX][y, x] += count*sugar_level
+    index[WEALTH_COUNT_IDX][y, x] += count
+    if index[WEALTH_COUNT_IDX][y, x] == 0:
+        # Do not keep rounding errors on empty cells.
+        index[WEALTH_SUGAR_IDX][y, x] = 0.0
+    zone = index[WEALTH_ZONE_IDX]
+    sugar_sums = index[WEALTH_SUGAR_SUMS_IDX]
+    count_sums = index[WEALTH_COUNT_SUMS_IDX]
+    sz = sugar_sums.shape[0]
+    if 2*zone > sz:
+        # The blocks wrap onto themselves: a cell is in a block
+        # more than once.
+        __wealth_refresh(index, position)
+        return
+    for rows in __wrapped_slices(y-zone+1, 2*zone, sz):
+        for cols in __wrapped_slices(x-zone+1, 2*zone, sz):
+            counts = count_sums[rows, cols]
+            counts += count
+            sugars = sugar_sums[rows, cols]
+            sugars += count*sugar_level
+            if count < 0:
+                sugars[counts == 0] = 0.0
+
+def __wealth_exact_average(index, cell_ref):
+    # Return the average sugar level of the block around the cell,
+    # summed in the order of mas_agent.average_living.
+    zone = index[WEALTH_ZONE_IDX]
+    sz = index[WEALTH_SUGAR_IDX].shape[0]
+    (x, y) = cell_ref
+    block = np.ix_((y + np.arange(-zone, zone)) % sz, (x + np.arange(-zone, zone)) % sz)
+    present = index[WEALTH_COUNT_IDX][block] > 0
+    sugar_level_sum = 0
+    for sugar_level in index[WEALTH_SUGAR_IDX][block][present].tolist():
+        sugar_level_sum += sugar_level
+    count = int(present.sum())
+    if count == 0:
+        return 0
+    return sugar_level_sum/count
+
+# --- Initialisation ---
+
+def new_wealth_index(pop):
+    """
+        Return the wealth index of the current state of the
+        population, for the blocks used by
+        mas_agent.move_by_averrage_living.
+    """
+    zone = a.living_zone(pop)
+    sz = e.size(p.get_env(pop))
+    index = [None]*(WEALTH_MAX_IDX+1)
+    index[WEALTH_ZONE_IDX] = zone
+    index[WEALTH_SUGAR_IDX] = np.zeros((sz, sz))
+    index[WEALTH_COUNT_IDX] = np.zeros((sz, sz), dtype=np.int64)
+    index[WEALTH_SUGAR_SUMS_IDX] = np.zeros((sz, sz))
+    index[WEALTH_COUNT_SUMS_IDX] = np.zeros((sz, sz), dtype=np.int64)
+    agents = {}
+    for agent in p.get_agents(pop):
+        (x, y) = a.get_pos(agent)
+        sugar_level = a.get_sugar_level(agent)
+        index[WEALTH_SUGAR_IDX][y, x] += sugar_level
+        index[WEALTH_COUNT_IDX][y, x] += 1
+        agents[id(agent)] = ((x, y), sugar_level)
+    index[WEALTH_AGENTS_IDX] = agents
+    all_cells = np.arange(sz)
+    __block_sums(index, WEALTH_SUGAR_IDX, WEALTH_SUGAR_SUMS_IDX, all_cells, all_cells)
+    __block_sums(index, WEALTH_COUNT_IDX, WEALTH_COUNT_SUMS_IDX, all_cells, all_cells)
+    return index
+
+# --- Updates ---
+
+def wealth_update(index, agent):
+    """
+        Update the index after the agent moved, its sugar level
+        changed or it has been placed.
+    """
+    agents = index[WEALTH_AGENTS_IDX]
+    key = id(agent)
+    position = a.get_pos(agent)
+    sugar_level = a.get_sugar_level(agent)
+    old = agents.get(key)
+    if old != (position, sugar_level):
+        if old is not None:
+            __wealth_add(index, old[0], old[1], -1)
+        __wealth_add(index, position, sugar_level, 1)
+        agents[key] = (position, sugar_level)
+
+def wealth_remove(index, agent):
+    """
+        Update the index after an agent has been removed.
+    """
+    old = index[WEALTH_AGENTS_IDX].pop(id(agent), None)
+    if old is not None:
+        __wealth_add(index, old[0], old[1], -1)
+
+# --- Queries ---
+
+def wealth_zone(index):
+    """
+        Return the half side of the blocks of the index.
+    """
+    return index[WEALTH_ZONE_IDX]
+
+def wealth_average(index, cell_ref):
+    """
+        Return the average sugar level of the agents in the block
+        around the cell (0 if there is none), as a scan of the
+        block.
+    """
+    (x, y) = cell_ref
+    if index[WEALTH_COUNT_SUMS_IDX][y, x] == 0:
+        return 0
+    return __wealth_exact_average(index, cell_ref)
+
+def wealth_exceeds(index, cell_ref, sugar_level):
+    """
+        Return (boolean) whether or not the average sugar level of
+        the agents in the block around the cell (see
+        wealth_average) is higher than the given sugar level.
+    """
+    (x, y) = cell_ref
+    count = int(index[WEALTH_COUNT_SUMS_IDX][y, x])
+    if count == 0:
+        return 0 > sugar_level
+    average = float(index[WEALTH_SUGAR_SUMS_IDX][y, x])/count
+    if abs(average - sugar_level) > WEALTH_TIE_TOLERANCE*max(abs(sugar_level), 1.0):
+        return average > sugar_level
+    return __wealth_exact_average(index, cell_ref) > sugar_level
+
+
+
+#==================================================
+#  PATH INDEX
+#==================================================
+#
+# For each row and each column of the environment, the
+# prefix sums of the sugar levels of its cells, so
+# that the sugar on a straight path (see
+# mas_agent.total_gain) is one or two differences of
+# prefix sums, whatever its length.
+#
+# The sums of a row and a column are computed again
+# when an agent eats on one of their cells.
+#
+#==================================================
+
+# --- Constants ---
+
+PATH_MAX_IDX = 3
+PATH_ENV_IDX = 0            # Environment of the population
+PATH_LEVELS_IDX = 1         # 2D array of sugar levels
+PATH_ROWS_IDX = 2           # Prefix sums along each row (S x S+1)
+PATH_COLUMNS_IDX = 3        # Prefix sums along each column (S+1 x S)
+
+# --- Private functions ---
+
+# Note: These functions should not be called outside this module.
+
+def __prefix_sums(levels, axis):
+    # Return the prefix sums of the levels along the given axis,
+    # starting with 0.
+    sums = np.cumsum(levels, axis=axis)
+    return np.insert(sums, 0, 0.0, axis=axis)
+
+# --- Initialisation ---
+
+def new_path_index(pop):
+    """
+        Return the path index of the current sugar levels of the
+        environment of the population.
+    """
+    env = p.get_env(pop)
+    if e.is_array_backed(env):
+        # The index reads the levels of the grid directly.
+        levels = g.get_levels(e.get_grid(env))
+    else:
+        sz = e.size(env)
+        levels = np.array([[c.get_sugar_level(e.get_cell(env, (x, y))) for x in range(sz)]
+                           for y in range(sz)], dtype=np.float64)
+    index = [None]*(PATH_MAX_IDX+1)
+    index[PATH_ENV_IDX] = env
+    index[PATH_LEVELS_IDX] = levels
+    index[PATH_ROWS_IDX] = __prefix_sums(levels, 1)
+    index[PATH_COLUMNS_IDX] = __prefix_sums(levels, 0)
+    return index
+
+# --- Updates ---
+
+def path_on_change(index, cell_ref):
+    """
+        Update the index after the sugar level of the referenced
+        cell changed.
+    """
+    (x, y) = cell_ref
+    levels = index[PATH_LEVELS_IDX]
+    levels[y, x] = c.get_sugar_level(e.get_cell(index[PATH_ENV_IDX], cell_ref))
+    np.cumsum(levels[y, :], out=index[PATH_ROWS_IDX][y, 1:])
+    np.cumsum(levels[:, x], out=index[PATH_COLUMNS_IDX][1:, x])
+
+# --- Queries ---
+
+def path_sugar_level(index, cell_ref, direction, steps):
+    """
+        Return the total sugar level of the "steps" cells from
+        the referenced one (included) in the given direction
+        ((1, 0), (-1, 0), (0, 1) or (0, -1)), wrapping around the
+        environment. steps must be smaller than its size.
+    """
+    (x, y) = cell_ref
+    (dx, dy) = direction
+    if dx != 0:
+        sums = index[PATH_ROWS_IDX][y]
+        start = x
+        step = dx
+    else:
+        sums = index[PATH_COLUMNS_IDX][:, x]
+        start = y
+        step = dy
+    if steps == 0:
+        return 0.0
+    sz = len(sums)-1
+    # Same cells, taken in ascending order.
+    first = (start if step > 0 else start-steps+1) % sz
+    last = first+steps
+    if last <= sz:
+        return float(sums[last]-sums[first])
+    return float(sums[sz]-sums[first]+sums[last-sz])
+
+
+
+#==================================================
+#  INDEX BUILDERS
+#==================================================
+
+BUILDERS = {
+    REACH_INDEX: new_reach_index,
+}
+if np is not None:
+    BUILDERS[WEALTH_INDEX] = new_wealth_index
+    BUILDERS[PATH_INDEX] = new_path_index
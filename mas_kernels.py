@@ -0,0 +1,203 @@
+#==================================================
+# INFO-H-100 - Introduction à l'informatique
+#
+# Prof. Thierry Massart
+# Année académique 2014-2015
+#
+# Projet: Système Multi-Agent (SMA)
+#
+#==================================================
+
+
+
+import numpy as np
+
+import mas_agent as a
+import mas_environment as e
+import mas_grid as g
+import mas_population as p
+import mas_store as s
+
+
+
+#==================================================
+#  BATCHED AGENT RULES
+#==================================================
+#
+# An agent rule (see "mas_agent") may provide a batched
+# form that applies the same rule to the whole
+# population at once. Batched rules are only used when
+# both the environment and the population are stored
+# in NumPy arrays. Batched rule functions must comply
+# to the following signature:
+#
+#  INPUT:  The population the rule is applied on
+#
+#  OUTPUT: None.
+#
+# The result of a batched rule must be the same as
+# applying the agent rule to each agent in activation
+# order.
+#
+#==================================================
+
+# --- Constants ---
+
+CHUNK_SIZE = 1<<16          # Agents scored at once by movement kernels
+
+# --- Registry ---
+
+# Batched forms of the agent rules (see register_batch_rule).
+__batch_agent_rules = None
+
+def __batch_rules():
+    # Return the registry of batched rules. The batched forms of
+    # the rules of "mas_agent" are only registered on first use,
+    # because that module may not be completely loaded yet when
+    # this one is imported.
+    global __batch_agent_rules
+    if __batch_agent_rules is None:
+        __batch_agent_rules = {
+            a.move_to_the_highest_sugar_level_cell: move_all_to_the_highest_sugar_level_cell,
+            a.move_to_the_lowest_sugar_level_cell: move_all_to_the_lowest_sugar_level_cell,
+        }
+    return __batch_agent_rules
+
+def register_batch_rule(agent_rule, batch_rule):
+    """
+        Declare batch_rule as the batched form of agent_rule.
+    """
+    __batch_rules()[agent_rule] = batch_rule
+
+def get_batch_rule(agent_rule):
+    """
+        Return the batched form of the agent rule, or None if the
+        rule has none.
+    """
+    return __batch_rules().get(agent_rule, None)
+
+def can_batch(pop):
+    """
+        Return (boolean) whether or not batched rules can be used
+        on the population, i.e. whether or not the population and
+        its environment are stored in NumPy arrays.
+    """
+    return p.get_store(pop) is not None and e.is_array_backed(p.get_env(pop))
+
+# --- Help functions ---
+
+def cross_offsets(vision):
+    """
+        Return the offsets (dx, dy, distance) of the cells an
+        agent with the given vision capacity can see, in the same
+        order as mas_agent.accecible_positions lists them.
+    """
+    dx = []
+    dy = []
+    dist = []
+    for step in range(-vision, vision+1):
+        if step != 0:
+            dx += [step, 0]
+            dy += [0, step]
+            dist += [abs(step), abs(step)]
+    return (np.array(dx), np.array(dy), np.array(dist))
+
+def vision_of(pop, sugar_levels, vision_capacities):
+    """
+        Return the array of the effective vision of the agents:
+        their vision capacity, or 1 if their sugar level is
+        saturated (see mas_agent.accecible_positions).
+    """
+    max_sugar_level = p.get_pop_property(pop, "MAX_SUGAR_LEVEL")
+    return np.where(sugar_levels >= max_sugar_level, 1, vision_capacities)
+
+def active_slots(store):
+    """
+        Return the array of the slots of the alive agents, in
+        activation order.
+    """
+    order = np.array(s.get_order(store), dtype=np.intp)
+    return order[s.get_column(store, s.ALIVE_IDX)[order]]
+
+# --- Lifecycle kernel ---
+
+def dying_slots(pop):
+    """
+        Return the array of the slots of the alive agents that are
+        not living any more (see mas_agent.get_is_living), in
+        ascending order.
+    """
+    store = p.get_store(pop)
+    levels = g.get_levels(e.get_grid(p.get_env(pop)))
+    slots = s.alive_slots(store)
+    cell_levels = levels[s.get_column(store, s.Y_IDX)[slots], s.get_column(store, s.X_IDX)[slots]]
+    living = (cell_levels + s.get_column(store, s.SUGAR_LEVEL_IDX)[slots]
+              >= s.get_column(store, s.METABOLISM_IDX)[slots]) \
+        & (s.get_column(store, s.AGE_IDX)[slots] <= p.get_pop_property(pop, "MAX_AGENT_AGE"))
+    return slots[~living]
+
+# --- Movement kernels ---
+
+def __move_by_preference(pop, score_sign):
+    # Move each agent to its accessible cell with the highest
+    # score_sign*sugar_level. Ties are broken in the order of
+    # mas_agent.accecible_positions.
+    store = p.get_store(pop)
+    env = p.get_env(pop)
+    grid = e.get_grid(env)
+    sz = g.size(grid)
+    levels = g.get_levels(grid)
+    occupant_ids = g.get_occupant_ids(grid).reshape(-1)
+    slots = active_slots(store)
+    if len(slots) == 0:
+        return
+    xs = s.get_column(store, s.X_IDX)
+    ys = s.get_column(store, s.Y_IDX)
+    sugar_levels = s.get_column(store, s.SUGAR_LEVEL_IDX)[slots]
+    metabolisms = s.get_column(store, s.METABOLISM_IDX)[slots]
+    visions = vision_of(pop, sugar_levels, s.get_column(store, s.VISION_CAPACITY_IDX)[slots])
+    (dx, dy, dist) = cross_offsets(int(visions.max()))
+    for start in range(0, len(slots), CHUNK_SIZE):
+        chunk = slice(start, start+CHUNK_SIZE)
+        chunk_slots = slots[chunk]
+        # Score every cell of the vision cross of every agent.
+        cx = (xs[chunk_slots][:, None] + dx) % sz
+        cy = (ys[chunk_slots][:, None] + dy) % sz
+        cell_levels = levels[cy, cx]
+        feasible = (dist <= visions[chunk][:, None]) \
+            & (cell_levels + sugar_levels[chunk][:, None] >= metabolisms[chunk][:, None])
+        scores = np.where(feasible, score_sign*cell_levels, -np.inf)
+        preferences = np.argsort(-scores, axis=1, kind="stable")
+        cells = np.take_along_axis(cy*sz + cx, preferences, axis=1).tolist()
+        feasible = np.take_along_axis(feasible, preferences, axis=1).tolist()
+        # Resolve the conflicts in activation order: each agent
+        # takes its preferred cell that is still free.
+        chunk_slots = chunk_slots.tolist()
+        for i in range(len(chunk_slots)):
+            agent_cells = cells[i]
+            agent_feasible = feasible[i]
+            for j in range(len(agent_cells)):
+                if not agent_feasible[j]:
+                    break
+                target = agent_cells[j]
+                if occupant_ids[target] == g.NO_OCCUPANT:
+                    slot = chunk_slots[i]
+                    source = ys[slot]*sz + xs[slot]
+                    occupant_ids[target] = occupant_ids[source]
+                    occupant_ids[source] = g.NO_OCCUPANT
+                    e.release_cell(env, (xs[slot], ys[slot]))
+                    (ys[slot], xs[slot]) = divmod(target, sz)
+                    e.occupy_cell(env, (xs[slot], ys[slot]))
+                    break
+
+def move_all_to_the_highest_sugar_level_cell(pop):
+    """
+        Batched RA1 (see mas_agent.move_to_the_highest_sugar_level_cell).
+    """
+    __move_by_preference(pop, 1.0)
+
+def move_all_to_the_lowest_sugar_level_cell(pop):
+    """
+        Batched RA3 (see mas_agent.move_to_the_lowest_sugar_level_cell).
+    """
+    __move_by_preference(pop, -1.0)
@@ -0,0 +1,244 @@
+#==================================================
+# INFO-H-100 - Introduction à l'informatique
+#
+# Prof. Thierry Massart
+# Année académique 2014-2015
+#
+# Projet: Système Multi-Agent (SMA)
+#
+#==================================================
+
+
+
+import mas_agent as a
+import mas_cell as c
+import mas_environment as e
+import mas_index as ix
+import mas_population as p
+
+# Batched agent rules need NumPy, which is optional.
+try:
+    import mas_kernels as k
+except ImportError:
+    k = None
+
+
+
+#==================================================
+#  AGENT RULE PIPELINE
+#==================================================
+#
+# The agent rules of a MAS are applied as a list of
+# stages, made from the rule list once per cycle:
+#
+#  - "phased" (default): each rule is a stage, applied
+#    to all agents before the next rule starts,
+#  - "fused": consecutive rules are grouped in one
+#    stage that applies all of them to an agent before
+#    the next agent, in a single pass on the population.
+#    Rules that need the phase-by-phase semantics
+#    (rules with a batched form, see "mas_kernels", and
+#    the rules declared with register_phased_rule) are
+#    still stages of their own.
+#
+# In both modes, rules with a compiled form (see
+# register_compiled_rule) are replaced by a function
+# where the values that are the same for all agents
+# (environment, properties of the population) are only
+# looked up once per cycle.
+#
+#==================================================
+
+# --- Constants ---
+
+PHASED = "phased"
+FUSED = "fused"
+
+STAGE_MAX_IDX = 3
+STAGE_RULE_IDX = 0          # Function applied to each agent (or None)
+STAGE_BATCH_RULE_IDX = 1    # Batched rule applied to the population (or None)
+STAGE_INDEXES_IDX = 2       # Names of the indexes used by the stage
+STAGE_AGENT_RULES_IDX = 3   # Agent rules applied by the stage
+
+# --- Compiled rules ---
+
+# Compiled forms of the agent rules (see register_compiled_rule).
+__compiled_agent_rules = None
+
+# Rules that must be applied phase by phase (see register_phased_rule).
+__phased_agent_rules = None
+
+def compile_grow_up(pop):
+    """
+        Compiled form of mas_agent.grow_up.
+    """
+    max_age = p.get_pop_property(pop, "MAX_AGENT_AGE")
+    def grow_up(agent):
+        age = a.get_age(agent)
+        if age <= max_age:
+            a.set_age(agent, age+1)
+    return grow_up
+
+def compile_eat(divisor):
+    """
+        Return the compiled form of the rule that eats the sugar
+        of the cell divided by divisor (see mas_agent.eat_all).
+    """
+    def compile_rule(pop):
+        env = p.get_env(pop)
+        max_sugar_level = p.get_pop_property(pop, "MAX_SUGAR_LEVEL")
+        def eat(agent):
+            cell = e.get_cell(env, a.get_pos(agent))
+            amount = c.get_sugar_level(cell)
+            if divisor != 1:
+                amount = amount/divisor
+            a.consumption_sugar(agent, amount, cell, max_sugar_level)
+        return eat
+    return compile_rule
+
+def compile_eat_metabolism(pop):
+    """
+        Compiled form of mas_agent.eat_metabolism.
+    """
+    env = p.get_env(pop)
+    max_sugar_level = p.get_pop_property(pop, "MAX_SUGAR_LEVEL")
+    def eat_metabolism(agent):
+        cell = e.get_cell(env, a.get_pos(agent))
+        a.consumption_sugar(agent, a.get_metabolism(agent), cell, max_sugar_level)
+    return eat_metabolism
+
+def __compiled_rules():
+    # Return the registry of compiled rules. The rules of
+    # "mas_agent" are only registered on first use, because that
+    # module may not be completely loaded yet when this one is
+    # imported.
+    global __compiled_agent_rules
+    if __compiled_agent_rules is None:
+        __compiled_agent_rules = {
+            a.grow_up: compile_grow_up,
+            a.eat_all: compile_eat(1),
+            a.eat_half: compile_eat(2),
+            a.eat_quarter: compile_eat(4),
+            a.eat_metabolism: compile_eat_metabolism,
+        }
+    return __compiled_agent_rules
+
+def __phased_rules():
+    # Return the set of the rules that must be applied phase by
+    # phase (none of the rules of "mas_agent" needs it).
+    global __phased_agent_rules
+    if __phased_agent_rules is None:
+        __phased_agent_rules = set()
+    return __phased_agent_rules
+
+def register_compiled_rule(agent_rule, compile_rule):
+    """
+        Declare the compiled form of agent_rule: compile_rule
+        receives the population and returns a function that has
+        the same effect as agent_rule on an agent.
+    """
+    __compiled_rules()[agent_rule] = compile_rule
+
+def register_phased_rule(agent_rule):
+    """
+        Declare that agent_rule must be applied to all agents
+        before the next rule starts, even in a fused pipeline.
+    """
+    __phased_rules().add(agent_rule)
+
+def compiled_rule(pop, agent_rule):
+    """
+        Return the compiled form of the rule for the population,
+        or the rule itself if it has none.
+    """
+    compile_rule = __compiled_rules().get(agent_rule, None)
+    if compile_rule is None:
+        return agent_rule
+    return compile_rule(pop)
+
+# --- Stages ---
+
+def __new_stage(rule, batch_rule, index_names, agent_rules):
+    # Return a new stage.
+    stage = [None]*(STAGE_MAX_IDX+1)
+    stage[STAGE_RULE_IDX] = rule
+    stage[STAGE_BATCH_RULE_IDX] = batch_rule
+    stage[STAGE_INDEXES_IDX] = index_names
+    stage[STAGE_AGENT_RULES_IDX] = agent_rules
+    return stage
+
+def __fuse(rules):
+    # Return a function that applies all rules to an agent.
+    if len(rules) == 1:
+        return rules[0]
+    rules = tuple(rules)
+    def fused_rules(agent):
+        for rule in rules:
+            rule(agent)
+    return fused_rules
+
+def new_instance(pop, agent_rules, mode=PHASED):
+    """
+        Return the list of the stages that apply the agent rules
+        to the population, in the given mode (PHASED or FUSED).
+    """
+    if mode not in (PHASED, FUSED):
+        raise ValueError("Unknown agent pipeline: " + str(mode))
+    batch = k is not None and k.can_batch(pop)
+    stages = []
+    group = []
+    group_indexes = []
+    group_rules = []
+    def close_group():
+        if len(group) > 0:
+            stages.append(__new_stage(__fuse(group), None, tuple(group_indexes), tuple(group_rules)))
+            del group[:]
+            del group_indexes[:]
+            del group_rules[:]
+    for agent_rule in agent_rules:
+        batch_rule = k.get_batch_rule(agent_rule) if k is not None else None
+        # Rules with a batched form are phased even when the batched
+        # form cannot be used, so that both population backends give
+        # the same results.
+        phased = mode == PHASED or batch_rule is not None or agent_rule in __phased_rules()
+        if phased:
+            close_group()
+        if batch_rule is not None and batch:
+            stages.append(__new_stage(None, batch_rule, (), (agent_rule,)))
+            continue
+        group.append(compiled_rule(pop, agent_rule))
+        group_rules.append(agent_rule)
+        for name in ix.get_rule_indexes(agent_rule):
+            if name not in group_indexes:
+                group_indexes.append(name)
+        if phased:
+            close_group()
+    close_group()
+    return stages
+
+def stage_agent_rules(stage):
+    """
+        Return the agent rules applied by the stage (in order).
+    """
+    return stage[STAGE_AGENT_RULES_IDX]
+
+def apply_stage(pop, stage):
+    """
+        Apply a stage to the population.
+    """
+    batch_rule = stage[STAGE_BATCH_RULE_IDX]
+    if batch_rule is not None:
+        batch_rule(pop)
+    else:
+        # Build the indexes the rules need (see "mas_index").
+        ix.build(pop, stage[STAGE_INDEXES_IDX])
+        p.apply_rule(pop, stage[STAGE_RULE_IDX])
+        ix.drop(pop)
+
+def apply(pop, agent_rules, mode=PHASED):
+    """
+        Apply the agent rules to the population, in the given
+        mode (PHASED or FUSED).
+    """
+    for stage in new_instance(pop, agent_rules, mode):
+        apply_stage(pop, stage)
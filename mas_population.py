@@ -14,18 +14,34 @@ import mas_environment as e
 import mas_cell as c 
 import mas as m 
 import mas_utils as u
-from random import shuffle,choice
+import mas_scheduler as sch
+import mas_index as ix
+
+# The columnar population needs NumPy, which is optional.
+try:
+	import mas_store as s
+	import mas_kernels as k
+except ImportError:
+	s = None
+	k = None
 
 #==================================================
 #  POPULATION
 #==================================================   
 
 # --- Constants ---
-POP_MAX_IDX = 3
+POP_MAX_IDX = 7
 POP_MAS_IDX = 0            # MAS the population belongs to
 POP_AGENTS_LIST_IDX = 1    # The matrix of agents
 POP_PROPERTIES_IDX = 2
 POP_DEAD_AGENT = 3
+POP_STORE_IDX = 4          # Columnar store (only for the "numpy" backend)
+POP_INDEXES_IDX = 5        # Indexes built for the current rule (see "mas_index")
+POP_SCHEDULER_IDX = 6      # State of the activation order (see "mas_scheduler")
+POP_BIRTHS_IDX = 7         # Number of agents born since the start
+
+LIST_BACKEND = "list"      # One "mas_agent" list per agent
+NUMPY_BACKEND = "numpy"    # NumPy columns (see "mas_store")
 # --- Private functions --- 
 
 # Note: These functions should not be called outside this module.
@@ -44,21 +60,35 @@ def __empty_instance():
     return [None]*(POP_MAX_IDX+1)
 
 def new_instance(mas,config):
+	"""
+		Les agents sont stockés selon le POP_BACKEND de la configuration :
+		"list" (par défaut) ou "numpy"
+	"""
 	size = u.cfg_pop_size(config)
 	properties = u.cfg_pop_properties(config)
+	backend = u.cfg_pop_backend(config)
 	pop = __empty_instance()
 	set_properties(pop,properties)
 	set_mas(pop, mas)
 	set_dead_agents(pop,0)
-	agents = __empty_agent_list( pop,size)
-	set_agents(pop, agents)
+	set_births(pop,0)
+	__set_property(pop,POP_INDEXES_IDX,{})
+	if backend == LIST_BACKEND:
+		set_store(pop,None)
+		set_agents(pop,[])
+	elif backend == NUMPY_BACKEND:
+		if s is None:
+			raise Exception("The numpy population backend requires NumPy to be installed.")
+		set_store(pop,s.new_instance(pop,max(size,properties["MAX_POP"])))
+	else:
+		raise Exception("Unknown population backend: " + str(backend))
+	__populate(pop,size)
 	return pop
 
-def __empty_agent_list(pop,size):
-	agents_list = []
-	for i in range (size):
-		agents_list.append(a.new_instance(pop))
-	return agents_list
+def __populate(pop,size):
+	#les positions de tous les agents sont tirées en une fois parmi les cellules libres
+	for position in e.random_cell_refs_without_agent(get_env(pop),size):
+		add_agent(pop,a.new_instance(pop,position))
 
 def get_mas(pop):
 	return __get_property(pop,POP_MAS_IDX)
@@ -67,11 +97,70 @@ def set_mas(pop,mas):
 	__set_property(pop,POP_MAS_IDX,mas)
 
 def set_agents(pop,agents_list):
-	__set_property(pop,POP_AGENTS_LIST_IDX,agents_list)
+	store = get_store(pop)
+	if store is not None:
+		s.set_agents(store,agents_list)
+	else:
+		__set_property(pop,POP_AGENTS_LIST_IDX,agents_list)
 
 def get_agents(pop):
+	"""
+		renvoie la liste des agents vivants dans l'ordre d'activation
+	"""
+	store = get_store(pop)
+	if store is not None:
+		return s.agents(store)
 	return __get_property(pop,POP_AGENTS_LIST_IDX)
 
+def get_store(pop):
+	"""
+		renvoie le stockage en colonnes de la population (None si les agents sont des listes)
+	"""
+	return __get_property(pop,POP_STORE_IDX)
+
+def set_store(pop,store):
+	__set_property(pop,POP_STORE_IDX,store)
+
+def get_indexes(pop):
+	"""
+		renvoie le dictionnaire des index de la population (voir mas_index)
+	"""
+	return __get_property(pop,POP_INDEXES_IDX)
+
+def get_index(pop,name):
+	"""
+		renvoie l'index de ce nom, ou None s'il n'a pas été construit
+	"""
+	return get_indexes(pop).get(name,None)
+
+def set_index(pop,name,index):
+	get_indexes(pop)[name] = index
+
+def get_rng(pop):
+	"""
+		renvoie le flux aléatoire du MAS de la population (voir mas_random)
+	"""
+	return m.get_rng(get_mas(pop))
+
+def get_scheduler(pop):
+	"""
+		renvoie l'état de l'ordre d'activation (voir mas_scheduler), ou None
+	"""
+	return __get_property(pop,POP_SCHEDULER_IDX)
+
+def set_scheduler(pop,scheduler):
+	__set_property(pop,POP_SCHEDULER_IDX,scheduler)
+
+def add_agent(pop,agent):
+	"""
+		ajoute un nouvel agent (créé par mas_agent.new_instance) à la fin de l'ordre d'activation
+	"""
+	store = get_store(pop)
+	if store is not None:
+		s.add_agent(store,agent)
+	else:
+		get_agents(pop).append(agent)
+
 def set_dead_agents(pop,dead_agents):
 	if dead_agents < 0:
 		raise ValueError("cannot have a negative dead agents number")
@@ -83,6 +172,20 @@ def increment_dead_agents(pop):
 def get_dead_agents(pop):
 	return __get_property(pop,POP_DEAD_AGENT)
 
+def set_births(pop,births):
+	if births < 0:
+		raise ValueError("cannot have a negative births number")
+	__set_property(pop,POP_BIRTHS_IDX,births)
+
+def increment_births(pop):
+	set_births(pop,get_births(pop)+1)
+
+def get_births(pop):
+	"""
+		renvoie le nombre d'agents nés depuis le début (sans la population initiale)
+	"""
+	return __get_property(pop,POP_BIRTHS_IDX)
+
 def get_pop_property(pop,property):
 	"""
 	l'ensemble des propriétés sont regroupées dans un dictionnaires, 
@@ -107,6 +210,9 @@ def size(pop):
 	"""
 		fonction renvoyant la taille de la population
 	"""
+	store = get_store(pop)
+	if store is not None:
+		return s.size(store)
 	return len(get_agents(pop))
 
 def show(pop):
@@ -126,6 +232,9 @@ def get_agents_alive_by_sex(pop):
 	"""
 		compte le nombre d'agent vivant en fonction du sexe
 	"""
+	store = get_store(pop)
+	if store is not None:
+		return (s.count_by_sex(store,2),s.count_by_sex(store,1))
 	male = 0
 	female = 0
 	agents = get_agents(pop)
@@ -141,11 +250,55 @@ def apply_rule(pop,rule):
 	"""
 		Fonction appliquant une règle à l'ensemble des agents
 	"""
+	store = get_store(pop)
+	if store is not None:
+		s.apply_rule(store,rule)
+		return
 	agents = get_agents(pop)
 	size = len(agents)
 	for i in range(size):
 		rule(agents[i])
 
+def remove_dead_agents(pop):
+	"""
+		Phase "cycle de vie", une fois par cycle après les règles des agents : les agents qui
+		n'ont plus assez de sucre (voir mas_agent.get_is_living) ou qui sont trop vieux sont
+		évalués en une passe, puis retirés de la population en une fois.
+		Renvoie le nombre d'agents morts.
+	"""
+	store = get_store(pop)
+	if store is not None:
+		if k.can_batch(pop):
+			slots = k.dying_slots(pop)
+		else:
+			views = s.get_views(store)
+			slots = [slot for slot in s.alive_slots(store).tolist() if not a.get_is_living(views[slot])]
+		dead = [s.get_views(store)[slot] for slot in slots]
+	else:
+		agents = get_agents(pop)
+		dead = [agent for agent in agents if not a.get_is_living(agent)]
+	if len(dead) == 0:
+		return 0
+	indexes = get_indexes(pop)
+	for agent in dead:
+		c.set_present_agent(a.get_cell(agent),None)
+		if indexes:
+			ix.on_death(pop,agent,a.get_pos(agent))
+	#les cellules sont libérées dans l'ordre de leurs positions, qui ne dépend pas du backend
+	env = get_env(pop)
+	positions = [a.get_pos(agent) for agent in dead]
+	positions.sort(key=lambda position: (position[1],position[0]))
+	for position in positions:
+		e.release_cell(env,position)
+	set_dead_agents(pop,get_dead_agents(pop)+len(dead))
+	if store is not None:
+		s.remove_agents(store,slots)
+		s.compact(store)
+	else:
+		dead_ids = set(id(agent) for agent in dead)
+		agents[:] = [agent for agent in agents if id(agent) not in dead_ids]
+	return len(dead)
+
 #==================================================
 #  Population Rules (ordre d'activation)
 #==================================================
@@ -155,24 +308,18 @@ def active_agents_randomly(pop):
 		OA1: ordre d’activation aléatoire : 
 			aucun agent n'est privilégié et donc chacun des agent à la même chance de "s'activer"
 	"""
-	agents = get_agents(pop)
-	size = len(agents)
-	suffled_agents_list = []
-	for i in range(size):
-		agent = choice(agents)
-		del agents[agents.index(agent)]
-		suffled_agents_list.append(agent)
-	set_agents(pop,suffled_agents_list)
+	sch.shuffle_order(pop)
 
 def active_agents_by_sugar_level(pop):
 	"""
 		OA2: ordre d'activation régulé: les agents sont activés dans l'ordre croissant de leur niveau de sucre,
 			donc ceux avec le moins de sucre sont activés en premier: fovorise les plus "faibles”
 	"""
-	agents_list = get_agents(pop)
-	sugar_level_list = []
-	for i in range(len(agents_list)):
-		sugar_level_list.append(a.get_sugar_level(agents_list[i]))
-	u.sort_on_second_list(agents_list,sugar_level_list,u.order_scalar_asc)
-	sorted_agents_list = agents_list[::-1]
-	set_agents(pop,sorted_agents_list)
+	sch.sort_order(pop)
+
+def active_agents_by_maintained_sugar_level(pop):
+	"""
+		OA3: comme OA2, mais l'ordre est conservé d'un cycle à l'autre : seuls les agents dont le
+			niveau de sucre a changé sont triés à nouveau (voir mas_scheduler)
+	"""
+	sch.maintained_order(pop)
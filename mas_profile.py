@@ -0,0 +1,221 @@
+#==================================================
+# INFO-H-100 - Introduction à l'informatique
+#
+# Prof. Thierry Massart
+# Année académique 2014-2015
+#
+# Projet: Système Multi-Agent (SMA)
+#
+#==================================================
+
+
+
+import json
+import os
+import time
+
+import mas as m
+import mas_pipeline as pl
+import mas_registry as reg
+
+
+
+#==================================================
+#  PROFILER
+#==================================================
+#
+# A profiler times the steps of the cycles of a MAS
+# (see m.set_profiler):
+#
+#   profiler = pf.new_instance(mas)
+#   m.run_experiment(mas)
+#   pf.show(profiler)
+#   pf.write_trace(profiler, "trace.json")
+#
+# The cycle is run by m.run_cycle_steps, the same as
+# without profiler, which lets the profiler time each
+# of its steps. The steps are named after what they
+# apply:
+#
+#  - "cell rule <name>": a cell rule on all cells,
+#  - "order activation": the order of the agents,
+#  - "agent rule <name>": a stage of agent rules (see
+#    "mas_pipeline"; fused rules are joined by "+"),
+#  - "lifecycle": the removal of the dead agents,
+#  - "cycle observers": the functions called after the
+#    cycle (e.g. "mas_recorder"),
+#  - "ending condition": the test before each cycle,
+#  - "cycle": the whole cycle.
+#
+# For each step, the profiler keeps the number of calls,
+# the total time and the number of items (cells or
+# agents) it was applied to, for the time per item.
+# With trace, it also keeps one event per step and
+# cycle, written in the Chrome trace event format (to
+# open in chrome://tracing or Perfetto).
+#
+# Profiling is opt-in: a MAS without profiler only
+# checks once per cycle that it has none.
+#
+#==================================================
+
+# --- Constants ---
+
+MAX_IDX = 3
+MAS_IDX = 0                 # MAS the profiler is attached to
+TIMINGS_IDX = 1             # Step name -> [calls, seconds, items]
+EVENTS_IDX = 2              # (name, start, seconds, cycle) of each step, or None
+ORIGIN_IDX = 3              # Clock at the creation of the profiler
+
+TIMING_CALLS_IDX = 0
+TIMING_SECONDS_IDX = 1
+TIMING_ITEMS_IDX = 2
+
+# Names of the steps (the same as the *_STEP constants of "mas")
+CYCLE = "cycle"
+ORDER_ACTIVATION = "order activation"
+LIFECYCLE = "lifecycle"
+CYCLE_OBSERVERS = "cycle observers"
+ENDING_CONDITION = "ending condition"
+
+# --- Private functions ---
+
+# Note: These functions should not be called outside this module.
+
+def __get_property(profiler, property_idx):
+    # Return the value of the given property of the profiler.
+    return profiler[property_idx]
+
+def __set_property(profiler, property_idx, value):
+    # Set the value of the given property of the profiler.
+    profiler[property_idx] = value
+
+def __empty_instance():
+    # Return an empty profiler instance.
+    return [None]*(MAX_IDX+1)
+
+def __name_of(kind, fn):
+    # Return the registered name of the function (see
+    # "mas_registry"), or its Python name.
+    try:
+        return reg.name_of(kind, fn)
+    except ValueError:
+        return getattr(fn, "__name__", repr(fn))
+
+def __add(profiler, name, start, items, cycle):
+    # Add a step that started at "start" (clock) and ends now.
+    end = time.perf_counter()
+    timings = __get_property(profiler, TIMINGS_IDX)
+    timing = timings.get(name)
+    if timing is None:
+        timing = [0, 0.0, 0]
+        timings[name] = timing
+    timing[TIMING_CALLS_IDX] += 1
+    timing[TIMING_SECONDS_IDX] += end - start
+    timing[TIMING_ITEMS_IDX] += items
+    events = __get_property(profiler, EVENTS_IDX)
+    if events is not None:
+        events.append((name, start, end - start, cycle))
+
+# --- Initialisation ---
+
+def new_instance(mas, trace=True):
+    """
+        Return a new profiler of the cycles of the MAS (replacing
+        its current profiler). With trace, the steps of each cycle
+        are kept for write_trace.
+    """
+    profiler = __empty_instance()
+    __set_property(profiler, MAS_IDX, mas)
+    __set_property(profiler, TIMINGS_IDX, {})
+    __set_property(profiler, EVENTS_IDX, [] if trace else None)
+    __set_property(profiler, ORIGIN_IDX, time.perf_counter())
+    m.set_profiler(mas, profiler)
+    return profiler
+
+# --- Profiled steps ---
+
+def __step_name(kind, subject):
+    # Return the name of a step of a cycle (see m.run_cycle_steps).
+    if kind == m.CELL_RULE_STEP:
+        return kind + " " + __name_of(reg.CELL_RULE, subject)
+    if kind == m.AGENT_RULES_STEP:
+        rules = pl.stage_agent_rules(subject)
+        return kind + " " + "+".join(__name_of(reg.AGENT_RULE, rule) for rule in rules)
+    return kind
+
+def run_one_cycle(profiler, mas):
+    """
+        Run one experiment cycle of the MAS (see
+        m.run_cycle_steps), timing each of its steps.
+    """
+    cycle = m.get_cycle(mas)
+    def step(kind, subject, items, fn, *args):
+        start = time.perf_counter()
+        fn(*args)
+        __add(profiler, __step_name(kind, subject), start, items, cycle)
+    cycle_start = time.perf_counter()
+    m.run_cycle_steps(mas, step)
+    __add(profiler, CYCLE, cycle_start, 0, cycle)
+
+def timed_ending_condition(profiler, ending_condition):
+    """
+        Return the ending condition, timed by the profiler.
+    """
+    def timed(mas):
+        start = time.perf_counter()
+        ended = ending_condition(mas)
+        __add(profiler, ENDING_CONDITION, start, 0, m.get_cycle(mas))
+        return ended
+    return timed
+
+# --- Results ---
+
+def summary(profiler):
+    """
+        Return one row per step, in the order of their first call:
+        (name, calls, seconds, share of the cycles, seconds per
+        call, seconds per item or None).
+    """
+    timings = __get_property(profiler, TIMINGS_IDX)
+    cycles_seconds = timings[CYCLE][TIMING_SECONDS_IDX] if CYCLE in timings else 0.0
+    rows = []
+    for (name, (calls, seconds, items)) in timings.items():
+        rows.append((name, calls, seconds,
+                     seconds/cycles_seconds if cycles_seconds > 0 else 0.0,
+                     seconds/calls,
+                     seconds/items if items > 0 else None))
+    return rows
+
+def show(profiler):
+    """
+        Print the summary of the profiler as a table.
+    """
+    rows = summary(profiler)
+    width = max([len("step")] + [len(row[0]) for row in rows])
+    print("{:<{}} {:>8} {:>10} {:>7} {:>12} {:>12}".format(
+        "step", width, "calls", "total (s)", "share", "per call", "per item"))
+    for (name, calls, seconds, share, per_call, per_item) in rows:
+        print("{:<{}} {:>8} {:>10.3f} {:>6.1f}% {:>10.3f}ms {:>12}".format(
+            name, width, calls, seconds, 100*share, 1000*per_call,
+            format(1e6*per_item, ".3f") + "us" if per_item is not None else "-"))
+
+def write_trace(profiler, file_name):
+    """
+        Write the steps kept by the profiler (see new_instance) in
+        a Chrome trace event file (JSON).
+    """
+    events = __get_property(profiler, EVENTS_IDX)
+    if events is None:
+        raise Exception("The profiler does not keep a trace (see new_instance).")
+    origin = __get_property(profiler, ORIGIN_IDX)
+    pid = os.getpid()
+    trace_events = [{"name": name, "cat": "mas", "ph": "X", "pid": pid, "tid": 0,
+                     "ts": round(1e6*(start - origin), 3), "dur": round(1e6*seconds, 3),
+                     "args": {"cycle": cycle}}
+                    for (name, start, seconds, cycle) in events]
+    f = open(file_name, "w")
+    try:
+        json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, f)
+    finally:
+        f.close()
@@ -0,0 +1,249 @@
+#==================================================
+# INFO-H-100 - Introduction à l'informatique
+#
+# Prof. Thierry Massart
+# Année académique 2014-2015
+#
+# Projet: Système Multi-Agent (SMA)
+#
+#==================================================
+
+
+
+import hashlib
+import random
+
+# Draws are made in batches with NumPy when it is
+# installed (NumPy is optional).
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+
+#==================================================
+#  RANDOM STREAMS
+#==================================================
+#
+# Each MAS has its own random stream (see mas.get_rng),
+# seeded from the SEED key of the configuration, so
+# that an experiment with a given seed is always the
+# same. Without a seed, a new one is drawn (and kept in
+# the stream, see get_seed).
+#
+# Draws are not made one at a time: each kind of draw
+# (e.g. integers between 1 and 2) has a buffer that is
+# filled with BUFFER_SIZE draws at once, and single
+# draws are taken from the buffer.
+#
+# Independent streams (e.g. for the replicas of an
+# experiment run by worker processes) are derived from
+# a seed and keys with substream(). They only depend on
+# the seed and the keys, and not on the number of
+# workers or on the order in which they run.
+#
+# Note: For a given seed, the draws are not the same
+#       with and without NumPy.
+#
+#==================================================
+
+# --- Constants ---
+
+MAX_IDX = 3
+SEED_IDX = 0                # Seed of the stream
+RANDOM_IDX = 1              # Python random generator
+GENERATOR_IDX = 2           # NumPy generator (None without NumPy)
+BUFFERS_IDX = 3             # (kind, low, high) -> remaining draws
+
+BUFFER_SIZE = 1024          # Draws made at once for each buffer
+
+INTEGER = "integer"
+UNIFORM = "uniform"
+
+# --- Private functions ---
+
+# Note: These functions should not be called outside this module.
+
+def __get_property(rng, property_idx):
+    # Return the value of the given property of the stream.
+    return rng[property_idx]
+
+def __set_property(rng, property_idx, value):
+    # Set the value of the given property of the stream.
+    rng[property_idx] = value
+
+def __empty_instance():
+    # Return an empty stream instance.
+    return [None]*(MAX_IDX+1)
+
+def __fill(rng, kind, low, high, n):
+    # Return n new draws of the given kind, last draw first.
+    generator = __get_property(rng, GENERATOR_IDX)
+    if generator is not None:
+        if kind == INTEGER:
+            draws = generator.integers(low, high+1, size=n)
+        else:
+            draws = generator.uniform(low, high, size=n)
+        return draws.tolist()[::-1]
+    python_random = __get_property(rng, RANDOM_IDX)
+    if kind == INTEGER:
+        draws = [python_random.randint(low, high) for i in range(n)]
+    else:
+        draws = [python_random.uniform(low, high) for i in range(n)]
+    return draws[::-1]
+
+def __draw(rng, kind, low, high):
+    # Return one draw of the given kind, from its buffer.
+    buffers = __get_property(rng, BUFFERS_IDX)
+    key = (kind, low, high)
+    buffer = buffers.get(key)
+    if not buffer:
+        buffer = __fill(rng, kind, low, high, BUFFER_SIZE)
+        buffers[key] = buffer
+    return buffer.pop()
+
+def __draws(rng, kind, low, high, n):
+    # Return n draws of the given kind, from its buffer.
+    buffers = __get_property(rng, BUFFERS_IDX)
+    key = (kind, low, high)
+    buffer = buffers.get(key, [])
+    if len(buffer) < n:
+        buffer = __fill(rng, kind, low, high, n-len(buffer)+BUFFER_SIZE) + buffer
+    draws = buffer[len(buffer)-n:][::-1]
+    del buffer[len(buffer)-n:]
+    buffers[key] = buffer
+    return draws
+
+# --- Initialisation ---
+
+def new_instance(seed=None):
+    """
+        Return a new random stream with the given seed (an
+        integer). Without seed, a new one is drawn.
+    """
+    if seed is None:
+        seed = random.SystemRandom().randrange(2**63)
+    rng = __empty_instance()
+    __set_property(rng, SEED_IDX, seed)
+    __set_property(rng, RANDOM_IDX, random.Random(seed))
+    if np is not None:
+        __set_property(rng, GENERATOR_IDX, np.random.default_rng(seed))
+    __set_property(rng, BUFFERS_IDX, {})
+    return rng
+
+def derive_seed(seed, *keys):
+    """
+        Return the seed of the substream of the given seed for
+        the given keys (e.g. the number of a replica).
+    """
+    text = ":".join(str(key) for key in (seed,)+keys)
+    return int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "big")
+
+def substream(rng, *keys):
+    """
+        Return a new random stream, independent of the given one,
+        for the given keys (e.g. the number of a replica).
+    """
+    return new_instance(derive_seed(get_seed(rng), *keys))
+
+# --- Getters ---
+
+def get_seed(rng):
+    """
+        Return the seed of the stream.
+    """
+    return __get_property(rng, SEED_IDX)
+
+def get_generator(rng):
+    """
+        Return the NumPy generator of the stream (None without
+        NumPy), for functions that draw whole arrays.
+    """
+    return __get_property(rng, GENERATOR_IDX)
+
+# --- State ---
+
+def get_state(rng):
+    """
+        Return the state of the stream (generators and buffered
+        draws) as a dictionary of numbers, strings and lists, e.g.
+        to be saved in a checkpoint (see "mas_checkpoint").
+    """
+    (version, internal_state, gauss_next) = __get_property(rng, RANDOM_IDX).getstate()
+    generator = __get_property(rng, GENERATOR_IDX)
+    buffers = __get_property(rng, BUFFERS_IDX)
+    return {
+        "seed": get_seed(rng),
+        "random": [version, list(internal_state), gauss_next],
+        "generator": generator.bit_generator.state if generator is not None else None,
+        "buffers": [[kind, low, high, list(buffer)] for ((kind, low, high), buffer) in buffers.items()],
+    }
+
+def set_state(rng, state):
+    """
+        Restore a state of the stream returned by get_state. The
+        stream then makes the same draws as the saved one.
+    """
+    generator = __get_property(rng, GENERATOR_IDX)
+    if (state["generator"] is None) != (generator is None):
+        # The draws are not the same with and without NumPy.
+        raise Exception("A random stream cannot be restored with a different NumPy availability.")
+    __set_property(rng, SEED_IDX, state["seed"])
+    (version, internal_state, gauss_next) = state["random"]
+    __get_property(rng, RANDOM_IDX).setstate((version, tuple(internal_state), gauss_next))
+    if generator is not None:
+        generator.bit_generator.state = state["generator"]
+    __set_property(rng, BUFFERS_IDX,
+                   {(kind, low, high): list(buffer) for (kind, low, high, buffer) in state["buffers"]})
+
+# --- Draws ---
+
+def randint(rng, low, high):
+    """
+        Return a random integer N such that low <= N <= high.
+    """
+    return __draw(rng, INTEGER, low, high)
+
+def uniform(rng, low, high):
+    """
+        Return a random float N such that low <= N <= high.
+    """
+    return __draw(rng, UNIFORM, low, high)
+
+def randints(rng, low, high, n):
+    """
+        Return a list of n random integers between low and high
+        (included). The draws are the same as n calls to randint.
+    """
+    return __draws(rng, INTEGER, low, high, n)
+
+def uniforms(rng, low, high, n):
+    """
+        Return a list of n random floats between low and high.
+        The draws are the same as n calls to uniform.
+    """
+    return __draws(rng, UNIFORM, low, high, n)
+
+def sample(rng, population_size, n):
+    """
+        Return a list of n distinct random integers between 0 and
+        population_size-1 (the start of a random permutation),
+        drawn at once.
+    """
+    generator = __get_property(rng, GENERATOR_IDX)
+    if generator is not None:
+        return generator.choice(population_size, n, replace=False).tolist()
+    return __get_property(rng, RANDOM_IDX).sample(range(population_size), n)
+
+def shuffle(rng, ls):
+    """
+        Shuffle the list in place.
+    """
+    __get_property(rng, RANDOM_IDX).shuffle(ls)
+
+def choice(rng, ls):
+    """
+        Return a random element of the non-empty list.
+    """
+    return ls[randint(rng, 0, len(ls)-1)]
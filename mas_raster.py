@@ -0,0 +1,197 @@
+#==================================================
+# INFO-H-100 - Introduction à l'informatique
+#
+# Prof. Thierry Massart
+# Année académique 2014-2015
+#
+# Projet: Système Multi-Agent (SMA)
+#
+#==================================================
+
+
+
+import struct
+import zlib
+
+# Images are NumPy arrays (NumPy is optional, but needed to
+# render images).
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+
+#==================================================
+#  RASTER IMAGES
+#==================================================
+#
+# A raster image of the environment is a single RGB
+# array (height x width x 3, uint8) instead of one item
+# per cell, so that large environments can be shown
+# and saved:
+#
+#  - each cell gets the colour of its colour level (0
+#    for a cell at the maximum capacity, 255 for an
+#    empty cell, see mas_frame),
+#  - agents are painted in the colour of their sex.
+#
+# The image is scaled to about "pixels" pixels: each
+# cell is a square of pixels if the environment is
+# smaller, otherwise each pixel is a block of cells
+# (pooling). With "max" pooling, a pixel shows the
+# cell with the most sugar of its block and an agent
+# if there is one in its block; with "mean" pooling, it
+# shows the mean colour level of its block (agents are
+# still shown).
+#
+# The origin of the environment is in the lower left
+# corner of the image.
+#
+#==================================================
+
+# --- Constants ---
+
+MAX_POOLING = "max"
+MEAN_POOLING = "mean"
+DEFAULT_POOLING = MAX_POOLING
+
+AGENT_RGB = {1: (255, 0, 0), 2: (0, 0, 0)}  # Colour of an agent of each sex
+AGENT_SCALE = 0.6                            # Size of an agent in its cell (if large enough)
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# --- Private functions ---
+
+# Note: These functions should not be called outside this module.
+
+def __check_numpy():
+    # Raise an exception if NumPy is not installed.
+    if np is None:
+        raise Exception("Raster images require NumPy to be installed.")
+
+def __palette():
+    # Return the RGB colour of each colour level (256 x 3).
+    palette = np.full((256, 3), 255, dtype=np.uint8)
+    palette[:, 2] = np.arange(256)
+    return palette
+
+def __agent_palette():
+    # Return the RGB colour of each sex (index 0 is unused).
+    palette = np.zeros((max(AGENT_RGB)+1, 3), dtype=np.uint8)
+    for (sex, rgb) in AGENT_RGB.items():
+        palette[sex] = rgb
+    return palette
+
+def __pool(grid, block, pooling):
+    # Return the grid reduced by blocks of block x block cells
+    # (the grid is padded with zeros to a multiple of block, which
+    # are not part of the means). The blocks are reduced one offset
+    # at a time, which is much faster than reducing the axes of a
+    # reshaped grid.
+    size = grid.shape[0]
+    pooled_size = -(-size // block)
+    if pooled_size*block == size:
+        padded = grid
+    else:
+        padded = np.zeros((pooled_size*block, pooled_size*block), dtype=grid.dtype)
+        padded[:size, :size] = grid
+    offsets = [(dy, dx) for dy in range(block) for dx in range(block)]
+    if pooling == MAX_POOLING:
+        pooled = padded[::block, ::block].copy()
+        for (dy, dx) in offsets[1:]:
+            np.maximum(pooled, padded[dy::block, dx::block], out=pooled)
+        return pooled
+    elif pooling == MEAN_POOLING:
+        totals = np.zeros((pooled_size, pooled_size), dtype=np.int64)
+        for (dy, dx) in offsets:
+            totals += padded[dy::block, dx::block]
+        # Number of cells of each block, without the padding.
+        counts = np.minimum(size - np.arange(pooled_size)*block, block)
+        return (totals // np.outer(counts, counts)).astype(grid.dtype)
+    raise ValueError("Unknown pooling: " + str(pooling))
+
+def __png_chunk(chunk_type, data):
+    # Return a PNG chunk: length, type, data and CRC.
+    return (struct.pack(">I", len(data)) + chunk_type + data
+            + struct.pack(">I", zlib.crc32(chunk_type + data) & 0xffffffff))
+
+# --- Rendering ---
+
+def scale_of(env_size, pixels):
+    """
+        Return (cells, pixels) of the image of an environment of
+        the given size, shown on about "pixels" pixels: each
+        block of "cells" x "cells" cells is shown as a square of
+        "pixels" x "pixels" pixels (one of the two is 1).
+    """
+    if env_size <= pixels:
+        return (1, max(pixels // env_size, 1))
+    return (-(-env_size // pixels), 1)
+
+def image_size(env_size, pixels):
+    """
+        Return the width (and height) in pixels of the image of an
+        environment of the given size (see render).
+    """
+    (cells, cell_pixels) = scale_of(env_size, pixels)
+    return -(-env_size // cells) * cell_pixels
+
+def render(color_levels, agents, env_size, pixels, pooling=DEFAULT_POOLING):
+    """
+        Return the RGB image (height x width x 3, uint8) of an
+        environment of the given size, shown on about "pixels"
+        pixels. color_levels holds the colour level of each cell
+        and agents the sex of the agent of each cell (0 if none),
+        both by y*size+x.
+    """
+    __check_numpy()
+    levels = np.asarray(color_levels, dtype=np.uint8).reshape(env_size, env_size)
+    sexes = np.asarray(agents, dtype=np.int8).reshape(env_size, env_size)
+    # Rows from the top of the image (y = size-1) to the bottom.
+    levels = levels[::-1]
+    sexes = sexes[::-1]
+    (cells, cell_pixels) = scale_of(env_size, pixels)
+    if cells > 1:
+        # More sugar is a lower colour level.
+        levels = 255 - __pool(255 - levels, cells, pooling)
+        sexes = __pool(sexes, cells, MAX_POOLING)
+    image = __palette()[levels]
+    if cell_pixels > 1:
+        image = image.repeat(cell_pixels, axis=0).repeat(cell_pixels, axis=1)
+    # Agents: a centred square of each cell (the whole cell if
+    # it is too small).
+    (ys, xs) = np.nonzero(sexes)
+    if len(ys) > 0:
+        colors = __agent_palette()[sexes[ys, xs]]
+        if cell_pixels >= 3:
+            side = max(int(round(cell_pixels*AGENT_SCALE)), 1)
+            start = (cell_pixels - side) // 2
+        else:
+            (side, start) = (cell_pixels, 0)
+        for dy in range(start, start+side):
+            for dx in range(start, start+side):
+                image[ys*cell_pixels+dy, xs*cell_pixels+dx] = colors
+    return image
+
+def to_ppm(image):
+    """
+        Return the binary PPM (P6) encoding of the RGB image.
+    """
+    (height, width) = image.shape[:2]
+    header = "P6\n" + str(width) + " " + str(height) + "\n255\n"
+    return header.encode("ascii") + np.ascontiguousarray(image, dtype=np.uint8).tobytes()
+
+def to_png(image, compression=6):
+    """
+        Return the PNG encoding of the RGB image (8 bits per
+        channel, no filter), compressed with the given zlib level.
+    """
+    (height, width) = image.shape[:2]
+    # Each row starts with its filter type (0: none).
+    rows = np.zeros((height, 1 + 3*width), dtype=np.uint8)
+    rows[:, 1:] = np.asarray(image, dtype=np.uint8).reshape(height, 3*width)
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (PNG_SIGNATURE + __png_chunk(b"IHDR", header)
+            + __png_chunk(b"IDAT", zlib.compress(rows.tobytes(), compression))
+            + __png_chunk(b"IEND", b""))
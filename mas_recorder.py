@@ -0,0 +1,303 @@
+#==================================================
+# INFO-H-100 - Introduction à l'informatique
+#
+# Prof. Thierry Massart
+# Année académique 2014-2015
+#
+# Projet: Système Multi-Agent (SMA)
+#
+#==================================================
+
+
+
+import csv
+import queue
+import struct
+import threading
+
+import mas as m
+import mas_agent as a
+import mas_environment as e
+import mas_population as p
+import mas_stats as st
+
+# The columns are NumPy arrays when it is installed (NumPy is
+# optional, but needed to write ".npy" files).
+try:
+    import numpy as np
+    import mas_grid as g
+    import mas_store as s
+except ImportError:
+    np = None
+    g = None
+    s = None
+
+
+
+#==================================================
+#  RECORDER
+#==================================================
+#
+# A recorder is attached to a MAS (see
+# mas.add_cycle_observer) and records the METRICS of
+# the MAS after each cycle in columns preallocated for
+# "capacity" cycles, used as ring buffers:
+#
+#   recorder = rec.new_instance(mas, "metrics.csv")
+#   m.run_experiment(mas)
+#   rec.close(recorder)
+#
+# The "cycle" of a row is the number of cycles run
+# when it was recorded.
+#
+# With an output file (".csv", or ".npy" with NumPy),
+# the rows are written by a background thread, by
+# chunks of half the capacity, so that the cycles never
+# wait for the file. close() writes the last rows and
+# waits for the thread. Without output file, only the
+# last "capacity" rows are kept (see get_columns).
+#
+#==================================================
+
+# --- Constants ---
+
+MAX_IDX = 9
+MAS_IDX = 0                 # MAS the recorder is attached to
+COLUMNS_IDX = 1             # Metric name -> ring buffer
+ROWS_IDX = 2                # Number of rows recorded
+FLUSHED_IDX = 3             # Number of rows given to the writer thread
+LAST_BIRTHS_IDX = 4         # Births of the population at the last row
+LAST_DEATHS_IDX = 5         # Deaths of the population at the last row
+OBSERVER_IDX = 6            # Cycle observer added to the MAS
+QUEUE_IDX = 7               # Chunks for the writer thread (or None)
+THREAD_IDX = 8              # Writer thread (or None)
+ERRORS_IDX = 9              # Errors of the writer thread
+
+# Metrics: (name, NumPy type).
+METRICS = (
+    ("cycle", "int64"),
+    ("males", "int64"),
+    ("females", "int64"),
+    ("births", "int64"),
+    ("deaths", "int64"),
+    ("mean_sugar", "float64"),
+    ("gini_sugar", "float64"),
+    ("env_sugar", "float64"),
+    ("occupied_cells", "int64"),
+)
+
+DEFAULT_CAPACITY = 4096
+NPY_HEADER_SIZE = 1024      # Bytes, room for the final shape
+
+# --- Private functions ---
+
+# Note: These functions should not be called outside this module.
+
+def __get_property(recorder, property_idx):
+    # Return the value of the given property of the recorder.
+    return recorder[property_idx]
+
+def __set_property(recorder, property_idx, value):
+    # Set the value of the given property of the recorder.
+    recorder[property_idx] = value
+
+def __empty_instance():
+    # Return an empty recorder instance.
+    return [None]*(MAX_IDX+1)
+
+def __sugar_levels(pop):
+    # Return the sugar levels of the agents (an array with the
+    # columnar backend).
+    store = p.get_store(pop)
+    if store is not None:
+        return s.get_column(store, s.SUGAR_LEVEL_IDX)[s.alive_slots(store)]
+    return [a.get_sugar_level(agent) for agent in p.get_agents(pop)]
+
+def __occupied_cells(env, pop):
+    # Return the number of cells with an agent.
+    grid = e.get_grid(env)
+    if grid is not None:
+        return int(np.count_nonzero(g.occupied_mask(grid)))
+    # There is exactly one agent on the cell of each agent.
+    return p.size(pop)
+
+def __npy_header(rows):
+    # Return the header of a ".npy" file of the given number of
+    # rows of METRICS, always NPY_HEADER_SIZE bytes long.
+    descr = np.lib.format.dtype_to_descr(np.dtype(list(METRICS)))
+    header = "{'descr': " + repr(descr) + ", 'fortran_order': False, 'shape': (" + str(rows) + ",), }"
+    header = header.ljust(NPY_HEADER_SIZE-10-1) + "\n"
+    return b"\x93NUMPY\x01\x00" + struct.pack("<H", len(header)) + header.encode("latin1")
+
+def __write(chunks, output, errors):
+    # Body of the writer thread: write the chunks (dictionaries
+    # of columns) until None.
+    f = None
+    try:
+        if output.endswith(".npy"):
+            f = open(output, "wb")
+            f.write(__npy_header(0))
+            rows = 0
+            for chunk in iter(chunks.get, None):
+                records = np.empty(len(chunk["cycle"]), dtype=list(METRICS))
+                for (name, dtype) in METRICS:
+                    records[name] = chunk[name]
+                records.tofile(f)
+                rows += len(records)
+            f.seek(0)
+            f.write(__npy_header(rows))
+        else:
+            f = open(output, "w", newline="")
+            writer = csv.writer(f)
+            writer.writerow([name for (name, dtype) in METRICS])
+            for chunk in iter(chunks.get, None):
+                writer.writerows(zip(*[chunk[name] for (name, dtype) in METRICS]))
+                f.flush()
+    except Exception as error:
+        errors.append(error)
+        # Let the simulation go on: the next chunks are dropped.
+        for chunk in iter(chunks.get, None):
+            pass
+    finally:
+        if f is not None:
+            f.close()
+
+def __ring_rows(recorder, first, last):
+    # Return a copy of the rows first to last (excluded, at most
+    # "capacity" rows) as a dictionary of columns.
+    capacity = capacity_of(recorder)
+    (start, end) = (first % capacity, first % capacity + last - first)
+    columns = {}
+    for (name, column) in __get_property(recorder, COLUMNS_IDX).items():
+        if end <= capacity:
+            rows = column[start:end]
+            columns[name] = rows.copy() if np is not None else rows
+        elif np is not None:
+            columns[name] = np.concatenate((column[start:], column[:end-capacity]))
+        else:
+            columns[name] = column[start:] + column[:end-capacity]
+    return columns
+
+def __flush(recorder):
+    # Give the rows that have not been written yet to the writer
+    # thread.
+    rows = __get_property(recorder, ROWS_IDX)
+    flushed = __get_property(recorder, FLUSHED_IDX)
+    if rows > flushed:
+        __get_property(recorder, QUEUE_IDX).put(__ring_rows(recorder, flushed, rows))
+        __set_property(recorder, FLUSHED_IDX, rows)
+
+# --- Initialisation ---
+
+def new_instance(mas, output=None, capacity=DEFAULT_CAPACITY):
+    """
+        Return a new recorder attached to the MAS, keeping
+        "capacity" rows in memory. The rows are written in the
+        output file (".csv" or ".npy") if one is given.
+    """
+    if capacity < 2:
+        raise ValueError("A recorder needs a capacity of at least 2 rows.")
+    if output is not None and output.endswith(".npy") and np is None:
+        raise Exception("Writing .npy files requires NumPy to be installed.")
+    recorder = __empty_instance()
+    __set_property(recorder, MAS_IDX, mas)
+    columns = {}
+    for (name, dtype) in METRICS:
+        if np is not None:
+            columns[name] = np.zeros(capacity, dtype=dtype)
+        else:
+            columns[name] = [0]*capacity
+    __set_property(recorder, COLUMNS_IDX, columns)
+    __set_property(recorder, ROWS_IDX, 0)
+    __set_property(recorder, FLUSHED_IDX, 0)
+    pop = m.get_pop(mas)
+    __set_property(recorder, LAST_BIRTHS_IDX, p.get_births(pop))
+    __set_property(recorder, LAST_DEATHS_IDX, p.get_dead_agents(pop))
+    __set_property(recorder, ERRORS_IDX, [])
+    if output is not None:
+        chunks = queue.Queue()
+        thread = threading.Thread(target=__write, args=(chunks, output, __get_property(recorder, ERRORS_IDX)),
+                                  name="mas_recorder", daemon=True)
+        __set_property(recorder, QUEUE_IDX, chunks)
+        __set_property(recorder, THREAD_IDX, thread)
+        thread.start()
+    def observer(mas):
+        record(recorder)
+    __set_property(recorder, OBSERVER_IDX, observer)
+    m.add_cycle_observer(mas, observer)
+    return recorder
+
+# --- Recording ---
+
+def capacity_of(recorder):
+    """
+        Return the number of rows kept in memory.
+    """
+    return len(__get_property(recorder, COLUMNS_IDX)["cycle"])
+
+def record(recorder):
+    """
+        Record a row with the current METRICS of the MAS (this is
+        done after each cycle).
+    """
+    mas = __get_property(recorder, MAS_IDX)
+    pop = m.get_pop(mas)
+    env = m.get_env(mas)
+    (males, females) = p.get_agents_alive_by_sex(pop)
+    births = p.get_births(pop)
+    deaths = p.get_dead_agents(pop)
+    sugar_levels = __sugar_levels(pop)
+    if np is not None:
+        sugar_levels = np.asarray(sugar_levels, dtype=np.float64)
+        total_sugar = float(sugar_levels.sum())
+    else:
+        total_sugar = sum(sugar_levels)
+    n = len(sugar_levels)
+    row = __get_property(recorder, ROWS_IDX)
+    i = row % capacity_of(recorder)
+    columns = __get_property(recorder, COLUMNS_IDX)
+    columns["cycle"][i] = m.get_cycle(mas)+1
+    columns["males"][i] = males
+    columns["females"][i] = females
+    columns["births"][i] = births - __get_property(recorder, LAST_BIRTHS_IDX)
+    columns["deaths"][i] = deaths - __get_property(recorder, LAST_DEATHS_IDX)
+    columns["mean_sugar"][i] = total_sugar/n if n > 0 else 0.0
+    columns["gini_sugar"][i] = st.gini(sugar_levels)
+    columns["env_sugar"][i] = e.total_sugar_level(env)
+    columns["occupied_cells"][i] = __occupied_cells(env, pop)
+    __set_property(recorder, LAST_BIRTHS_IDX, births)
+    __set_property(recorder, LAST_DEATHS_IDX, deaths)
+    __set_property(recorder, ROWS_IDX, row+1)
+    if __get_property(recorder, QUEUE_IDX) is not None:
+        if row+1 - __get_property(recorder, FLUSHED_IDX) >= capacity_of(recorder)//2:
+            __flush(recorder)
+    else:
+        # Without output file, the oldest rows are dropped.
+        __set_property(recorder, FLUSHED_IDX, row+1)
+
+def get_columns(recorder):
+    """
+        Return the rows still kept in memory (at most "capacity"),
+        oldest first, as a dictionary of columns (see METRICS).
+    """
+    rows = __get_property(recorder, ROWS_IDX)
+    return __ring_rows(recorder, max(rows - capacity_of(recorder), 0), rows)
+
+def close(recorder):
+    """
+        Detach the recorder from its MAS and, with an output file,
+        write the last rows and wait until the file is complete.
+    """
+    mas = __get_property(recorder, MAS_IDX)
+    observer = __get_property(recorder, OBSERVER_IDX)
+    if observer in m.get_cycle_observers(mas):
+        m.remove_cycle_observer(mas, observer)
+    chunks = __get_property(recorder, QUEUE_IDX)
+    if chunks is not None:
+        __flush(recorder)
+        chunks.put(None)
+        __get_property(recorder, THREAD_IDX).join()
+        __set_property(recorder, QUEUE_IDX, None)
+        errors = __get_property(recorder, ERRORS_IDX)
+        if len(errors) > 0:
+            raise errors[0]
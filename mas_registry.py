@@ -0,0 +1,159 @@
+#==================================================
+# INFO-H-100 - Introduction à l'informatique
+#
+# Prof. Thierry Massart
+# Année académique 2014-2015
+#
+# Projet: Système Multi-Agent (SMA)
+#
+#==================================================
+
+
+
+import ast
+
+import mas as m
+import mas_agent as a
+import mas_cell as c
+import mas_environment as e
+import mas_population as p
+
+
+
+#==================================================
+#  REGISTRY
+#==================================================
+#
+# The functions that a configuration can name, by
+# kind: cell rules, agent rules, activation orders,
+# ending conditions and capacity distributions.
+#
+# The names of a configuration are resolved once,
+# when the MAS is created (see
+# mas.new_instance_from_config), so that an unknown
+# name is reported before the experiment starts and no
+# string is evaluated while it runs.
+#
+# New functions can be made available to
+# configurations with register().
+#
+#==================================================
+
+# --- Constants ---
+
+CELL_RULE = "cell rule"
+AGENT_RULE = "agent rule"
+ORDER_ACTIVATION = "activation order"
+ENDING_CONDITION = "ending condition"
+CAPACITY_DISTRIBUTION = "capacity distribution"
+
+# --- Registry ---
+
+# Kind -> name -> function (see register).
+__registered_functions = None
+
+def __registry():
+    # Return the registry. The functions of the other modules
+    # are only registered on first use, because those modules
+    # may not be completely loaded yet when this one is
+    # imported.
+    global __registered_functions
+    if __registered_functions is None:
+        __registered_functions = {}
+        for (kind, functions) in (
+                (CELL_RULE, (c.regen_two_percent, c.regen_five_percent,
+                             c.regen_ten_percent, c.regen_full)),
+                (AGENT_RULE, (a.grow_up, a.eat_all, a.eat_half, a.eat_quarter,
+                              a.eat_metabolism, a.move_to_a_random_cell,
+                              a.move_to_the_highest_sugar_level_cell,
+                              a.move_by_only_a_cell,
+                              a.move_to_the_lowest_sugar_level_cell,
+                              a.move_by_averrage_living, a.make_a_child)),
+                (ORDER_ACTIVATION, (p.active_agents_randomly,
+                                    p.active_agents_by_sugar_level,
+                                    p.active_agents_by_maintained_sugar_level)),
+                (ENDING_CONDITION, (m.DEFAULT_ENDING_CONDITION,
+                                    m.new_ending_condition)),
+                (CAPACITY_DISTRIBUTION, (e.add_capacity_gaussian, e.add_capacity_uniform))):
+            __registered_functions[kind] = {fn.__name__: fn for fn in functions}
+    return __registered_functions
+
+def register(kind, fn, name=None):
+    """
+        Make the function available to configurations under the
+        given name (its own name by default).
+    """
+    if kind not in __registry():
+        raise ValueError("Unknown kind of function: " + str(kind))
+    if name is None:
+        name = fn.__name__
+    __registry()[kind][name] = fn
+
+def names(kind):
+    """
+        Return the sorted list of the names of a kind of function.
+    """
+    return sorted(__registry()[kind])
+
+def resolve(kind, name):
+    """
+        Return the function of the given kind and name. Raise
+        ValueError if there is none.
+    """
+    functions = __registry()[kind]
+    fn = functions.get(name.strip(), None)
+    if fn is None:
+        raise ValueError("Unknown " + kind + ": " + repr(name)
+                         + " (known: " + ", ".join(names(kind)) + ")")
+    return fn
+
+def name_of(kind, fn):
+    """
+        Return the name under which the function of the given kind
+        is registered (e.g. to save it in a checkpoint). Raise
+        ValueError if it is not registered.
+    """
+    for (name, registered_fn) in __registry()[kind].items():
+        if registered_fn is fn:
+            return name
+    raise ValueError("The " + kind + " " + getattr(fn, "__name__", repr(fn))
+                     + " is not registered (see mas_registry.register)")
+
+# --- Capacity distributions ---
+
+def parse_capacity_distribution(capacity_str):
+    """
+        Return (function, args, kwargs) of the capacity
+        distribution call of the configuration (e.g.
+        "add_capacity_gaussian(env, 0.8, (10, 10), 4)"), without
+        the "env" parameter. The first parameter must be "env"
+        and the others must be literal values.
+    """
+    try:
+        call = ast.parse(capacity_str.strip(), mode="eval").body
+    except SyntaxError:
+        raise ValueError("Invalid " + CAPACITY_DISTRIBUTION + ": " + repr(capacity_str))
+    if not (isinstance(call, ast.Call) and isinstance(call.func, ast.Name)
+            and len(call.args) > 0 and isinstance(call.args[0], ast.Name)
+            and call.args[0].id == "env"):
+        raise ValueError("Invalid " + CAPACITY_DISTRIBUTION + ": " + repr(capacity_str)
+                         + " (expected: name(env, ...))")
+    fn = resolve(CAPACITY_DISTRIBUTION, call.func.id)
+    try:
+        args = [ast.literal_eval(arg) for arg in call.args[1:]]
+        kwargs = {keyword.arg: ast.literal_eval(keyword.value) for keyword in call.keywords}
+    except ValueError:
+        raise ValueError("Invalid " + CAPACITY_DISTRIBUTION + ": " + repr(capacity_str)
+                         + " (parameters must be literal values)")
+    return (fn, args, kwargs)
+
+def resolve_capacity_distribution(capacity_str):
+    """
+        Return a function that applies the capacity distribution
+        call of the configuration (see parse_capacity_distribution)
+        to the environment it receives.
+    """
+    (fn, args, kwargs) = parse_capacity_distribution(capacity_str)
+    def distribution(env):
+        fn(env, *args, **kwargs)
+    return distribution
@@ -0,0 +1,226 @@
+#==================================================
+# INFO-H-100 - Introduction à l'informatique
+#
+# Prof. Thierry Massart
+# Année académique 2014-2015
+#
+# Projet: Système Multi-Agent (SMA)
+#
+#==================================================
+
+
+
+import heapq
+import math
+
+import mas_agent as a
+import mas_population as p
+import mas_random as r
+
+# The columnar population needs NumPy, which is optional.
+try:
+    import numpy as np
+    import mas_store as s
+except ImportError:
+    np = None
+    s = None
+
+
+
+#==================================================
+#  SCHEDULER (activation orders)
+#==================================================
+#
+# The orders in which the agents of a population are
+# activated (see the "Population Rules" of
+# "mas_population"), for both population backends:
+#
+#  - shuffle_order: a uniformly random order,
+#  - sort_order: the ascending order of the sugar
+#    levels, agents with the same sugar level being
+#    activated in the reverse of their previous order,
+#  - maintained_order: the ascending order of the
+#    sugar levels, kept from one cycle to the next.
+#    Only the agents whose sugar level changed since
+#    the last cycle (and the new agents) are sorted,
+#    then merged with the others. Agents with the same
+#    sugar level keep their previous order, except that
+#    the sorted ones come after the others.
+#
+#==================================================
+
+# --- Constants ---
+
+MAX_IDX = 0
+LAST_KEYS_IDX = 0           # Sugar level of each agent when last sorted
+
+# --- Private functions ---
+
+# Note: These functions should not be called outside this module.
+
+def __get_property(scheduler, property_idx):
+    # Return the value of the given property of the scheduler.
+    return scheduler[property_idx]
+
+def __set_property(scheduler, property_idx, value):
+    # Set the value of the given property of the scheduler.
+    scheduler[property_idx] = value
+
+def __empty_instance():
+    # Return an empty scheduler instance.
+    return [None]*(MAX_IDX+1)
+
+def __maintained_agents(scheduler, agents):
+    # Return the agents (list backend) in maintained order.
+    last_keys = __get_property(scheduler, LAST_KEYS_IDX)
+    kept = []
+    changed = []
+    highest = None
+    for agent in agents:
+        key = a.get_sugar_level(agent)
+        # An agent is kept in place if its sugar level did not
+        # change and the kept agents are still sorted.
+        if last_keys.get(id(agent)) == key and (highest is None or key >= highest):
+            kept.append((key, 0, len(kept)+len(changed), agent))
+            highest = key
+        else:
+            changed.append((key, 1, len(kept)+len(changed), agent))
+    changed.sort()
+    # Changed agents come after the kept ones with the same key.
+    # Positions are unique, so agents are never compared.
+    merged = [entry[3] for entry in heapq.merge(kept, changed)]
+    __set_property(scheduler, LAST_KEYS_IDX,
+                   {id(agent): a.get_sugar_level(agent) for agent in merged})
+    return merged
+
+def __maintained_slots(scheduler, store):
+    # Return the slots of the agents (columnar backend) in
+    # maintained order.
+    s.compact(store)
+    order = np.array(s.get_order(store), dtype=np.intp)
+    keys = s.get_column(store, s.SUGAR_LEVEL_IDX)[order]
+    last_keys = __get_property(scheduler, LAST_KEYS_IDX)
+    if last_keys is None or len(last_keys) < len(s.get_views(store)):
+        # Slots without a known sugar level are always sorted.
+        grown = np.full(len(s.get_views(store)), np.nan)
+        if last_keys is not None:
+            grown[:len(last_keys)] = last_keys
+        last_keys = grown
+    kept = keys == last_keys[order]
+    # The kept agents must still be sorted (e.g. a new agent in
+    # a reused slot may have the sugar level of the dead one).
+    highest = np.maximum.accumulate(np.where(kept, keys, -np.inf))
+    kept[1:] &= keys[1:] >= highest[:-1]
+    kept_slots = order[kept]
+    changed_slots = order[~kept]
+    changed_keys = keys[~kept]
+    sorting = np.argsort(changed_keys, kind="stable")
+    changed_slots = changed_slots[sorting]
+    changed_keys = changed_keys[sorting]
+    # Changed agents come after the kept ones with the same key.
+    positions = np.searchsorted(keys[kept], changed_keys, side="right")
+    merged = np.insert(kept_slots, positions, changed_slots)
+    last_keys[merged] = s.get_column(store, s.SUGAR_LEVEL_IDX)[merged]
+    __set_property(scheduler, LAST_KEYS_IDX, last_keys)
+    return merged.tolist()
+
+# --- Initialisation ---
+
+def new_instance(pop):
+    """
+        Return a new scheduler for the given population.
+    """
+    scheduler = __empty_instance()
+    if p.get_store(pop) is None:
+        __set_property(scheduler, LAST_KEYS_IDX, {})
+    return scheduler
+
+def get_scheduler(pop):
+    """
+        Return the scheduler of the population, created on first use.
+    """
+    scheduler = p.get_scheduler(pop)
+    if scheduler is None:
+        scheduler = new_instance(pop)
+        p.set_scheduler(pop, scheduler)
+    return scheduler
+
+def get_last_sugar_levels(pop):
+    """
+        Return the sugar level of each agent (in activation order)
+        when the maintained order last sorted it, None for the
+        agents it has not sorted yet (e.g. to save it in a
+        checkpoint). Return None if the population has no
+        scheduler.
+    """
+    scheduler = p.get_scheduler(pop)
+    if scheduler is None:
+        return None
+    last_keys = __get_property(scheduler, LAST_KEYS_IDX)
+    store = p.get_store(pop)
+    if store is None:
+        return [last_keys.get(id(agent)) for agent in p.get_agents(pop)]
+    if last_keys is None:
+        return [None]*s.size(store)
+    levels = []
+    for agent in p.get_agents(pop):
+        level = float(last_keys[agent.slot]) if agent.slot < len(last_keys) else math.nan
+        levels.append(None if math.isnan(level) else level)
+    return levels
+
+def set_last_sugar_levels(pop, levels):
+    """
+        Restore the sugar levels returned by get_last_sugar_levels
+        for the agents of the population (in activation order).
+    """
+    scheduler = get_scheduler(pop)
+    store = p.get_store(pop)
+    if store is None:
+        last_keys = {id(agent): level for (agent, level) in zip(p.get_agents(pop), levels)
+                     if level is not None}
+    else:
+        last_keys = np.full(len(s.get_views(store)), np.nan)
+        for (agent, level) in zip(p.get_agents(pop), levels):
+            if level is not None:
+                last_keys[agent.slot] = level
+    __set_property(scheduler, LAST_KEYS_IDX, last_keys)
+
+# --- Orders ---
+
+def shuffle_order(pop):
+    """
+        Activate the agents in a uniformly random order.
+    """
+    store = p.get_store(pop)
+    if store is not None:
+        s.compact(store)
+        r.shuffle(p.get_rng(pop), s.get_order(store))
+    else:
+        r.shuffle(p.get_rng(pop), p.get_agents(pop))
+
+def sort_order(pop):
+    """
+        Activate the agents in ascending order of their sugar
+        level. Agents with the same sugar level are activated in
+        the reverse of their previous order.
+    """
+    store = p.get_store(pop)
+    if store is not None:
+        s.sort_by_sugar_level(store)
+    else:
+        # sorted() is stable, so ties keep the reversed order.
+        p.set_agents(pop, sorted(reversed(p.get_agents(pop)), key=a.get_sugar_level))
+
+def maintained_order(pop):
+    """
+        Activate the agents in ascending order of their sugar
+        level, only sorting again the agents whose sugar level
+        changed since the last cycle (see the top of this module
+        for the order of agents with the same sugar level).
+    """
+    scheduler = get_scheduler(pop)
+    store = p.get_store(pop)
+    if store is not None:
+        s.set_order(store, __maintained_slots(scheduler, store))
+    else:
+        p.set_agents(pop, __maintained_agents(scheduler, p.get_agents(pop)))
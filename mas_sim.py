@@ -27,23 +27,62 @@ import mas_visual as v
 #  TESTING
 #==================================================
 
-# Read the configuration file
-conf = u.config_read_file("config.cfg")
+def main():
+    """
+        Run the experiment of the configuration file.
+    """
+    # Read the configuration file
+    conf = u.config_read_file("config.cfg")
 
-# Create a new MAS instance from that configuration
-mas = m.new_instance_from_config(conf)
+    # Create a new MAS instance from that configuration
+    mas = m.new_instance_from_config(conf)
 
-# Set the sugar level of each cell to its capacity
-# (otherwise, the agent would die immediately because
-# there would initially be no sugar in the environment)
-env = m.get_env(mas)
-e.set_cell_sugar_level_to_capacity(env)
+    # Set the sugar level of each cell to its capacity
+    # (otherwise, the agent would die immediately because
+    # there would initially be no sugar in the environment)
+    env = m.get_env(mas)
+    e.set_cell_sugar_level_to_capacity(env)
 
-# Run experiment (with or without visualisation)
-#m.run_experiment(mas)
-v.run_experiment(mas)
+    # Uncomment the following lines to record metrics after each
+    # cycle in a CSV file (see mas_recorder).
+    #import mas_recorder as rec
+    #recorder = rec.new_instance(mas, "metrics.csv")
 
-#m.show(mas)
-# Plot the result at the end of the experiment
-# CAUTION: This only works if matplotlib is installed.
-#g.mas_plot(mas)
+    # Uncomment the following lines to write an image of the
+    # environment every 10 cycles (see mas_export).
+    #import mas_export as ex
+    #exporter = ex.new_instance(mas, "frame_%06d.png", 10)
+
+    # Uncomment the following lines to time the rules of each cycle
+    # (see mas_profile).
+    #import mas_profile as pf
+    #profiler = pf.new_instance(mas)
+
+    # Run experiment (with or without visualisation)
+    #m.run_experiment(mas)
+    v.run_experiment(mas)
+    # Uncomment the following line instead to run the simulation in
+    # a separate process, the window showing its latest state.
+    # CAUTION: This only works if numpy is installed, and not on
+    # Windows (the process is started with "fork").
+    #v.run_experiment(mas, separate_process=True)
+    #rec.close(recorder)
+    #ex.close(exporter)
+    #pf.show(profiler)
+    #pf.write_trace(profiler, "trace.json")
+
+    # Uncomment the following lines to resume an experiment from
+    # the checkpoint file of the configuration (CHECKPOINT_FILE).
+    #mas = m.load_checkpoint("checkpoint.npz")
+    #m.continue_experiment(mas)
+
+    #m.show(mas)
+    # Plot the result at the end of the experiment
+    # CAUTION: This only works if matplotlib is installed.
+    #g.mas_plot(mas)
+
+# The experiment is only run when this file is run as a script,
+# not when it is imported (e.g. by a process started with the
+# "spawn" method of multiprocessing).
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+#==================================================
+# INFO-H-100 - Introduction à l'informatique
+#
+# Prof. Thierry Massart
+# Année académique 2014-2015
+#
+# Projet: Système Multi-Agent (SMA)
+#
+#==================================================
+
+
+
+import bisect
+import math
+
+# Gini coefficients of arrays are computed with NumPy when it
+# is installed (NumPy is optional).
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+
+#==================================================
+#  STREAMING STATISTICS
+#==================================================
+#
+# Accumulators that summarise a stream of values in a
+# constant memory, whatever the number of values:
+#
+#  - moments: count, mean and variance, updated with
+#    Welford's method (two accumulators can be merged
+#    with merge_moments),
+#  - quantiles: the exact quantile of the first
+#    EXACT_QUANTILE_VALUES values, then an estimate with
+#    the P² algorithm (Jain and Chlamtac, 1985), which
+#    keeps five markers instead of the values. The
+#    markers start from the sorted first values, since
+#    P² is far off with a few values only (e.g. the 95%
+#    quantile of 6 values).
+#
+# It also has statistics of a whole sample (gini).
+#
+#==================================================
+
+# --- Constants ---
+
+MOMENTS_MAX_IDX = 2
+MOMENTS_COUNT_IDX = 0       # Number of values
+MOMENTS_MEAN_IDX = 1        # Mean of the values
+MOMENTS_M2_IDX = 2          # Sum of the squared deviations from the mean
+
+QUANTILE_MAX_IDX = 5
+QUANTILE_Q_IDX = 0          # Quantile estimated (between 0 and 1)
+QUANTILE_HEIGHTS_IDX = 1    # Heights of the markers (None before the markers)
+QUANTILE_POSITIONS_IDX = 2  # Positions of the markers
+QUANTILE_DESIRED_IDX = 3    # Desired positions of the markers
+QUANTILE_INCREMENTS_IDX = 4 # Increments of the desired positions
+QUANTILE_VALUES_IDX = 5     # Sorted first values (None once the markers start)
+
+MARKERS = 5
+EXACT_QUANTILE_VALUES = 50  # Values kept before the markers start
+
+# --- Moments ---
+
+def new_moments():
+    """
+        Return a new moments accumulator, without values.
+    """
+    moments = [None]*(MOMENTS_MAX_IDX+1)
+    moments[MOMENTS_COUNT_IDX] = 0
+    moments[MOMENTS_MEAN_IDX] = 0.0
+    moments[MOMENTS_M2_IDX] = 0.0
+    return moments
+
+def add_to_moments(moments, value):
+    """
+        Add a value to the moments accumulator.
+    """
+    count = moments[MOMENTS_COUNT_IDX] + 1
+    delta = value - moments[MOMENTS_MEAN_IDX]
+    mean = moments[MOMENTS_MEAN_IDX] + delta/count
+    moments[MOMENTS_COUNT_IDX] = count
+    moments[MOMENTS_MEAN_IDX] = mean
+    moments[MOMENTS_M2_IDX] += delta*(value - mean)
+
+def merge_moments(moments, other):
+    """
+        Add the values of the other accumulator to the moments
+        accumulator (as if they had been added one by one).
+    """
+    count_b = other[MOMENTS_COUNT_IDX]
+    if count_b == 0:
+        return
+    count_a = moments[MOMENTS_COUNT_IDX]
+    count = count_a + count_b
+    delta = other[MOMENTS_MEAN_IDX] - moments[MOMENTS_MEAN_IDX]
+    moments[MOMENTS_MEAN_IDX] += delta*count_b/count
+    moments[MOMENTS_M2_IDX] += other[MOMENTS_M2_IDX] + delta*delta*count_a*count_b/count
+    moments[MOMENTS_COUNT_IDX] = count
+
+def count(moments):
+    """
+        Return the number of values of the accumulator.
+    """
+    return moments[MOMENTS_COUNT_IDX]
+
+def mean(moments):
+    """
+        Return the mean of the values (0 without values).
+    """
+    return moments[MOMENTS_MEAN_IDX]
+
+def variance(moments):
+    """
+        Return the sample variance of the values (0 with less
+        than two values).
+    """
+    if moments[MOMENTS_COUNT_IDX] < 2:
+        return 0.0
+    return moments[MOMENTS_M2_IDX]/(moments[MOMENTS_COUNT_IDX]-1)
+
+def std(moments):
+    """
+        Return the sample standard deviation of the values.
+    """
+    return math.sqrt(variance(moments))
+
+def confidence_interval(moments, z=1.96):
+    """
+        Return the confidence interval (low, high) of the mean,
+        with the normal approximation (z = 1.96 for 95%).
+    """
+    n = moments[MOMENTS_COUNT_IDX]
+    if n == 0:
+        return (0.0, 0.0)
+    margin = z*std(moments)/math.sqrt(n)
+    return (mean(moments) - margin, mean(moments) + margin)
+
+# --- Quantiles ---
+
+def new_quantile(q):
+    """
+        Return a new estimator of the quantile q (between 0 and
+        1, e.g. 0.5 for the median), without values.
+    """
+    if not 0 <= q <= 1:
+        raise ValueError("A quantile must be between 0 and 1: " + str(q))
+    quantile = [None]*(QUANTILE_MAX_IDX+1)
+    quantile[QUANTILE_Q_IDX] = q
+    quantile[QUANTILE_INCREMENTS_IDX] = [0, q/2, q, (1+q)/2, 1]
+    quantile[QUANTILE_VALUES_IDX] = []
+    return quantile
+
+def __start_markers(quantile):
+    # Replace the sorted first values by the five markers, at
+    # the values closest to their desired positions.
+    values = quantile[QUANTILE_VALUES_IDX]
+    n = len(values)
+    desired = [1 + (n-1)*increment for increment in quantile[QUANTILE_INCREMENTS_IDX]]
+    positions = [int(round(position)) for position in desired]
+    # The positions of the markers must be distinct.
+    for i in range(1, MARKERS-1):
+        positions[i] = max(positions[i], positions[i-1]+1)
+    for i in range(MARKERS-2, 0, -1):
+        positions[i] = min(positions[i], positions[i+1]-1)
+    quantile[QUANTILE_HEIGHTS_IDX] = [values[position-1] for position in positions]
+    quantile[QUANTILE_POSITIONS_IDX] = positions
+    quantile[QUANTILE_DESIRED_IDX] = desired
+    quantile[QUANTILE_VALUES_IDX] = None
+
+def __parabolic(heights, positions, i, d):
+    # Return the P² (piecewise parabolic) height of marker i
+    # moved by d.
+    return heights[i] + d/(positions[i+1]-positions[i-1])*(
+        (positions[i]-positions[i-1]+d)*(heights[i+1]-heights[i])/(positions[i+1]-positions[i])
+        + (positions[i+1]-positions[i]-d)*(heights[i]-heights[i-1])/(positions[i]-positions[i-1]))
+
+def __linear(heights, positions, i, d):
+    # Return the linear height of marker i moved by d.
+    return heights[i] + d*(heights[i+d]-heights[i])/(positions[i+d]-positions[i])
+
+def add_to_quantile(quantile, value):
+    """
+        Add a value to the quantile estimator.
+    """
+    values = quantile[QUANTILE_VALUES_IDX]
+    if values is not None:
+        bisect.insort(values, value)
+        if len(values) > EXACT_QUANTILE_VALUES:
+            __start_markers(quantile)
+        return
+    heights = quantile[QUANTILE_HEIGHTS_IDX]
+    positions = quantile[QUANTILE_POSITIONS_IDX]
+    desired = quantile[QUANTILE_DESIRED_IDX]
+    increments = quantile[QUANTILE_INCREMENTS_IDX]
+    # Cell of the new value, extending the extreme markers.
+    if value < heights[0]:
+        heights[0] = value
+        k = 0
+    elif value >= heights[MARKERS-1]:
+        heights[MARKERS-1] = value
+        k = MARKERS-2
+    else:
+        k = 0
+        while value >= heights[k+1]:
+            k += 1
+    for i in range(k+1, MARKERS):
+        positions[i] += 1
+    for i in range(MARKERS):
+        desired[i] += increments[i]
+    # Move the middle markers towards their desired positions.
+    for i in range(1, MARKERS-1):
+        gap = desired[i] - positions[i]
+        if (gap >= 1 and positions[i+1]-positions[i] > 1) or (gap <= -1 and positions[i-1]-positions[i] < -1):
+            d = 1 if gap > 0 else -1
+            height = __parabolic(heights, positions, i, d)
+            if not heights[i-1] < height < heights[i+1]:
+                height = __linear(heights, positions, i, d)
+            heights[i] = height
+            positions[i] += d
+
+def quantile_value(quantile):
+    """
+        Return the estimate of the quantile (exact with up to
+        EXACT_QUANTILE_VALUES values, None without values).
+    """
+    values = quantile[QUANTILE_VALUES_IDX]
+    if values is not None:
+        if len(values) == 0:
+            return None
+        # Exact quantile of the values (linear interpolation).
+        position = quantile[QUANTILE_Q_IDX]*(len(values)-1)
+        low = int(math.floor(position))
+        high = min(low+1, len(values)-1)
+        return float(values[low] + (position-low)*(values[high]-values[low]))
+    heights = quantile[QUANTILE_HEIGHTS_IDX]
+    # The extreme markers are the minimum and maximum values.
+    if quantile[QUANTILE_Q_IDX] == 0:
+        return float(heights[0])
+    if quantile[QUANTILE_Q_IDX] == 1:
+        return float(heights[MARKERS-1])
+    return float(heights[2])
+
+# --- Samples ---
+
+def gini(values):
+    """
+        Return the Gini coefficient of the non-negative values (0
+        for perfect equality, close to 1 when one value has
+        everything), 0 without values or if they are all 0.
+    """
+    if np is not None:
+        values = np.sort(np.asarray(values, dtype=np.float64))
+        n = len(values)
+        total = values.sum()
+        if n == 0 or total == 0:
+            return 0.0
+        weights = 2*np.arange(1, n+1) - n - 1
+        return float(weights @ values/(n*total))
+    values = sorted(values)
+    n = len(values)
+    total = sum(values)
+    if n == 0 or total == 0:
+        return 0.0
+    return sum((2*i - n - 1)*value for (i, value) in enumerate(values, 1))/(n*total)
@@ -0,0 +1,324 @@
+#==================================================
+# INFO-H-100 - Introduction à l'informatique
+#
+# Prof. Thierry Massart
+# Année académique 2014-2015
+#
+# Projet: Système Multi-Agent (SMA)
+#
+#==================================================
+
+
+
+import numpy as np
+
+import mas_agent as a
+
+
+
+#==================================================
+#  STORE (columnar agent storage)
+#==================================================
+#
+# Instead of one "mas_agent" list per agent, the store
+# keeps every agent property in a NumPy column, indexed
+# by the slot of the agent. A slot is either:
+#  - alive: the agent is in the activation order,
+#  - released: the agent died during this cycle, the
+#    slot is reused once the order has been compacted,
+#  - free: the slot can be given to a new agent.
+#
+# Agents are still available as "views" on their slot,
+# so that all functions of the "mas_agent" module (and
+# all agent rules) keep working on a columnar
+# population.
+#
+#==================================================
+
+# --- Constants ---
+
+MAX_IDX = 16
+POP_IDX = 0                 # Population the store belongs to
+METABOLISM_IDX = 1          # Column of metabolisms
+X_IDX = 2                   # Column of x positions
+Y_IDX = 3                   # Column of y positions
+SUGAR_LEVEL_IDX = 4         # Column of sugar levels
+VISION_CAPACITY_IDX = 5     # Column of vision capacities
+AGE_IDX = 6                 # Column of ages
+SEX_IDX = 7                 # Column of sexes
+ALIVE_IDX = 8               # Column of alive flags
+VIEWS_IDX = 9               # View of the agent of each slot
+FREE_SLOTS_IDX = 10         # Slots that can be given to new agents
+RELEASED_SLOTS_IDX = 11     # Slots of dead agents, free after compaction
+ORDER_IDX = 12              # Activation order (list of slots)
+COUNT_IDX = 13              # Number of alive agents
+READERS_IDX = 14            # Agent property index -> reading function
+WRITERS_IDX = 15            # Agent property index -> writing function
+CAPACITY_IDX = 16           # Number of allocated slots
+
+COLUMNS = (
+    (METABOLISM_IDX, np.float64),
+    (X_IDX, np.int32),
+    (Y_IDX, np.int32),
+    (SUGAR_LEVEL_IDX, np.float64),
+    (VISION_CAPACITY_IDX, np.int32),
+    (AGE_IDX, np.int32),
+    (SEX_IDX, np.int8),
+    (ALIVE_IDX, np.bool_),
+)
+
+# --- Private functions ---
+
+# Note: These functions should not be called outside this module.
+
+def __get_property(store, property_idx):
+    # Return the value of the given property of the store.
+    return store[property_idx]
+
+def __set_property(store, property_idx, value):
+    # Set the value of the given property of the store.
+    store[property_idx] = value
+
+def __empty_instance():
+    # Return an empty store instance.
+    return [None]*(MAX_IDX+1)
+
+def __grow(store):
+    # Double the number of allocated slots.
+    capacity = __get_property(store, CAPACITY_IDX)
+    new_capacity = max(2*capacity, 16)
+    for (column_idx, dtype) in COLUMNS:
+        column = np.zeros(new_capacity, dtype=dtype)
+        column[:capacity] = store[column_idx]
+        store[column_idx] = column
+    views = __get_property(store, VIEWS_IDX)
+    views.extend([None]*(new_capacity-capacity))
+    # Give the lowest slots first.
+    free_slots = __get_property(store, FREE_SLOTS_IDX)
+    free_slots.extend(range(new_capacity-1, capacity-1, -1))
+    __set_property(store, CAPACITY_IDX, new_capacity)
+
+def __accessors(store):
+    # Return the reading and writing functions of each agent
+    # property, indexed as in the "mas_agent" module.
+    def column_accessors(column_idx, cast):
+        def read(slot):
+            return cast(store[column_idx][slot])
+        def write(slot, value):
+            store[column_idx][slot] = value
+        return (read, write)
+    def read_pos(slot):
+        return (int(store[X_IDX][slot]), int(store[Y_IDX][slot]))
+    def write_pos(slot, position):
+        (store[X_IDX][slot], store[Y_IDX][slot]) = position
+    def read_population(slot):
+        return store[POP_IDX]
+    def write_population(slot, pop):
+        if pop is not store[POP_IDX]:
+            raise Exception("An agent of a store cannot be moved to another population.")
+    readers = {}
+    writers = {}
+    for (property_idx, column_idx, cast) in (
+            (a.AGENT_METABOLISM_IDX, METABOLISM_IDX, float),
+            (a.AGENT_SUGAR_LEVEL_IDX, SUGAR_LEVEL_IDX, float),
+            (a.AGENT_VISION_CAPACITY_IDX, VISION_CAPACITY_IDX, int),
+            (a.AGENT_AGE_IDX, AGE_IDX, int),
+            (a.AGENT_SEX_IDX, SEX_IDX, int)):
+        (readers[property_idx], writers[property_idx]) = column_accessors(column_idx, cast)
+    readers[a.AGENT_POSITION_IDX] = read_pos
+    writers[a.AGENT_POSITION_IDX] = write_pos
+    readers[a.AGENT_POPULATION_IDX] = read_population
+    writers[a.AGENT_POPULATION_IDX] = write_population
+    return (readers, writers)
+
+# --- Agent view ---
+
+class AgentView:
+    """
+        View on the agent of one slot of a store. It can be
+        indexed with the property indexes of the "mas_agent"
+        module exactly like a list-based agent, but reads and
+        writes go to the columns of the store.
+        There is a single view per living agent, so views can
+        be compared by identity.
+    """
+    __slots__ = ("store", "slot")
+
+    def __init__(self, store, slot):
+        self.store = store
+        self.slot = slot
+
+    def __getitem__(self, property_idx):
+        return self.store[READERS_IDX][property_idx](self.slot)
+
+    def __setitem__(self, property_idx, value):
+        self.store[WRITERS_IDX][property_idx](self.slot, value)
+
+# --- Initialisation ---
+
+def new_instance(pop, capacity):
+    """
+        Return a new empty store for the given population, with
+        room for "capacity" agents before it has to grow.
+    """
+    store = __empty_instance()
+    __set_property(store, POP_IDX, pop)
+    for (column_idx, dtype) in COLUMNS:
+        __set_property(store, column_idx, np.zeros(0, dtype=dtype))
+    __set_property(store, VIEWS_IDX, [])
+    __set_property(store, FREE_SLOTS_IDX, [])
+    __set_property(store, RELEASED_SLOTS_IDX, [])
+    __set_property(store, ORDER_IDX, [])
+    __set_property(store, COUNT_IDX, 0)
+    (readers, writers) = __accessors(store)
+    __set_property(store, READERS_IDX, readers)
+    __set_property(store, WRITERS_IDX, writers)
+    __set_property(store, CAPACITY_IDX, 0)
+    while __get_property(store, CAPACITY_IDX) < capacity:
+        __grow(store)
+    return store
+
+# --- Getters ---
+
+def get_column(store, column_idx):
+    """
+        Return one column of the store (e.g. SUGAR_LEVEL_IDX).
+        Only the entries of alive slots are meaningful.
+    """
+    return __get_property(store, column_idx)
+
+def get_order(store):
+    """
+        Return the activation order as a list of slots. It may
+        still contain slots of agents that died during the
+        current cycle (see compact).
+    """
+    return __get_property(store, ORDER_IDX)
+
+def set_order(store, order):
+    """
+        Set the activation order as a list of slots of alive agents.
+    """
+    __set_property(store, ORDER_IDX, order)
+
+def get_views(store):
+    """
+        Return the list of agent views, indexed by slot.
+    """
+    return __get_property(store, VIEWS_IDX)
+
+def size(store):
+    """
+        Return the number of alive agents.
+    """
+    return __get_property(store, COUNT_IDX)
+
+def alive_slots(store):
+    """
+        Return the array of the slots of all alive agents, in
+        ascending order.
+    """
+    return np.flatnonzero(__get_property(store, ALIVE_IDX))
+
+# --- Births and deaths ---
+
+def new_agent(store):
+    """
+        Allocate a slot and return the view of its agent. The
+        agent is not alive until it is added with add_agent.
+    """
+    free_slots = __get_property(store, FREE_SLOTS_IDX)
+    if len(free_slots) == 0:
+        __grow(store)
+    slot = free_slots.pop()
+    views = __get_property(store, VIEWS_IDX)
+    agent = AgentView(store, slot)
+    views[slot] = agent
+    return agent
+
+def add_agent(store, agent):
+    """
+        Make the agent alive and append it to the activation order.
+    """
+    slot = agent.slot
+    __get_property(store, ALIVE_IDX)[slot] = True
+    __get_property(store, ORDER_IDX).append(slot)
+    __set_property(store, COUNT_IDX, __get_property(store, COUNT_IDX)+1)
+
+def remove_agents(store, slots):
+    """
+        Mark the agents of the given (alive, distinct) slots as dead
+        at once. Their slots leave the activation order (and can be
+        reused) at the next compaction.
+    """
+    slots = np.asarray(slots, dtype=np.intp)
+    __get_property(store, ALIVE_IDX)[slots] = False
+    __get_property(store, RELEASED_SLOTS_IDX).extend(slots.tolist())
+    __set_property(store, COUNT_IDX, __get_property(store, COUNT_IDX)-len(slots))
+
+def compact(store):
+    """
+        Remove the slots of dead agents from the activation order
+        and make them available for new agents.
+    """
+    released_slots = __get_property(store, RELEASED_SLOTS_IDX)
+    if len(released_slots) > 0:
+        alive = __get_property(store, ALIVE_IDX)
+        order = [slot for slot in __get_property(store, ORDER_IDX) if alive[slot]]
+        __set_property(store, ORDER_IDX, order)
+        views = __get_property(store, VIEWS_IDX)
+        for slot in released_slots:
+            views[slot] = None
+        __get_property(store, FREE_SLOTS_IDX).extend(released_slots)
+        __set_property(store, RELEASED_SLOTS_IDX, [])
+
+# --- Functions on all agents ---
+
+def agents(store):
+    """
+        Return the list of the views of all alive agents, in
+        activation order.
+    """
+    alive = __get_property(store, ALIVE_IDX)
+    views = __get_property(store, VIEWS_IDX)
+    return [views[slot] for slot in __get_property(store, ORDER_IDX) if alive[slot]]
+
+def set_agents(store, agents_list):
+    """
+        Set the activation order from a list of agent views.
+    """
+    compact(store)
+    __set_property(store, ORDER_IDX, [agent.slot for agent in agents_list])
+
+def apply_rule(store, rule):
+    """
+        Apply a rule to each agent alive at that moment, in
+        activation order. Agents born while applying the rule are
+        not considered; agents that die are skipped.
+    """
+    # The columns and views are looked up again for each agent,
+    # because a birth may make the store grow.
+    order = __get_property(store, ORDER_IDX)
+    for i in range(len(order)):
+        slot = order[i]
+        if store[ALIVE_IDX][slot]:
+            rule(store[VIEWS_IDX][slot])
+
+def count_by_sex(store, sex):
+    """
+        Return the number of alive agents of the given sex.
+    """
+    alive = __get_property(store, ALIVE_IDX)
+    sexes = __get_property(store, SEX_IDX)
+    return int(np.count_nonzero(alive & (sexes == sex)))
+
+def sort_by_sugar_level(store):
+    """
+        Set the activation order to the ascending order of the
+        sugar level of the agents. Agents with the same sugar
+        level are activated in the reverse of their previous order.
+    """
+    compact(store)
+    order = np.array(__get_property(store, ORDER_IDX)[::-1], dtype=np.intp)
+    keys = __get_property(store, SUGAR_LEVEL_IDX)[order]
+    __set_property(store, ORDER_IDX, order[np.argsort(keys, kind="stable")].tolist())
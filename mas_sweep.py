@@ -0,0 +1,373 @@
+#==================================================
+# INFO-H-100 - Introduction à l'informatique
+#
+# Prof. Thierry Massart
+# Année académique 2014-2015
+#
+# Projet: Système Multi-Agent (SMA)
+#
+#==================================================
+
+
+
+import argparse
+import ast
+import csv
+import itertools
+import multiprocessing
+import sys
+import time
+
+import mas as m
+import mas_agent as a
+import mas_capacity as cap
+import mas_environment as e
+import mas_population as p
+import mas_random as r
+import mas_registry as reg
+import mas_utils as u
+
+# Capacity maps are shared between the worker processes
+# with NumPy, which is optional.
+try:
+    import numpy as np
+    from multiprocessing import shared_memory
+except ImportError:
+    np = None
+    shared_memory = None
+
+
+
+#==================================================
+#  PARAMETER SWEEP
+#==================================================
+#
+# Run, without visualisation, one experiment for each
+# combination of the values given in a sweep file, on
+# all the cores, and write one summary row per run in
+# a CSV file:
+#
+#   python3 mas_sweep.py sweep.cfg -c config.cfg -o sweep.csv
+#
+# Each line of the sweep file gives the values of one
+# key of the configuration, separated by "|", or as a
+# range (the stop value is excluded):
+#
+#   POP_SIZE = 50 | 100 | 200
+#   ENV_SIZE = range(50, 201, 50)
+#
+# The properties of the population and of the
+# environment are given as POP.<NAME> and ENV.<NAME>:
+#
+#   POP.MAX_METABOLISM = range(0.5, 2.0, 0.5)
+#   POP.PROB_TO_HAVE_SEX = 1,2 | 1,4
+#
+# Each value of ADD_AGENT_RULE and ADD_CELL_RULE is a
+# list of rules separated by ",", and each value of
+# ADD_CAPACITY_DISTRIB a list of distributions
+# separated by ";".
+#
+# The seed of each run is derived from the SEED of the
+# configuration (or from a new seed) and the number of
+# the run, so the results do not depend on the number
+# of workers.
+#
+# The capacity maps are computed once, before the runs
+# start, and shared by all workers (see also
+# CAPACITY_CACHE in "mas_capacity", to compute them
+# once for several sweeps).
+#
+#==================================================
+
+# --- Constants ---
+
+LIST_KEYS = {               # Keys that take a list of values
+    "ADD_AGENT_RULE": ",",
+    "ADD_CELL_RULE": ",",
+    "ADD_CAPACITY_DISTRIB": ";",
+}
+
+SUMMARY_FIELDS = ["run", "seed"]
+RESULT_FIELDS = ["cycles", "population", "males", "females", "dead_agents",
+                 "mean_agent_sugar", "total_cell_sugar", "seconds"]
+
+# --- Sweep file ---
+
+def parse_values(values_str):
+    """
+        Return the list of the values (strings) of a line of a
+        sweep file: values separated by "|", or
+        range(start, stop[, step]).
+    """
+    values_str = values_str.strip()
+    if values_str.startswith("range(") and values_str.endswith(")"):
+        try:
+            bounds = ast.literal_eval("(" + values_str[len("range("):-1] + ",)")
+        except (ValueError, SyntaxError):
+            raise ValueError("Invalid range: " + repr(values_str))
+        if not 2 <= len(bounds) <= 3:
+            raise ValueError("Invalid range: " + repr(values_str))
+        (start, stop) = bounds[:2]
+        step = bounds[2] if len(bounds) == 3 else 1
+        if step <= 0:
+            raise ValueError("The step of a range must be positive: " + repr(values_str))
+        values = []
+        i = 0
+        while start + i*step < stop:
+            # Avoid accumulating rounding errors with float steps.
+            values.append(str(round(start + i*step, 10)))
+            i += 1
+        return values
+    return [value.strip() for value in values_str.split("|")]
+
+def read_sweep_file(file_name):
+    """
+        Return the sweep of a file, as a list of (key, values).
+        Empty lines and lines starting with "#" are ignored.
+    """
+    f = open(file_name)
+    all_lines = f.read().split("\n")
+    f.close()
+    sweep = []
+    for line in all_lines:
+        if len(line.strip()) > 0 and line.strip()[0] != "#":
+            (key, sep, values_str) = line.partition("=")
+            if sep == "":
+                raise ValueError("Invalid sweep line (expected KEY = values): " + repr(line))
+            sweep.append((key.strip().upper(), parse_values(values_str)))
+    return sweep
+
+# --- Configurations ---
+
+def set_config_value(config, key, value):
+    """
+        Set a value of the configuration. POP.<NAME> and
+        ENV.<NAME> keys set a property of the population or of
+        the environment.
+    """
+    (section, dot, name) = key.partition(".")
+    if dot != "" and section in ("POP", "ENV"):
+        entries = [entry for entry in u.into_list(config.get(section))
+                   if entry.split(":")[0].strip().upper() != name]
+        config[section] = entries + [name + " : " + value]
+    elif key in LIST_KEYS:
+        config[key] = [item.strip() for item in value.split(LIST_KEYS[key]) if item.strip() != ""]
+    else:
+        config[key] = value
+
+def expand(config, sweep):
+    """
+        Return the list of (values, configuration) of all the
+        combinations of the values of the sweep, where values is
+        the dictionary of the swept values.
+    """
+    keys = [key for (key, values) in sweep]
+    runs = []
+    for combination in itertools.product(*[values for (key, values) in sweep]):
+        run_config = dict(config)
+        for (key, value) in zip(keys, combination):
+            set_config_value(run_config, key, value)
+        runs.append((dict(zip(keys, combination)), run_config))
+    return runs
+
+def check(run_config):
+    """
+        Check the names of a configuration (see "mas_registry"),
+        so that a wrong name is reported before the runs start.
+    """
+    for rule in u.cfg_cell_rules(run_config):
+        reg.resolve(reg.CELL_RULE, rule)
+    for rule in u.cfg_agent_rules(run_config):
+        reg.resolve(reg.AGENT_RULE, rule)
+    for distrib in u.cfg_capacity_distributions(run_config):
+        reg.resolve_capacity_distribution(distrib)
+    ending_condition = u.cfg_ending_condition(run_config)
+    if ending_condition is not None:
+        reg.resolve(reg.ENDING_CONDITION, ending_condition)
+    order_activation = u.cfg_order_activation(run_config)
+    if order_activation is not None:
+        reg.resolve(reg.ORDER_ACTIVATION, order_activation)
+    u.cfg_pop_properties(run_config)
+    u.cfg_env_properties(run_config)
+
+# --- Capacity maps ---
+
+def capacity_key(run_config):
+    """
+        Return what the capacity map of a configuration depends on.
+    """
+    return (u.cfg_env_size(run_config),
+            repr(sorted(u.cfg_env_properties(run_config).items())),
+            tuple(u.cfg_capacity_distributions(run_config)))
+
+def capacity_map(run_config):
+    """
+        Return the capacity map (see e.get_capacities) of the
+        environment of a configuration.
+    """
+    env_config = dict(run_config)
+    if np is not None:
+        env_config["ENV_BACKEND"] = e.NUMPY_BACKEND
+    env = e.new_instance(None, env_config)
+    cap.apply_distributions(env, u.cfg_capacity_distributions(run_config), u.cfg_capacity_cache(run_config))
+    return e.get_capacities(env)
+
+# Capacity maps of a worker: key -> (map, shared memory or None).
+__worker_maps = {}
+
+def init_worker(shared_maps):
+    """
+        Attach a worker process to the shared capacity maps (see
+        share_capacity_maps).
+    """
+    # Each map is either ("shared", name, shape) or ("list",
+    # nested lists).
+    global __worker_maps
+    __worker_maps = {}
+    for (key, shared) in shared_maps.items():
+        if shared[0] == "shared":
+            if sys.version_info >= (3, 13):
+                # Only the main process releases the memory.
+                memory = shared_memory.SharedMemory(name=shared[1], track=False)
+            else:
+                memory = shared_memory.SharedMemory(name=shared[1])
+            capacities = np.ndarray(shared[2], dtype=np.float64, buffer=memory.buf)
+            capacities.flags.writeable = False
+            __worker_maps[key] = (capacities, memory)
+        else:
+            __worker_maps[key] = (shared[1], None)
+
+def worker_capacity_map(run_config):
+    """
+        Return the shared capacity map of a configuration in a
+        worker process, or None if it has not been shared.
+    """
+    return __worker_maps.get(capacity_key(run_config), (None, None))[0]
+
+def share_capacity_maps(run_configs):
+    """
+        Compute the capacity maps of the configurations once and
+        share them with the worker processes. Return the maps to
+        give to init_worker and the shared memories to release
+        (see release_capacity_maps).
+    """
+    shared_maps = {}
+    memories = []
+    for run_config in run_configs:
+        key = capacity_key(run_config)
+        if key not in shared_maps:
+            capacities = capacity_map(run_config)
+            if shared_memory is not None:
+                memory = shared_memory.SharedMemory(create=True, size=max(capacities.nbytes, 1))
+                np.ndarray(capacities.shape, dtype=np.float64, buffer=memory.buf)[:] = capacities
+                memories.append(memory)
+                shared_maps[key] = ("shared", memory.name, capacities.shape)
+            else:
+                shared_maps[key] = ("list", capacities)
+    return (shared_maps, memories)
+
+def release_capacity_maps(memories):
+    """
+        Release the shared memories of the capacity maps, once all
+        workers are done.
+    """
+    for memory in memories:
+        memory.close()
+        memory.unlink()
+
+# --- Runs ---
+
+def summary(mas):
+    """
+        Return the results of an experiment, as a dictionary with
+        the RESULT_FIELDS (but "seconds").
+    """
+    pop = m.get_pop(mas)
+    env = m.get_env(mas)
+    (males, females) = p.get_agents_alive_by_sex(pop)
+    agents = p.get_agents(pop)
+    agent_sugar = sum(a.get_sugar_level(agent) for agent in agents)
+    return {
+        "cycles": m.get_cycle(mas),
+        "population": p.size(pop),
+        "males": males,
+        "females": females,
+        "dead_agents": p.get_dead_agents(pop),
+        "mean_agent_sugar": agent_sugar/len(agents) if len(agents) > 0 else 0,
+        "total_cell_sugar": e.total_sugar_level(env),
+    }
+
+def run(task):
+    """
+        Run the experiment of a task (run number, seed, swept
+        values, configuration) and return its summary row.
+    """
+    (run_number, seed, values, run_config) = task
+    run_config = dict(run_config)
+    run_config["SEED"] = str(seed)
+    # The runs would all write the same checkpoint file.
+    run_config.pop("CHECKPOINT_FILE", None)
+    capacities = worker_capacity_map(run_config)
+    start = time.time()
+    mas = m.new_instance_from_config(run_config, capacities)
+    e.set_cell_sugar_level_to_capacity(m.get_env(mas))
+    m.run_experiment(mas)
+    row = {"run": run_number, "seed": seed}
+    row.update(values)
+    row.update(summary(mas))
+    row["seconds"] = round(time.time() - start, 3)
+    return row
+
+def run_sweep(config, sweep, output, workers=None):
+    """
+        Run all the experiments of the sweep on the base
+        configuration, with the given number of worker processes
+        (all cores by default), and write their summary rows in
+        the CSV file output (in the order of the runs).
+        Return the number of runs.
+    """
+    runs = expand(config, sweep)
+    for (values, run_config) in runs:
+        check(run_config)
+    seed = u.cfg_seed(config)
+    if seed is None:
+        seed = r.get_seed(r.new_instance())
+    tasks = [(i, r.derive_seed(seed, i), values, run_config)
+             for (i, (values, run_config)) in enumerate(runs)]
+    (shared_maps, memories) = share_capacity_maps([run_config for (values, run_config) in runs])
+    fields = SUMMARY_FIELDS + [key for (key, values) in sweep] + RESULT_FIELDS
+    try:
+        with open(output, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            if workers == 1:
+                init_worker(shared_maps)
+                for row in map(run, tasks):
+                    writer.writerow(row)
+            else:
+                with multiprocessing.Pool(workers, init_worker, (shared_maps,)) as pool:
+                    for row in pool.imap(run, tasks):
+                        writer.writerow(row)
+    finally:
+        release_capacity_maps(memories)
+    return len(tasks)
+
+# --- Command line ---
+
+def main(argv=None):
+    """
+        Command line entry point (see the top of this module).
+    """
+    parser = argparse.ArgumentParser(description="Run a parameter sweep of MAS experiments.")
+    parser.add_argument("sweep", help="sweep file")
+    parser.add_argument("-c", "--config", default="config.cfg", help="base configuration (default: config.cfg)")
+    parser.add_argument("-o", "--output", default="sweep.csv", help="summary CSV file (default: sweep.csv)")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="worker processes (default: all cores)")
+    args = parser.parse_args(argv)
+    config = u.config_read_file(args.config)
+    sweep = read_sweep_file(args.sweep)
+    n = run_sweep(config, sweep, args.output, args.workers)
+    print(n, "runs written to", args.output)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
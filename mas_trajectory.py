@@ -0,0 +1,309 @@
+#==================================================
+# INFO-H-100 - Introduction à l'informatique
+#
+# Prof. Thierry Massart
+# Année académique 2014-2015
+#
+# Projet: Système Multi-Agent (SMA)
+#
+#==================================================
+
+
+
+import struct
+
+import mas as m
+import mas_agent as a
+import mas_environment as e
+import mas_population as p
+
+# Trajectories are NumPy records (NumPy is optional).
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+
+#==================================================
+#  TRAJECTORIES
+#==================================================
+#
+# A trajectory writer is attached to a MAS (see
+# mas.add_cycle_observer) and appends, after each
+# cycle, what changed since the previous cycle to a
+# file of fixed-size RECORDs:
+#
+#   writer = tr.new_instance(mas, "run.traj")
+#   m.run_experiment(mas)
+#   tr.close(writer)
+#
+# Each agent gets a number (uid) when it is first seen.
+# The records of a cycle are the deaths, the births,
+# the agents that moved, the agents whose sugar level
+# changed and the cells whose sugar level changed.
+# Every "keyframe_every" cycles (and when the writer is
+# attached), the complete state is written instead.
+#
+# A second file ("<file>.idx") gives, for each cycle,
+# its range of records and its last keyframe, so that a
+# reader (see open_reader) can rebuild any cycle from
+# its keyframe by reading only a few cycles of the
+# memory-mapped file.
+#
+# The "cycle" of a state is the number of cycles run.
+#
+#==================================================
+
+# --- Constants ---
+
+WRITER_MAX_IDX = 10
+WRITER_MAS_IDX = 0          # MAS the writer is attached to
+WRITER_FILE_IDX = 1         # Record file
+WRITER_INDEX_FILE_IDX = 2   # Index file
+WRITER_KEYFRAME_EVERY_IDX = 3
+WRITER_AGENTS_IDX = 4       # id(agent) -> [uid, agent, x, y, sugar level]
+WRITER_LEVELS_IDX = 5       # Cell sugar levels at the last cycle
+WRITER_NEXT_UID_IDX = 6     # Number of the next new agent
+WRITER_RECORDS_IDX = 7      # Number of records written
+WRITER_ROWS_IDX = 8         # Number of index rows written
+WRITER_KEYFRAME_ROW_IDX = 9 # Index row of the last keyframe
+WRITER_OBSERVER_IDX = 10    # Cycle observer added to the MAS
+
+READER_MAX_IDX = 3
+READER_SIZE_IDX = 0         # Size of the environment
+READER_RECORDS_IDX = 1      # Memory-mapped records
+READER_INDEX_IDX = 2        # Memory-mapped index
+READER_KEYFRAME_EVERY_IDX = 3
+
+# Kinds of records
+DEATH = 1                   # id: uid
+BIRTH = 2                   # id: uid, x, y, value: sugar level, sex
+MOVE = 3                    # id: uid, x, y
+SUGAR = 4                   # id: uid, value: sugar level
+CELL = 5                    # id: y*size+x, value: sugar level
+AGENT = 6                   # Agent of a keyframe, as BIRTH
+
+MAGIC = b"MASTRAJ1"
+HEADER_FORMAT = "<8sII"     # MAGIC, size of the environment, keyframe_every
+HEADER_SIZE = 64
+DEFAULT_KEYFRAME_EVERY = 100
+
+if np is not None:
+    RECORD = np.dtype([("kind", "u1"), ("sex", "u1"), ("pad", "u2"), ("id", "u4"),
+                       ("x", "i4"), ("y", "i4"), ("value", "f8")])
+    INDEX = np.dtype([("cycle", "i8"), ("start", "i8"), ("end", "i8"), ("keyframe", "i8")])
+
+# --- Private functions ---
+
+# Note: These functions should not be called outside this module.
+
+def __check_numpy():
+    # Raise an exception if NumPy is not installed.
+    if np is None:
+        raise Exception("Trajectories require NumPy to be installed.")
+
+def __levels(env):
+    # Return the sugar levels of all cells as a flat array.
+    return np.asarray(e.get_sugar_levels(env), dtype=np.float64).ravel()
+
+def __new_uid(writer):
+    # Return the number of a new agent.
+    uid = writer[WRITER_NEXT_UID_IDX]
+    writer[WRITER_NEXT_UID_IDX] = uid+1
+    return uid
+
+def __append(writer, records, cycle, keyframe):
+    # Append the records of a cycle and its index row.
+    records = np.array(records, dtype=RECORD)
+    writer[WRITER_FILE_IDX].write(records.tobytes())
+    if keyframe:
+        writer[WRITER_KEYFRAME_ROW_IDX] = writer[WRITER_ROWS_IDX]
+    start = writer[WRITER_RECORDS_IDX]
+    row = np.array([(cycle, start, start+len(records), writer[WRITER_KEYFRAME_ROW_IDX])], dtype=INDEX)
+    writer[WRITER_INDEX_FILE_IDX].write(row.tobytes())
+    writer[WRITER_RECORDS_IDX] = start+len(records)
+    writer[WRITER_ROWS_IDX] += 1
+
+def __keyframe(writer, cycle):
+    # Write the complete state of the MAS.
+    mas = writer[WRITER_MAS_IDX]
+    levels = __levels(m.get_env(mas))
+    agents = writer[WRITER_AGENTS_IDX]
+    records = []
+    seen = {}
+    for agent in p.get_agents(m.get_pop(mas)):
+        entry = agents.get(id(agent))
+        if entry is None:
+            entry = [__new_uid(writer), agent, 0, 0, 0.0]
+        (entry[2], entry[3]) = a.get_pos(agent)
+        entry[4] = a.get_sugar_level(agent)
+        seen[id(agent)] = entry
+        records.append((AGENT, a.get_sex(agent), 0, entry[0], entry[2], entry[3], entry[4]))
+    records.extend((CELL, 0, 0, i, 0, 0, level) for (i, level) in enumerate(levels.tolist()))
+    writer[WRITER_AGENTS_IDX] = seen
+    writer[WRITER_LEVELS_IDX] = levels
+    __append(writer, records, cycle, True)
+
+def __delta(writer, cycle):
+    # Write what changed since the last cycle.
+    mas = writer[WRITER_MAS_IDX]
+    agents = writer[WRITER_AGENTS_IDX]
+    deaths = []
+    births = []
+    changes = []
+    seen = {}
+    for agent in p.get_agents(m.get_pop(mas)):
+        (x, y) = a.get_pos(agent)
+        sugar_level = a.get_sugar_level(agent)
+        entry = agents.get(id(agent))
+        if entry is None:
+            entry = [__new_uid(writer), agent, x, y, sugar_level]
+            births.append((BIRTH, a.get_sex(agent), 0, entry[0], x, y, sugar_level))
+        else:
+            if x != entry[2] or y != entry[3]:
+                changes.append((MOVE, 0, 0, entry[0], x, y, 0.0))
+                (entry[2], entry[3]) = (x, y)
+            if sugar_level != entry[4]:
+                changes.append((SUGAR, 0, 0, entry[0], 0, 0, sugar_level))
+                entry[4] = sugar_level
+        seen[id(agent)] = entry
+    for (key, entry) in agents.items():
+        if key not in seen:
+            deaths.append((DEATH, 0, 0, entry[0], 0, 0, 0.0))
+    levels = __levels(m.get_env(mas))
+    changed = np.flatnonzero(levels != writer[WRITER_LEVELS_IDX])
+    cells = [(CELL, 0, 0, i, 0, 0, level) for (i, level) in zip(changed.tolist(), levels[changed].tolist())]
+    writer[WRITER_AGENTS_IDX] = seen
+    writer[WRITER_LEVELS_IDX] = levels
+    __append(writer, deaths + births + changes + cells, cycle, False)
+
+# --- Writer ---
+
+def new_instance(mas, file_name, keyframe_every=DEFAULT_KEYFRAME_EVERY):
+    """
+        Return a new trajectory writer attached to the MAS, that
+        writes in the file (and "<file_name>.idx"), starting with
+        the current state of the MAS.
+    """
+    __check_numpy()
+    if keyframe_every <= 0:
+        raise ValueError("The number of cycles between keyframes must be positive.")
+    writer = [None]*(WRITER_MAX_IDX+1)
+    writer[WRITER_MAS_IDX] = mas
+    writer[WRITER_FILE_IDX] = open(file_name, "wb")
+    writer[WRITER_INDEX_FILE_IDX] = open(file_name + ".idx", "wb")
+    writer[WRITER_KEYFRAME_EVERY_IDX] = keyframe_every
+    writer[WRITER_AGENTS_IDX] = {}
+    writer[WRITER_NEXT_UID_IDX] = 0
+    writer[WRITER_RECORDS_IDX] = 0
+    writer[WRITER_ROWS_IDX] = 0
+    writer[WRITER_KEYFRAME_ROW_IDX] = 0
+    header = struct.pack(HEADER_FORMAT, MAGIC, e.size(m.get_env(mas)), keyframe_every)
+    writer[WRITER_FILE_IDX].write(header.ljust(HEADER_SIZE, b"\0"))
+    __keyframe(writer, m.get_cycle(mas))
+    def observer(mas):
+        record(writer)
+    writer[WRITER_OBSERVER_IDX] = observer
+    m.add_cycle_observer(mas, observer)
+    return writer
+
+def record(writer):
+    """
+        Append the changes of the last cycle (this is done after
+        each cycle).
+    """
+    cycle = m.get_cycle(writer[WRITER_MAS_IDX])+1
+    if writer[WRITER_ROWS_IDX] % writer[WRITER_KEYFRAME_EVERY_IDX] == 0:
+        __keyframe(writer, cycle)
+    else:
+        __delta(writer, cycle)
+
+def close(writer):
+    """
+        Detach the writer from its MAS and close its files.
+    """
+    mas = writer[WRITER_MAS_IDX]
+    observer = writer[WRITER_OBSERVER_IDX]
+    if observer in m.get_cycle_observers(mas):
+        m.remove_cycle_observer(mas, observer)
+    writer[WRITER_FILE_IDX].close()
+    writer[WRITER_INDEX_FILE_IDX].close()
+
+# --- Reader ---
+
+def open_reader(file_name):
+    """
+        Return a reader of the trajectory file. The files are
+        memory-mapped: only the records of the cycles that are
+        rebuilt are read.
+    """
+    __check_numpy()
+    f = open(file_name, "rb")
+    header = f.read(HEADER_SIZE)
+    f.close()
+    (magic, size, keyframe_every) = struct.unpack_from(HEADER_FORMAT, header)
+    if magic != MAGIC:
+        raise Exception("Not a trajectory file: " + file_name)
+    reader = [None]*(READER_MAX_IDX+1)
+    reader[READER_SIZE_IDX] = size
+    reader[READER_KEYFRAME_EVERY_IDX] = keyframe_every
+    reader[READER_RECORDS_IDX] = np.memmap(file_name, dtype=RECORD, mode="r", offset=HEADER_SIZE)
+    reader[READER_INDEX_IDX] = np.memmap(file_name + ".idx", dtype=INDEX, mode="r")
+    return reader
+
+def reader_cycles(reader):
+    """
+        Return the list of the cycles of the trajectory.
+    """
+    return reader[READER_INDEX_IDX]["cycle"].tolist()
+
+def state_at(reader, cycle):
+    """
+        Return the state of the trajectory at the given cycle, as
+        (levels, agents): levels is the 2D array (indexed as
+        [y, x]) of the cell sugar levels, agents a dictionary of
+        arrays "uid", "x", "y", "sugar_level" and "sex" (one entry
+        per living agent, by uid).
+    """
+    index = reader[READER_INDEX_IDX]
+    rows = np.flatnonzero(index["cycle"] == cycle)
+    if len(rows) == 0:
+        raise ValueError("No cycle " + str(cycle) + " in the trajectory.")
+    row = int(rows[-1])
+    size = reader[READER_SIZE_IDX]
+    levels = np.zeros(size*size)
+    uid_count = 0
+    alive = np.zeros(0, dtype=bool)
+    columns = {name: np.zeros(0, dtype=dtype) for (name, dtype) in
+               (("x", np.int32), ("y", np.int32), ("sugar_level", np.float64), ("sex", np.int8))}
+    records = reader[READER_RECORDS_IDX]
+    for block_row in range(int(index["keyframe"][row]), row+1):
+        block = np.array(records[index["start"][block_row]:index["end"][block_row]])
+        kinds = block["kind"]
+        ids = block["id"].astype(np.intp)
+        # Grow the agent columns for the new uids.
+        if len(ids) > 0 and ids[kinds != CELL].max(initial=-1) >= uid_count:
+            uid_count = max(int(ids[kinds != CELL].max())+1, 2*uid_count)
+            alive = np.concatenate((alive, np.zeros(uid_count-len(alive), dtype=bool)))
+            for name in columns:
+                columns[name] = np.concatenate(
+                    (columns[name], np.zeros(uid_count-len(columns[name]), dtype=columns[name].dtype)))
+        new = (kinds == BIRTH) | (kinds == AGENT)
+        if block_row == index["keyframe"][row]:
+            alive[:] = False
+        alive[ids[new]] = True
+        columns["sex"][ids[new]] = block["sex"][new]
+        moved = new | (kinds == MOVE)
+        columns["x"][ids[moved]] = block["x"][moved]
+        columns["y"][ids[moved]] = block["y"][moved]
+        changed = new | (kinds == SUGAR)
+        columns["sugar_level"][ids[changed]] = block["value"][changed]
+        alive[ids[kinds == DEATH]] = False
+        cells = kinds == CELL
+        levels[ids[cells]] = block["value"][cells]
+    uids = np.flatnonzero(alive)
+    agents = {"uid": uids}
+    for (name, column) in columns.items():
+        agents[name] = column[uids]
+    return (levels.reshape(size, size), agents)
@@ -10,6 +10,7 @@
 
 
 
+import ast
 import math
 
 import mas as m
@@ -34,6 +35,19 @@ def eucl_dist(pos1, pos2):
         sq_dist += delta*delta
     return math.sqrt(sq_dist)
 
+def toroidal_dist(pos1, pos2, size):
+    """
+        Compute the Euclidian distance between two positions of a
+        toroidal environment with the given number of rows/columns,
+        i.e. going through the borders when it is shorter.
+    """
+    sq_dist = 0.0
+    for i in range(len(pos1)):
+        delta = abs(pos1[i]-pos2[i]) % size
+        delta = min(delta, size-delta)
+        sq_dist += delta*delta
+    return math.sqrt(sq_dist)
+
 def vector_sum(vec1, vec2):
     """
         Compute the sum of two vectors.
@@ -171,6 +185,66 @@ def cfg_env_size(config):
     """
     return int(config_get_property(config, "ENV_SIZE"))    
 
+def cfg_env_backend(config):
+    """
+        Return the storage backend of the environment cells from the
+        configuration ("list" if it is not given).
+    """
+    backend = config_get_property(config, "ENV_BACKEND")
+    if backend is None:
+        backend = "list"
+    return backend.strip().lower()
+
+def cfg_pop_backend(config):
+    """
+        Return the storage backend of the agents from the
+        configuration ("list" if it is not given).
+    """
+    backend = config_get_property(config, "POP_BACKEND")
+    if backend is None:
+        backend = "list"
+    return backend.strip().lower()
+
+def cfg_seed(config):
+    """
+        Return the seed of the random stream from the configuration
+        (None if it is not given).
+    """
+    seed = config_get_property(config, "SEED")
+    if seed is None:
+        return None
+    return int(seed)
+
+def cfg_agent_pipeline(config):
+    """
+        Return how the agent rules are applied from the configuration
+        ("phased" if it is not given).
+    """
+    mode = config_get_property(config, "AGENT_PIPELINE")
+    if mode is None:
+        mode = "phased"
+    return mode.strip().lower()
+
+def cfg_checkpoint_file(config):
+    """
+        Return the file the checkpoints of the experiment are
+        written to from the configuration (None if it is not given).
+    """
+    file_name = config_get_property(config, "CHECKPOINT_FILE")
+    if file_name is None:
+        return None
+    return file_name.strip()
+
+def cfg_checkpoint_every(config):
+    """
+        Return the number of cycles between two checkpoints from
+        the configuration (1000 if it is not given).
+    """
+    every = config_get_property(config, "CHECKPOINT_EVERY")
+    if every is None:
+        return 1000
+    return int(every)
+
 def cfg_max_cycle(config):
     """
         Return (from the configuration) the maximum number of cycles 
@@ -203,6 +277,16 @@ def cfg_capacity_distributions(config):
     res = into_list(res)
     return res	
 
+def cfg_capacity_cache(config):
+    """
+        Return the directory the capacity maps are cached in from
+        the configuration (None if it is not given).
+    """
+    cache_dir = config_get_property(config, "CAPACITY_CACHE")
+    if cache_dir is None:
+        return None
+    return cache_dir.strip()
+
 def cfg_order_activation(config):
     """
         Fonction qui extrait l'ordre d'activation voulu dans le fichier de configuration
@@ -215,16 +299,31 @@ def cfg_ending_condition(config):
     """
     return config_get_property(config,"ENDING_CONDITION")
 
+def cfg_property_value(property_str):
+    """
+        Return the (key, value) of an ENV or POP property of the
+        configuration (e.g. "MAX_POP : 100"). The value must be a
+        literal (number, tuple, string, ...).
+    """
+    parameter = property_str.split(":", 1)
+    if len(parameter) != 2:
+        raise ValueError("Invalid property (expected KEY : value): " + repr(property_str))
+    key = parameter[0].strip().upper()
+    try:
+        value = ast.literal_eval(parameter[1].strip())
+    except (ValueError, SyntaxError):
+        raise ValueError("Invalid value for the property " + key + ": " + repr(parameter[1].strip()))
+    return (key, value)
+
 def cfg_env_properties(config):
     """
         Fonction qui extrait les propriétés de l'environement du fichier de configuration
     """
-    env = config_get_property(config,"ENV")
+    env = into_list(config_get_property(config,"ENV"))
     env_properties = {}
-    parameter = env.split(":")
-    key   = parameter[0].strip().upper()
-    value = eval(parameter[1].strip())
-    env_properties[key] = value
+    for i in env:
+        key, value = cfg_property_value(i)
+        env_properties[key] = value
     return env_properties
 
 def cfg_pop_properties(config):
@@ -232,11 +331,9 @@ def cfg_pop_properties(config):
         Fonction qui extrait les propriétés de la population du fichier de configuration et 
         qui renvoie un dictionnaire contenant les propriétés et les valeurs de la population
     """
-    pop = config_get_property(config,"POP")
+    pop = into_list(config_get_property(config,"POP"))
     pop_properties = {}
     for i in pop:
-        parameter = i.split(":")
-        key   = parameter[0].strip().upper()
-        value = eval(parameter[1].strip())
+        key, value = cfg_property_value(i)
         pop_properties[key] = value
     return pop_properties
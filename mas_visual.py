@@ -15,14 +15,29 @@
 
 
 
+import multiprocessing
+import sys
+
 import mas as m
 import mas_environment as e
-import mas_cell as c
 import mas_population as p
 import mas_agent as a
+import mas_frame as fr
+import mas_raster as ras
 
 import tkinter as tk
 
+# NumPy is optional, but needed to run the simulation in a
+# separate process.
+try:
+    import numpy as np
+    from multiprocessing import shared_memory
+    import mas_store as s
+except ImportError:
+    np = None
+    shared_memory = None
+    s = None
+
 
 
 #==================================================
@@ -34,23 +49,61 @@ import tkinter as tk
 TIME_OF_FRAME = 10        # millisecondes
 MARGIN = 20               # margin around the environment
 TEXT_HEIGHT = 10          # height of text zone above the environment
+RASTER_MIN_SIZE = 100     # environments from this size are drawn as an image
+RASTER_POOLING = ras.MAX_POOLING  # how blocks of cells are shown as one pixel
+
+# Colour of a cell for each colour level (255 for an empty cell,
+# 0 for a cell at the maximum capacity).
+PALETTE = ['#ffff' + format(color_level, '02x') for color_level in range(256)]
+
+AGENT_COLORS = {1: 'red', 2: 'black'}   # Colour of an agent of each sex
+
+SCENE_MAX_IDX = 8
+SCENE_CANVAS_IDX = 0      # Canvas of the scene
+SCENE_SIZE_IDX = 1        # Size of the environment
+SCENE_CELL_SIZE_IDX = 2   # Size of a cell on the canvas
+SCENE_CELLS_IDX = 3       # Rectangle item of each cell, by y*size+x
+SCENE_OVALS_IDX = 4       # Cell (y*size+x) -> oval item of its agent
+SCENE_HIDDEN_OVALS_IDX = 5 # Hidden oval items, to be reused
+SCENE_TEXTS_IDX = 6       # Text items of the counters
+SCENE_FRAME_IDX = 7       # Last frame drawn (or None)
+SCENE_IMAGE_IDX = 8       # Image of the environment (None if drawn with items)
+
+# Snapshots: see run_experiment with separate_process=True.
+SNAPSHOT_MAX_IDX = 3
+SNAPSHOT_MEMORY_IDX = 0   # Shared memory of the snapshots
+SNAPSHOT_SIZE_IDX = 1     # Size of the environment
+SNAPSHOT_CONTROL_IDX = 2  # Control values (see CONTROL_*_IDX)
+SNAPSHOT_BUFFERS_IDX = 3  # The two buffers (see BUFFER_*_IDX)
+
+CONTROL_SIZE = 5
+CONTROL_LATEST_IDX = 0    # Buffer of the latest snapshot (-1 if none)
+CONTROL_STOP_IDX = 1      # 1 when the window asks the simulation to stop
+CONTROL_DONE_IDX = 2      # 1 when the simulation is over
+CONTROL_PUBLISHED_IDX = 3 # Number of snapshots published
+CONTROL_READ_IDX = 4      # Number of snapshots published when the window read the latest one
+
+BUFFER_MAX_IDX = 4
+BUFFER_HEADER_IDX = 0     # Sequence number and counters (see HEADER_*_IDX)
+BUFFER_COLORS_IDX = 1     # Colour level of each cell, by y*size+x
+BUFFER_X_IDX = 2          # x of each agent
+BUFFER_Y_IDX = 3          # y of each agent
+BUFFER_SEX_IDX = 4        # Sex of each agent
+
+HEADER_SIZE = 6
+HEADER_SEQUENCE_IDX = 0   # Odd while the buffer is being written
+HEADER_CYCLE_IDX = 1
+HEADER_MALES_IDX = 2
+HEADER_FEMALES_IDX = 3
+HEADER_DEAD_AGENTS_IDX = 4
+HEADER_AGENTS_IDX = 5     # Number of agents in the buffer
+
+READ_ATTEMPTS = 3         # Attempts to read a snapshot before skipping a frame
 
 # --- Private functions --- 
 
 # Note: These functions should not be called outside this module.
 
-def __compute_cell_color(cell):
-    # Compute the color of the cell, depending on its sugar level
-    sugar_level = c.get_sugar_level(cell)
-    env = c.get_env(cell)
-    max_capacity = e.get_max_capacity(env)
-    ratio = sugar_level / max_capacity
-    color_level = int(255 * (1 - ratio))
-    # convert the color level to hexadecimal representation
-    hex_color_level = hex(color_level)[2:].zfill(2)
-    color_code = '#' + 'ff' + 'ff' + hex_color_level
-    return color_code
-
 def __bbox_for_cell_ref(cell_ref, cell_size, scale=1):
     # Compute the size of a cell box
     x, y = cell_ref
@@ -68,71 +121,368 @@ def __swap_y (env_size, cell_ref):
     (x, y) = cell_ref
     return (x, env_size - y)
 
-def __draw_env(canvas, env, cell_size):
-    # Draw the environment on the canvas
-    env_size = e.size(env)
-    for cell_ref in e.get_cell_refs(env):
-        cell = e.get_cell(env, cell_ref)
-        cell_ref = __swap_y(env_size, cell_ref)
-        canvas.create_rectangle(__bbox_for_cell_ref(cell_ref, cell_size), fill=__compute_cell_color(cell), outline='#dddddd')
-
-def __draw_pop(canvas, pop, cell_size):
-    # Draw the population on the canvas
-    env = p.get_env(pop)
-    env_size = e.size(env)
-    for agent in p.get_agents(pop):
-        if a.get_is_living(agent):
-            if a.get_sex(agent) == 1:
-                color = 'red'
-            else:
-                color = 'black'
-            cell_ref = __swap_y(env_size, a.get_pos(agent))
-            canvas.create_oval(__bbox_for_cell_ref(cell_ref, cell_size, 0.6), fill=color, width=0)
-
-def __draw_mas(canvas, mas, cell_size):
-    # Draw the MAS on the canvas
-    env = m.get_env(mas)
+def __changed(old, new):
+    # Return the indexes of the values that changed.
+    if old is None:
+        return range(len(new))
+    if np is not None:
+        return np.flatnonzero(old != new).tolist()
+    return [i for i in range(len(new)) if old[i] != new[i]]
+
+def __new_scene(canvas, env_size, cell_size, raster):
+    # Create the items of the canvas: a rectangle per cell, or a
+    # single image with raster, and the counters. Agents are drawn
+    # as ovals, created as needed (or painted in the image).
+    scene = [None]*(SCENE_MAX_IDX+1)
+    scene[SCENE_CANVAS_IDX] = canvas
+    scene[SCENE_SIZE_IDX] = env_size
+    scene[SCENE_CELL_SIZE_IDX] = cell_size
+    if raster:
+        image = tk.PhotoImage()
+        canvas.create_image(MARGIN, MARGIN + TEXT_HEIGHT, anchor=tk.NW, image=image)
+        scene[SCENE_IMAGE_IDX] = image
+    else:
+        cells = []
+        for y in range(env_size):
+            for x in range(env_size):
+                cell_ref = __swap_y(env_size, (x, y))
+                cells.append(canvas.create_rectangle(__bbox_for_cell_ref(cell_ref, cell_size), outline='#dddddd'))
+        scene[SCENE_CELLS_IDX] = cells
+        scene[SCENE_OVALS_IDX] = {}
+        scene[SCENE_HIDDEN_OVALS_IDX] = []
+    scene[SCENE_TEXTS_IDX] = {
+        "cycle": canvas.create_text(MARGIN, MARGIN, anchor=tk.NW),
+        "population": canvas.create_text(MARGIN, MARGIN-15, anchor=tk.NW),
+        "females": canvas.create_text(MARGIN+100, MARGIN, anchor=tk.NW),
+        "males": canvas.create_text(MARGIN+100, MARGIN-15, anchor=tk.NW),
+        "dead_agents": canvas.create_text(MARGIN+200, MARGIN, anchor=tk.NW),
+    }
+    canvas.create_oval(MARGIN+180,MARGIN-4,MARGIN+188,MARGIN-12,fill='black')
+    canvas.create_oval(MARGIN+180,MARGIN+3,MARGIN+188,MARGIN+11,fill='red')
+    return scene
+
+def __draw_image(scene, frame):
+    # Replace the image of the environment by the image of the
+    # frame, scaled to the size of the environment on the canvas.
+    env_size = scene[SCENE_SIZE_IDX]
+    pixels = int(scene[SCENE_CELL_SIZE_IDX] * env_size)
+    image = ras.render(fr.get_color_levels(frame), fr.get_agents(frame), env_size, pixels, RASTER_POOLING)
+    scene[SCENE_IMAGE_IDX].configure(data=ras.to_ppm(image), format='PPM')
+
+def __draw_items(scene, frame):
+    # Update the items of the canvas that changed since the last
+    # frame: the colour of the cells whose sugar level changed,
+    # and the ovals of the cells whose agent changed.
+    canvas = scene[SCENE_CANVAS_IDX]
+    env_size = scene[SCENE_SIZE_IDX]
+    cell_size = scene[SCENE_CELL_SIZE_IDX]
+    last_frame = scene[SCENE_FRAME_IDX]
+    # Cells
+    cells = scene[SCENE_CELLS_IDX]
+    color_levels = fr.get_color_levels(frame)
+    for i in __changed(fr.get_color_levels(last_frame) if last_frame is not None else None, color_levels):
+        canvas.itemconfig(cells[i], fill=PALETTE[color_levels[i]])
+    # Agents: the ovals of the cells left by an agent are reused
+    # for the cells where an agent arrived.
+    ovals = scene[SCENE_OVALS_IDX]
+    hidden_ovals = scene[SCENE_HIDDEN_OVALS_IDX]
+    agents = fr.get_agents(frame)
+    left_ovals = []
+    arrived = []
+    for i in __changed(fr.get_agents(last_frame) if last_frame is not None else None, agents):
+        oval = ovals.pop(i, None)
+        if oval is not None:
+            left_ovals.append(oval)
+        if agents[i] != 0:
+            arrived.append(i)
+    for i in arrived:
+        cell_ref = __swap_y(env_size, (i % env_size, i // env_size))
+        bbox = __bbox_for_cell_ref(cell_ref, cell_size, 0.6)
+        color = AGENT_COLORS[int(agents[i])]
+        if len(left_ovals) > 0:
+            oval = left_ovals.pop()
+            canvas.coords(oval, *bbox)
+            canvas.itemconfig(oval, fill=color)
+        elif len(hidden_ovals) > 0:
+            oval = hidden_ovals.pop()
+            canvas.coords(oval, *bbox)
+            canvas.itemconfig(oval, fill=color, state=tk.NORMAL)
+        else:
+            oval = canvas.create_oval(bbox, fill=color, width=0)
+        ovals[i] = oval
+    for oval in left_ovals:
+        canvas.itemconfig(oval, state=tk.HIDDEN)
+        hidden_ovals.append(oval)
+
+def __draw_frame(scene, frame):
+    # Draw the frame on the scene: the environment, then the
+    # counters.
+    if scene[SCENE_IMAGE_IDX] is not None:
+        __draw_image(scene, frame)
+    else:
+        __draw_items(scene, frame)
+    canvas = scene[SCENE_CANVAS_IDX]
+    texts = scene[SCENE_TEXTS_IDX]
+    male = fr.get_males(frame)
+    female = fr.get_females(frame)
+    canvas.itemconfig(texts["cycle"], text="Cycle #" + str(fr.get_cycle(frame)))
+    canvas.itemconfig(texts["population"], text="Population #" + str(male+female))
+    canvas.itemconfig(texts["females"], text="Femme #" + str(female))
+    canvas.itemconfig(texts["males"], text="Homme #" + str(male))
+    canvas.itemconfig(texts["dead_agents"], text="Dead agents #" + str(fr.get_dead_agents(frame)))
+    scene[SCENE_FRAME_IDX] = frame
+
+def __buffer_size(env_size):
+    # Return the number of bytes of a snapshot buffer (rounded up
+    # so that every array of the next buffer is aligned).
+    cells = env_size*env_size
+    size = 8*HEADER_SIZE + cells + 4*cells + 4*cells + cells
+    return (size + 7) // 8 * 8
+
+def __snapshot_views(memory, env_size):
+    # Return a snapshot whose control values and buffers are NumPy
+    # arrays on the shared memory. Every cell holds at most one
+    # agent, so that a buffer has room for env_size**2 agents.
+    cells = env_size*env_size
+    snapshot = [None]*(SNAPSHOT_MAX_IDX+1)
+    snapshot[SNAPSHOT_MEMORY_IDX] = memory
+    snapshot[SNAPSHOT_SIZE_IDX] = env_size
+    snapshot[SNAPSHOT_CONTROL_IDX] = np.ndarray(CONTROL_SIZE, dtype=np.int64, buffer=memory.buf)
+    buffers = []
+    offset = 8*CONTROL_SIZE
+    for b in range(2):
+        buffer = [None]*(BUFFER_MAX_IDX+1)
+        for (idx, length, dtype) in ((BUFFER_HEADER_IDX, HEADER_SIZE, np.int64),
+                                     (BUFFER_X_IDX, cells, np.int32),
+                                     (BUFFER_Y_IDX, cells, np.int32),
+                                     (BUFFER_COLORS_IDX, cells, np.uint8),
+                                     (BUFFER_SEX_IDX, cells, np.int8)):
+            buffer[idx] = np.ndarray(length, dtype=dtype, buffer=memory.buf, offset=offset)
+            offset += length*np.dtype(dtype).itemsize
+        buffers.append(buffer)
+        offset = 8*CONTROL_SIZE + (b+1)*__buffer_size(env_size)
+    snapshot[SNAPSHOT_BUFFERS_IDX] = buffers
+    return snapshot
+
+def __new_snapshot(env_size):
+    # Return a new snapshot in a new shared memory, without any
+    # snapshot published yet.
+    memory = shared_memory.SharedMemory(create=True, size=8*CONTROL_SIZE + 2*__buffer_size(env_size))
+    snapshot = __snapshot_views(memory, env_size)
+    snapshot[SNAPSHOT_CONTROL_IDX][:] = 0
+    snapshot[SNAPSHOT_CONTROL_IDX][CONTROL_LATEST_IDX] = -1
+    for buffer in snapshot[SNAPSHOT_BUFFERS_IDX]:
+        buffer[BUFFER_HEADER_IDX][:] = 0
+    return snapshot
+
+def __attach_snapshot(name, env_size):
+    # Return the snapshot of the shared memory with the given name
+    # (in the simulation process).
+    if sys.version_info >= (3, 13):
+        # Only the window process releases the memory.
+        memory = shared_memory.SharedMemory(name=name, track=False)
+    else:
+        memory = shared_memory.SharedMemory(name=name)
+    return __snapshot_views(memory, env_size)
+
+def __publish(snapshot, mas):
+    # Write the current state of the MAS in the buffer that is not
+    # the latest one, then make it the latest one. The sequence
+    # number of the buffer is odd while it is written, so that a
+    # reader can tell a torn copy (seqlock).
+    control = snapshot[SNAPSHOT_CONTROL_IDX]
+    b = 1 if control[CONTROL_LATEST_IDX] == 0 else 0
+    buffer = snapshot[SNAPSHOT_BUFFERS_IDX][b]
+    header = buffer[BUFFER_HEADER_IDX]
     pop = m.get_pop(mas)
-    if env is not None: 
-        __draw_env(canvas, env, cell_size)
-        # Only consider plotting the population if there is an environment
-        if pop is not None:
-            __draw_pop(canvas, pop, cell_size)
+    store = p.get_store(pop)
+    male,female = p.get_agents_alive_by_sex(pop)
+    header[HEADER_SEQUENCE_IDX] += 1
+    buffer[BUFFER_COLORS_IDX][:] = fr.color_levels(m.get_env(mas))
+    if store is not None:
+        # The columns of the alive agents, without visiting them.
+        slots = s.alive_slots(store)
+        n = len(slots)
+        buffer[BUFFER_X_IDX][:n] = s.get_column(store, s.X_IDX)[slots]
+        buffer[BUFFER_Y_IDX][:n] = s.get_column(store, s.Y_IDX)[slots]
+        buffer[BUFFER_SEX_IDX][:n] = s.get_column(store, s.SEX_IDX)[slots]
+    else:
+        agents = p.get_agents(pop)
+        n = len(agents)
+        if n > 0:
+            positions = np.array([a.get_pos(agent) for agent in agents], dtype=np.int32)
+            buffer[BUFFER_X_IDX][:n] = positions[:, 0]
+            buffer[BUFFER_Y_IDX][:n] = positions[:, 1]
+            buffer[BUFFER_SEX_IDX][:n] = [a.get_sex(agent) for agent in agents]
+    header[HEADER_CYCLE_IDX] = m.get_cycle(mas)
+    header[HEADER_MALES_IDX] = male
+    header[HEADER_FEMALES_IDX] = female
+    header[HEADER_DEAD_AGENTS_IDX] = p.get_dead_agents(pop)
+    header[HEADER_AGENTS_IDX] = n
+    header[HEADER_SEQUENCE_IDX] += 1
+    control[CONTROL_LATEST_IDX] = b
+    control[CONTROL_PUBLISHED_IDX] += 1
+
+def __is_read(snapshot):
+    # Return (boolean) whether or not the window has read the
+    # latest snapshot (or there is none yet).
+    control = snapshot[SNAPSHOT_CONTROL_IDX]
+    return control[CONTROL_READ_IDX] == control[CONTROL_PUBLISHED_IDX]
+
+def __read_frame(snapshot):
+    # Return a frame of the latest snapshot, or None if there is
+    # none yet or if it kept being rewritten while copied.
+    control = snapshot[SNAPSHOT_CONTROL_IDX]
+    env_size = snapshot[SNAPSHOT_SIZE_IDX]
+    for attempt in range(READ_ATTEMPTS):
+        published = int(control[CONTROL_PUBLISHED_IDX])
+        b = int(control[CONTROL_LATEST_IDX])
+        if b < 0:
+            return None
+        buffer = snapshot[SNAPSHOT_BUFFERS_IDX][b]
+        header = buffer[BUFFER_HEADER_IDX]
+        sequence = int(header[HEADER_SEQUENCE_IDX])
+        if sequence % 2 == 1:
+            continue
+        counters = header.copy()
+        n = int(counters[HEADER_AGENTS_IDX])
+        colors = buffer[BUFFER_COLORS_IDX].copy()
+        xs = buffer[BUFFER_X_IDX][:n].copy()
+        ys = buffer[BUFFER_Y_IDX][:n].copy()
+        sexes = buffer[BUFFER_SEX_IDX][:n].copy()
+        if int(header[HEADER_SEQUENCE_IDX]) != sequence:
+            continue
+        control[CONTROL_READ_IDX] = published
+        agents = np.zeros(env_size*env_size, dtype=np.int8)
+        agents[ys.astype(np.int64)*env_size + xs] = sexes
+        return fr.new_instance(int(counters[HEADER_CYCLE_IDX]), colors, agents,
+                               int(counters[HEADER_MALES_IDX]), int(counters[HEADER_FEMALES_IDX]),
+                               int(counters[HEADER_DEAD_AGENTS_IDX]))
+    return None
+
+def __run_simulation(mas, name, env_size):
+    # Body of the simulation process: run the experiment as fast
+    # as possible, until it is over or the window is closed. A
+    # snapshot is published after a cycle only once the window
+    # has read the previous one, and after the last cycle.
+    snapshot = __attach_snapshot(name, env_size)
+    control = snapshot[SNAPSHOT_CONTROL_IDX]
+    try:
+        ending_condition = m.get_ending_condition(mas)
+        __publish(snapshot, mas)
+        published = True
+        while control[CONTROL_STOP_IDX] == 0 and not ending_condition(mas):
+            m.run_one_cycle(mas)
+            m.increment_cycle(mas)
+            published = __is_read(snapshot)
+            if published:
+                __publish(snapshot, mas)
+        if not published:
+            __publish(snapshot, mas)
+    finally:
+        control[CONTROL_DONE_IDX] = 1
+
+def __new_window(window_size, env_size, raster):
+    # Return the window (tkinter) and the scene of an environment
+    # of the given size.
+    app = tk.Tk()
+    app.geometry(str(window_size-TEXT_HEIGHT) + 'x' + str(window_size))
+    canvas = tk.Canvas(app, width=window_size-TEXT_HEIGHT, height=window_size)
+    canvas.pack()
+    cell_size = (window_size - 2*MARGIN - TEXT_HEIGHT) / env_size
+    # The items of the canvas are created once, then only the
+    # items that changed are updated at each frame.
+    return (app, __new_scene(canvas, env_size, cell_size, raster))
 
 # --- Run an experiment in visual mode
-def run_experiment(mas, window_size=600):
+def run_experiment(mas, window_size=600, separate_process=False, raster=None):
     """
         Run an experiment on the initialised MAS with
         an animated graphical representation.
+
+        With raster, the environment is drawn as a single image
+        (see mas_raster), which is needed for large environments.
+        By default, it is used from RASTER_MIN_SIZE cells wide if
+        NumPy is installed.
+
+        With separate_process, the experiment runs in another
+        process as fast as possible, and the window shows its
+        latest state at each frame (skipping the cycles run in
+        between). The MAS of the calling process is left
+        unchanged. This requires NumPy and the "fork" start
+        method of multiprocessing (the MAS is copied, not
+        pickled), which is not available on Windows.
     """
-    # Initialise the graphical environment (tkinter)
-    app = tk.Tk()
-    app.geometry(str(window_size-TEXT_HEIGHT) + 'x' + str(window_size))
-    canvas = tk.Canvas(app, width=window_size-TEXT_HEIGHT, height=window_size)
-    canvas.pack()
-    cell_size = (window_size - 2*MARGIN - TEXT_HEIGHT) / e.size(m.get_env(mas))
-    # Define a local function that represents the "graphical loop"
-    def tki_experiment_loop(mas):
-        cycle = m.get_cycle(mas)
-        canvas.delete(tk.ALL) # Clear the canvas
-        __draw_mas(canvas, mas, cell_size)
-        pop = m.get_pop(mas)
-        canvas.create_text(MARGIN, MARGIN, anchor=tk.NW, text="Cycle #" + str(cycle))
-        male,female = p.get_agents_alive_by_sex(pop)
-        canvas.create_text(MARGIN, MARGIN-15, anchor=tk.NW, text="Population #" + str(male+female))
-        canvas.create_text(MARGIN+100, MARGIN, anchor=tk.NW, text="Femme #" + str(female))
-        canvas.create_oval(MARGIN+180,MARGIN-4,MARGIN+188,MARGIN-12,fill='black')
-        canvas.create_text(MARGIN+100, MARGIN-15, anchor=tk.NW, text="Homme #" + str(male))
-        canvas.create_oval(MARGIN+180,MARGIN+3,MARGIN+188,MARGIN+11,fill='red')
-        canvas.create_text(MARGIN+200, MARGIN,anchor=tk.NW, text="Dead agents #" + str(p.get_dead_agents(pop)))
-        if not eval("m."+ending_condition+"(mas)"):
-            m.increment_cycle(mas)
-            m.run_one_cycle(mas)
-            app.update()
-            app.after(TIME_OF_FRAME, tki_experiment_loop, mas)
+    if separate_process and np is None:
+        raise Exception("Running the simulation in a separate process requires NumPy to be installed.")
+    if separate_process and "fork" not in multiprocessing.get_all_start_methods():
+        raise Exception("Running the simulation in a separate process requires the fork start method, "
+                        "which is not available on this platform.")
+    env_size = e.size(m.get_env(mas))
+    if raster is None:
+        raster = np is not None and env_size >= RASTER_MIN_SIZE
     # Initialise the experiment (the MAS)
     m.set_cycle(mas, 0)
-    ending_condition = m.get_ending_condition(mas)
-    # Run the experiment
-    tki_experiment_loop(mas)
-    app.mainloop()
+    if not separate_process:
+        (app, scene) = __new_window(window_size, env_size, raster)
+        ending_condition = m.get_ending_condition(mas)
+        # Define a local function that represents the "graphical loop"
+        def tki_experiment_loop(mas):
+            __draw_frame(scene, fr.new_instance_from_mas(mas))
+            if not ending_condition(mas):
+                m.run_one_cycle(mas)
+                m.increment_cycle(mas)
+                app.update()
+                app.after(TIME_OF_FRAME, tki_experiment_loop, mas)
+        # Run the experiment
+        tki_experiment_loop(mas)
+        app.mainloop()
+        return
+    # The simulation process publishes a snapshot after each cycle
+    # in two shared buffers, that the window reads at its own pace.
+    # It is forked with a copy of the MAS (which holds functions
+    # that cannot be pickled), before the window opens its
+    # connection to the display.
+    snapshot = __new_snapshot(env_size)
+    control = snapshot[SNAPSHOT_CONTROL_IDX]
+    process = multiprocessing.get_context("fork").Process(
+        target=__run_simulation, args=(mas, snapshot[SNAPSHOT_MEMORY_IDX].name, env_size),
+        name="mas_simulation", daemon=True)
+    process.start()
+    try:
+        (app, scene) = __new_window(window_size, env_size, raster)
+        failed = []
+        def tki_snapshot_loop():
+            # Once the simulation is over, the latest snapshot is the
+            # last one: it is drawn, then the loop stops. If there is
+            # none, the simulation failed: the window is closed.
+            done = control[CONTROL_DONE_IDX] == 1
+            frame = __read_frame(snapshot)
+            if frame is not None and (scene[SCENE_FRAME_IDX] is None
+                                      or fr.get_cycle(frame) != fr.get_cycle(scene[SCENE_FRAME_IDX])):
+                __draw_frame(scene, frame)
+            if not done:
+                app.after(TIME_OF_FRAME, tki_snapshot_loop)
+            elif frame is None and scene[SCENE_FRAME_IDX] is None:
+                failed.append(True)
+                app.destroy()
+        def close_window():
+            control[CONTROL_STOP_IDX] = 1
+            app.destroy()
+        app.protocol("WM_DELETE_WINDOW", close_window)
+        tki_snapshot_loop()
+        app.mainloop()
+        if failed:
+            process.join()
+            raise Exception("The simulation process stopped before its first snapshot (exit code "
+                            + str(process.exitcode) + ").")
+    finally:
+        control[CONTROL_STOP_IDX] = 1
+        process.join()
+        del control
+        # The arrays on the shared memory must be released before it.
+        snapshot[SNAPSHOT_CONTROL_IDX] = None
+        snapshot[SNAPSHOT_BUFFERS_IDX] = None
+        memory = snapshot[SNAPSHOT_MEMORY_IDX]
+        memory.close()
+        memory.unlink()
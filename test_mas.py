@@ -0,0 +1,574 @@
+#==================================================
+# INFO-H-100 - Introduction à l'informatique
+#
+# Prof. Thierry Massart
+# Année académique 2014-2015
+#
+# Projet: Système Multi-Agent (SMA)
+#
+#==================================================
+
+
+
+import csv
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+import zlib
+
+import mas as m
+import mas_agent as a
+import mas_capacity as cap
+import mas_environment as e
+import mas_export as ex
+import mas_index as ix
+import mas_population as p
+import mas_random as r
+import mas_raster as ras
+import mas_recorder as rec
+import mas_registry as reg
+import mas_scheduler as sch
+import mas_stats as st
+import mas_sweep as sw
+import mas_trajectory as tr
+import mas_utils as u
+
+# Some of the tested modules need NumPy (NumPy is optional):
+# their tests are skipped without it.
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+
+#==================================================
+#  TESTS
+#==================================================
+#
+# Small seeded experiments that must end in the same
+# state whichever way they are run (e.g. resumed from a
+# checkpoint or not), and focused tests of the modules.
+#
+# Run with "python3 -m unittest test_mas" (or pytest).
+#
+#==================================================
+
+# --- Constants ---
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.cfg")
+SEED = "7"
+MAX_CYCLE = 30
+# Population backends (the "numpy" one needs NumPy)
+BACKENDS = ("list", "numpy") if np is not None else ("list",)
+
+# --- Helpers ---
+
+def new_mas(**properties):
+    # Return a new MAS from config.cfg, with the given properties
+    # (and a small seeded experiment, in which agents are born and
+    # die), its cells full of sugar.
+    config = u.config_read_file(CONFIG_FILE)
+    config.update({"SEED": SEED, "MAX_CYCLE": str(MAX_CYCLE),
+                   "ENV_SIZE": "40", "POP_SIZE": "200"})
+    sw.set_config_value(config, "POP.MAX_POP", "400")
+    config.update(properties)
+    mas = m.new_instance_from_config(config)
+    e.set_cell_sugar_level_to_capacity(m.get_env(mas))
+    return mas
+
+def state(mas):
+    # Return the state of the MAS: its cycle, counters, agents
+    # (sorted by position) and cell sugar levels.
+    pop = m.get_pop(mas)
+    agents = sorted((a.get_pos(agent), a.get_sugar_level(agent), a.get_age(agent),
+                     a.get_sex(agent), a.get_metabolism(agent))
+                    for agent in p.get_agents(pop))
+    levels = [float(level) for row in e.get_sugar_levels(m.get_env(mas)) for level in row]
+    return (m.get_cycle(mas), p.get_dead_agents(pop), p.get_births(pop), agents, levels)
+
+def indexed_and_scanning_states(rule, **properties):
+    # Return the final states of the same experiment (with the
+    # given properties) with the indexed agent rule (of the given
+    # name), with and without its indexes (see "mas_index").
+    properties["ADD_AGENT_RULE"] = [rule, "eat_half", "grow_up", "make_a_child"]
+    indexed = new_mas(**properties)
+    m.run_experiment(indexed)
+    fn = getattr(a, rule)
+    index_names = ix.get_rule_indexes(fn)
+    ix.register_indexed_rule(fn, ())
+    try:
+        scanning = new_mas(**properties)
+        m.run_experiment(scanning)
+    finally:
+        ix.register_indexed_rule(fn, index_names)
+    return (state(indexed), state(scanning))
+
+# --- Tests ---
+
+@unittest.skipIf(np is None, "NumPy is not installed")
+class EnvironmentBackendTest(unittest.TestCase):
+    """
+        The list and NumPy environment backends run the same
+        experiment (see "mas_grid").
+    """
+
+    def test_backends(self):
+        for pipeline in ("phased", "fused"):
+            with self.subTest(pipeline=pipeline):
+                states = []
+                for backend in ("list", "numpy"):
+                    mas = new_mas(ENV_BACKEND=backend, AGENT_PIPELINE=pipeline)
+                    m.run_experiment(mas)
+                    states.append(state(mas))
+                self.assertEqual(states[0], states[1])
+
+@unittest.skipIf(np is None, "NumPy is not installed")
+class PopulationStoreTest(unittest.TestCase):
+    """
+        The list and NumPy population backends run the same
+        experiment (see "mas_store").
+    """
+
+    def test_backends(self):
+        for pipeline in ("phased", "fused"):
+            with self.subTest(pipeline=pipeline):
+                states = []
+                for backend in ("list", "numpy"):
+                    mas = new_mas(POP_BACKEND=backend, AGENT_PIPELINE=pipeline)
+                    m.run_experiment(mas)
+                    states.append(state(mas))
+                self.assertEqual(states[0], states[1])
+
+class ReachabilityIndexTest(unittest.TestCase):
+    """
+        move_by_only_a_cell gives the same results with and
+        without its indexes.
+    """
+
+    def test_indexed_rule(self):
+        # Without its indexes, the rule is slow: fewer cycles.
+        (indexed, scanning) = indexed_and_scanning_states("move_by_only_a_cell", MAX_CYCLE="8")
+        self.assertEqual(indexed, scanning)
+
+class WealthIndexTest(unittest.TestCase):
+    """
+        move_by_averrage_living gives the same results with and
+        without the wealth index.
+    """
+
+    def test_indexed_rule(self):
+        (indexed, scanning) = indexed_and_scanning_states("move_by_averrage_living")
+        self.assertEqual(indexed, scanning)
+
+class SchedulerTest(unittest.TestCase):
+    """
+        sort_order is the order of the original insertion sort, and
+        maintained_order keeps the agents sorted (see
+        "mas_scheduler").
+    """
+
+    def new_pop(self, mas):
+        # Return the population of the MAS, after giving its agents
+        # few distinct sugar levels (so that many are equal).
+        pop = m.get_pop(mas)
+        rng = m.get_rng(mas)
+        for agent in p.get_agents(pop):
+            a.set_sugar_level(agent, float(r.randint(rng, 0, 9)))
+        return pop
+
+    def test_sort_order(self):
+        for backend in BACKENDS:
+            with self.subTest(backend=backend):
+                pop = self.new_pop(new_mas(POP_BACKEND=backend))
+                # Original order: insertion sort in descending order
+                # of the sugar levels, then reversed.
+                agents = [a.get_pos(agent) for agent in p.get_agents(pop)]
+                levels = [a.get_sugar_level(agent) for agent in p.get_agents(pop)]
+                u.sort_on_second_list(agents, levels, u.order_scalar_asc)
+                sch.sort_order(pop)
+                self.assertEqual([a.get_pos(agent) for agent in p.get_agents(pop)], agents[::-1])
+
+    def test_maintained_order(self):
+        for backend in BACKENDS:
+            with self.subTest(backend=backend):
+                mas = new_mas(POP_BACKEND=backend)
+                pop = self.new_pop(mas)
+                positions = sorted(a.get_pos(agent) for agent in p.get_agents(pop))
+                for cycle in range(3):
+                    sch.maintained_order(pop)
+                    agents = p.get_agents(pop)
+                    levels = [a.get_sugar_level(agent) for agent in agents]
+                    self.assertEqual(levels, sorted(levels))
+                    self.assertEqual(sorted(a.get_pos(agent) for agent in agents), positions)
+                    for agent in agents[::3]:
+                        a.set_sugar_level(agent, float(r.randint(m.get_rng(mas), 0, 9)))
+
+class RegistryTest(unittest.TestCase):
+    """
+        The names of the configuration are resolved once, and
+        unknown names are reported (see "mas_registry").
+    """
+
+    def test_resolve(self):
+        for kind in (reg.CELL_RULE, reg.AGENT_RULE, reg.ORDER_ACTIVATION,
+                     reg.ENDING_CONDITION, reg.CAPACITY_DISTRIBUTION):
+            with self.subTest(kind=kind):
+                for name in reg.names(kind):
+                    fn = reg.resolve(kind, " " + name + " ")
+                    self.assertEqual(reg.name_of(kind, fn), name)
+                self.assertRaises(ValueError, reg.resolve, kind, "unknown_name")
+        self.assertRaises(ValueError, reg.name_of, reg.AGENT_RULE, new_mas)
+
+    def test_unknown_names(self):
+        for (key, value) in (("ADD_CELL_RULE", "regen_all"),
+                             ("ADD_AGENT_RULE", ["eat_everything"]),
+                             ("ORDER_ACTIVATION", "active_agents_by_age"),
+                             ("ENDING_CONDITION", "never"),
+                             ("ADD_CAPACITY_DISTRIB", ["add_capacity_square(env, 0.5)"]),
+                             ("ADD_CAPACITY_DISTRIB", ["add_capacity_gaussian(0.5, (1, 1), 2)"]),
+                             ("ADD_CAPACITY_DISTRIB", ["add_capacity_gaussian(env, x, (1, 1), 2)"])):
+            with self.subTest(key=key, value=value):
+                self.assertRaises(ValueError, new_mas, **{key: value})
+
+class SweepTest(unittest.TestCase):
+    """
+        Sweep files are expanded into the configurations of the
+        runs (see "mas_sweep").
+    """
+
+    def test_parse_values(self):
+        self.assertEqual(sw.parse_values(" 50 | 100 "), ["50", "100"])
+        self.assertEqual(sw.parse_values("range(1, 4)"), ["1", "2", "3"])
+        self.assertEqual(sw.parse_values("range(0.5, 2.0, 0.5)"), ["0.5", "1.0", "1.5"])
+        self.assertEqual(sw.parse_values("range(0, 0.3, 0.1)"), ["0.0", "0.1", "0.2"])
+        for values_str in ("range(1)", "range(1, 2, 0)", "range(a, b)"):
+            with self.subTest(values_str=values_str):
+                self.assertRaises(ValueError, sw.parse_values, values_str)
+
+    def test_expand(self):
+        config = u.config_read_file(CONFIG_FILE)
+        sweep = [("POP_SIZE", ["50", "100"]),
+                 ("POP.MAX_METABOLISM", ["0.5", "1.5"]),
+                 ("ADD_AGENT_RULE", ["eat_half, grow_up"])]
+        runs = sw.expand(config, sweep)
+        self.assertEqual([values for (values, run_config) in runs],
+                         [{"POP_SIZE": size, "POP.MAX_METABOLISM": metabolism,
+                           "ADD_AGENT_RULE": "eat_half, grow_up"}
+                          for size in ("50", "100") for metabolism in ("0.5", "1.5")])
+        for (values, run_config) in runs:
+            self.assertEqual(u.cfg_pop_size(run_config), int(values["POP_SIZE"]))
+            self.assertEqual(u.cfg_pop_properties(run_config)["MAX_METABOLISM"],
+                             float(values["POP.MAX_METABOLISM"]))
+            self.assertEqual(u.cfg_agent_rules(run_config), ["eat_half", "grow_up"])
+            sw.check(run_config)
+        self.assertEqual(u.cfg_pop_size(config), u.cfg_pop_size(u.config_read_file(CONFIG_FILE)))
+
+    def test_check(self):
+        config = u.config_read_file(CONFIG_FILE)
+        for (key, value) in (("ADD_AGENT_RULE", "eat_everything"),
+                             ("ORDER_ACTIVATION", "active_agents_by_age"),
+                             ("ENDING_CONDITION", "never")):
+            with self.subTest(key=key):
+                (values, run_config) = sw.expand(config, [(key, [value])])[0]
+                self.assertRaises(ValueError, sw.check, run_config)
+
+@unittest.skipIf(np is None, "NumPy is not installed")
+class StatsTest(unittest.TestCase):
+    """
+        The streaming statistics agree with NumPy (see
+        "mas_stats").
+    """
+
+    def setUp(self):
+        self.values = np.random.default_rng(13).standard_normal(2000)
+
+    def test_moments(self):
+        moments = st.new_moments()
+        for value in self.values.tolist():
+            st.add_to_moments(moments, value)
+        self.assertEqual(st.count(moments), len(self.values))
+        self.assertAlmostEqual(st.mean(moments), self.values.mean())
+        self.assertAlmostEqual(st.variance(moments), self.values.var(ddof=1))
+
+    def test_merge_moments(self):
+        merged = st.new_moments()
+        for part in np.array_split(self.values, 7):
+            moments = st.new_moments()
+            for value in part.tolist():
+                st.add_to_moments(moments, value)
+            st.merge_moments(merged, moments)
+        self.assertEqual(st.count(merged), len(self.values))
+        self.assertAlmostEqual(st.mean(merged), self.values.mean())
+        self.assertAlmostEqual(st.variance(merged), self.values.var(ddof=1))
+
+    def test_quantiles(self):
+        for q in (0, 0.05, 0.5, 0.95, 1):
+            for n in (1, 6, st.EXACT_QUANTILE_VALUES, len(self.values)):
+                with self.subTest(q=q, n=n):
+                    values = self.values[:n]
+                    quantile = st.new_quantile(q)
+                    for value in values.tolist():
+                        st.add_to_quantile(quantile, value)
+                    estimate = st.quantile_value(quantile)
+                    self.assertIsInstance(estimate, float)
+                    if n <= st.EXACT_QUANTILE_VALUES or q in (0, 1):
+                        self.assertAlmostEqual(estimate, np.quantile(values, q))
+                    else:
+                        self.assertAlmostEqual(estimate, np.quantile(values, q), delta=0.1)
+        self.assertIsNone(st.quantile_value(st.new_quantile(0.5)))
+
+    def test_gini(self):
+        values = np.abs(self.values)
+        n = len(values)
+        expected = np.abs(values[:, None] - values[None, :]).sum()/(2*n*n*values.mean())
+        self.assertAlmostEqual(st.gini(values), expected)
+        self.assertAlmostEqual(st.gini(values.tolist()), expected)
+        self.assertEqual(st.gini([]), 0.0)
+
+@unittest.skipIf(np is None, "NumPy is not installed")
+class CheckpointTest(unittest.TestCase):
+    """
+        An experiment resumed from a checkpoint ends in the same
+        state as the uninterrupted experiment (see
+        "mas_checkpoint").
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_checkpoint_resume(self):
+        file_name = os.path.join(self.directory, "checkpoint.npz")
+        for backend in ("list", "numpy"):
+            with self.subTest(backend=backend):
+                full = new_mas(ENV_BACKEND=backend, POP_BACKEND=backend)
+                m.run_experiment(full)
+                part = new_mas(ENV_BACKEND=backend, POP_BACKEND=backend,
+                               MAX_CYCLE="13", CHECKPOINT_FILE=file_name, CHECKPOINT_EVERY="13")
+                m.run_experiment(part)
+                resumed = m.load_checkpoint(file_name)
+                m.set_max_cycle(resumed, MAX_CYCLE)
+                m.set_checkpoint(resumed, None)
+                m.continue_experiment(resumed)
+                self.assertEqual(state(full), state(resumed))
+
+@unittest.skipIf(np is None, "NumPy is not installed")
+class RecorderTest(unittest.TestCase):
+    """
+        The rows of a recorder are the metrics of each cycle, in
+        memory and in its ".csv" and ".npy" files (see
+        "mas_recorder").
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_rows(self):
+        csv_file = os.path.join(self.directory, "metrics.csv")
+        npy_file = os.path.join(self.directory, "metrics.npy")
+        mas = new_mas()
+        # Small capacities, so that the rows are written in chunks.
+        recorders = [rec.new_instance(mas, capacity=MAX_CYCLE),
+                     rec.new_instance(mas, csv_file, capacity=4),
+                     rec.new_instance(mas, npy_file, capacity=5)]
+        expected = []
+        def observer(mas):
+            pop = m.get_pop(mas)
+            sugar_levels = [a.get_sugar_level(agent) for agent in p.get_agents(pop)]
+            expected.append((m.get_cycle(mas)+1, p.size(pop), p.get_births(pop), p.get_dead_agents(pop),
+                             sum(sugar_levels)/len(sugar_levels), e.total_sugar_level(m.get_env(mas))))
+        m.add_cycle_observer(mas, observer)
+        m.run_experiment(mas)
+        for recorder in recorders:
+            rec.close(recorder)
+        columns = rec.get_columns(recorders[0])
+        births = np.cumsum(columns["births"]).tolist()
+        deaths = np.cumsum(columns["deaths"]).tolist()
+        self.assertGreater(births[-1], 0)
+        self.assertGreater(deaths[-1], 0)
+        for (i, (cycle, size, total_births, total_deaths, mean_sugar, env_sugar)) in enumerate(expected):
+            self.assertEqual(columns["cycle"][i], cycle)
+            self.assertEqual(columns["males"][i] + columns["females"][i], size)
+            self.assertEqual(columns["occupied_cells"][i], size)
+            self.assertEqual(births[i], total_births)
+            self.assertEqual(deaths[i], total_deaths)
+            self.assertAlmostEqual(columns["mean_sugar"][i], mean_sugar)
+            self.assertAlmostEqual(columns["env_sugar"][i], env_sugar)
+        # The header of the ".npy" file is rewritten with the
+        # number of rows when it is closed.
+        records = np.load(npy_file)
+        self.assertEqual(records.shape, (MAX_CYCLE,))
+        with open(csv_file, newline="") as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(len(rows), MAX_CYCLE)
+        for (name, dtype) in rec.METRICS:
+            with self.subTest(name=name):
+                self.assertEqual(records[name].tolist(), columns[name].tolist())
+                self.assertEqual([float(row[name]) for row in rows], columns[name].tolist())
+
+@unittest.skipIf(np is None, "NumPy is not installed")
+class TrajectoryTest(unittest.TestCase):
+    """
+        The states rebuilt from a trajectory are the states of
+        the experiment (see "mas_trajectory").
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_state_at(self):
+        file_name = os.path.join(self.directory, "run.traj")
+        mas = new_mas()
+        m.set_cycle(mas, 0)
+        writer = tr.new_instance(mas, file_name, keyframe_every=7)
+        live = {0: state(mas)}
+        while not m.get_ending_condition(mas)(mas):
+            m.run_one_cycle(mas)
+            m.increment_cycle(mas)
+            live[m.get_cycle(mas)] = state(mas)
+        tr.close(writer)
+        reader = tr.open_reader(file_name)
+        self.assertEqual(tr.reader_cycles(reader), sorted(live))
+        for (cycle, (_, _, _, agents, levels)) in live.items():
+            (traj_levels, traj_agents) = tr.state_at(reader, cycle)
+            self.assertEqual(traj_levels.ravel().tolist(), levels)
+            self.assertEqual(sorted(((x, y), sugar_level, sex) for (x, y, sugar_level, sex) in
+                                    zip(traj_agents["x"].tolist(), traj_agents["y"].tolist(),
+                                        traj_agents["sugar_level"].tolist(),
+                                        traj_agents["sex"].tolist())),
+                             sorted((pos, sugar_level, sex) for (pos, sugar_level, _, sex, _) in agents))
+
+@unittest.skipIf(np is None, "NumPy is not installed")
+class RasterTest(unittest.TestCase):
+    """
+        Images of the environment and their encodings (see
+        "mas_raster").
+    """
+
+    def setUp(self):
+        # A non-square image, so that width and height differ.
+        self.image = np.random.default_rng(19).integers(0, 256, (3, 5, 3), dtype=np.uint8)
+
+    def test_render(self):
+        for (env_size, pixels) in ((10, 100), (10, 25), (100, 30), (7, 7)):
+            with self.subTest(env_size=env_size, pixels=pixels):
+                levels = np.full(env_size*env_size, 255, dtype=np.uint8)
+                agents = np.zeros(env_size*env_size, dtype=np.int8)
+                image = ras.render(levels, agents, env_size, pixels)
+                size = ras.image_size(env_size, pixels)
+                self.assertEqual(image.shape, (size, size, 3))
+                self.assertEqual(image.dtype, np.uint8)
+
+    def test_to_ppm(self):
+        data = ras.to_ppm(self.image)
+        header = b"P6\n5 3\n255\n"
+        self.assertEqual(data[:len(header)], header)
+        self.assertEqual(data[len(header):], self.image.tobytes())
+
+    def test_to_png(self):
+        data = ras.to_png(self.image)
+        self.assertEqual(data[:8], b"\x89PNG\r\n\x1a\n")
+        chunks = []
+        offset = 8
+        while offset < len(data):
+            (length, chunk_type) = struct.unpack(">I4s", data[offset:offset+8])
+            chunk = data[offset+8:offset+8+length]
+            (crc,) = struct.unpack(">I", data[offset+8+length:offset+12+length])
+            self.assertEqual(crc, zlib.crc32(chunk_type + chunk))
+            chunks.append((chunk_type, chunk))
+            offset += 12 + length
+        self.assertEqual([chunk_type for (chunk_type, chunk) in chunks], [b"IHDR", b"IDAT", b"IEND"])
+        # Width, height, 8 bits per channel, RGB, no interlace.
+        self.assertEqual(struct.unpack(">IIBBBBB", chunks[0][1]), (5, 3, 8, 2, 0, 0, 0))
+        rows = np.frombuffer(zlib.decompress(chunks[1][1]), dtype=np.uint8).reshape(3, 1 + 5*3)
+        self.assertEqual(rows[:, 0].tolist(), [0, 0, 0])
+        self.assertEqual(rows[:, 1:].tobytes(), self.image.tobytes())
+
+@unittest.skipIf(np is None, "NumPy is not installed")
+class ExportTest(unittest.TestCase):
+    """
+        Images are exported every K cycles (see "mas_export").
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_export(self):
+        # The directory of the output is created.
+        output = os.path.join(self.directory, "frames", "frame_%03d.ppm")
+        mas = new_mas(MAX_CYCLE="20")
+        exporter = ex.new_instance(mas, output, every=10, pixels=80)
+        m.run_experiment(mas)
+        ex.close(exporter)
+        self.assertEqual(ex.frames_of(exporter), 3)
+        (width, height) = ex.image_size(exporter)
+        header = ("P6\n" + str(width) + " " + str(height) + "\n255\n").encode("ascii")
+        for cycle in (0, 10, 20):
+            with open(output % cycle, "rb") as f:
+                data = f.read()
+            self.assertEqual(data[:len(header)], header)
+            self.assertEqual(len(data), len(header) + 3*width*height)
+
+    def test_unwritable_output(self):
+        # Fails before any cycle is run.
+        file_name = os.path.join(self.directory, "file")
+        open(file_name, "w").close()
+        mas = new_mas()
+        self.assertRaises(OSError, ex.new_instance, mas, os.path.join(file_name, "frame_%03d.png"))
+        self.assertEqual(m.get_cycle(mas), 0)
+
+@unittest.skipIf(np is None, "NumPy is not installed")
+class CapacityTest(unittest.TestCase):
+    """
+        The capacity maps built at once are the capacities added
+        one cell at a time (see "mas_capacity").
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_capacity_map(self):
+        # Distributions across the edges of the torus, and one
+        # that reaches the maximum capacity.
+        distributions = ["add_capacity_gaussian(env, 0.8, (2, 37), 4)",
+                         "add_capacity_gaussian(env, 0.3, (20, 20), 10)",
+                         "add_capacity_uniform(env, 0.2, (38, 1), 3)",
+                         "add_capacity_uniform(env, 0.9, (20, 20), 2)"]
+        self.assertTrue(cap.has_kernels(distributions))
+        for backend in ("list", "numpy"):
+            with self.subTest(backend=backend):
+                envs = [m.get_env(new_mas(ENV_BACKEND=backend, ADD_CAPACITY_DISTRIB=[]))
+                        for i in range(4)]
+                for distrib in distributions:
+                    reg.resolve_capacity_distribution(distrib)(envs[0])
+                cap.apply_distributions(envs[1], distributions)
+                # Built, then read from the cache.
+                cache_dir = os.path.join(self.directory, backend)
+                cap.apply_distributions(envs[2], distributions, cache_dir)
+                self.assertEqual(len(os.listdir(cache_dir)), 1)
+                cap.apply_distributions(envs[3], distributions, cache_dir)
+                expected = np.asarray(e.get_capacities(envs[0]), dtype=np.float64)
+                self.assertEqual(expected.max(), e.get_max_capacity(envs[0]))
+                for env in envs[1:]:
+                    np.testing.assert_allclose(np.asarray(e.get_capacities(env), dtype=np.float64),
+                                               expected, rtol=1e-9, atol=1e-12)
+
+if __name__ == "__main__":
+    unittest.main()